@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+
+"""Benchmarks of table initialization, scoring, re-roll heuristics, environment steps
+(with random and policy actions), per-decision latency, end-to-end play, and batched optimal
+play. Results are written as JSON, tagged with the git commit, so that runs from different
+commits can be compared (see --baseline).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import numpy as np
+
+from box import Box
+from dice import DiceSource
+from player_bot import Player_MonteCarlo_Fast, Player_MonteCarlo_Slow, Player_Optimal
+from player_bot import Player_NoRerolls_Greedy, Player_NoRerolls_Random, Player_RL
+from rl import LinearPolicy, VectorYahtzeeEnv
+from scorecard import CompactScorecard, Scorecard
+from simulator import TablePolicy, play_batches
+from solver import Solver
+from state_encoder import StateEncoder
+from strategy import Strategy
+
+
+PLAYERS = {
+    'Player_MonteCarlo_Fast':       lambda: Player_MonteCarlo_Fast(),
+    'Player_MonteCarlo_Slow':       lambda: Player_MonteCarlo_Slow(),
+    'Player_MonteCarlo_Slow_exact': lambda: Player_MonteCarlo_Slow(is_exact=True),
+    'Player_NoRerolls_Greedy':      lambda: Player_NoRerolls_Greedy(),
+    'Player_NoRerolls_Random':      lambda: Player_NoRerolls_Random(),
+    'Player_Optimal':               lambda: Player_Optimal(),
+    'Player_RL':                    lambda: Player_RL(),
+}
+CACHED_TABLES = {  # Players whose tables are not computed by the benchmark
+    'Player_Optimal': (Solver.is_cached, 'solver.py'),
+    'Player_RL':      (LinearPolicy.is_trained_cached, 'rl.py'),
+}
+
+
+class Bench:
+    """Runs each benchmark for about seconds of wall time (but at least once)."""
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def get_rate(self, f):
+        """Returns calls of f per second."""
+        count = 0
+        start = time.perf_counter()
+        while True:
+            f()
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.seconds:
+                return count / elapsed
+
+    def get_latencies(self, setup, f):
+        """Returns the sorted wall times of calls f(setup()), excluding the time of setup()."""
+        latencies = []
+        deadline = time.perf_counter() + self.seconds
+        while not latencies or time.perf_counter() < deadline:
+            arg = setup()
+            start = time.perf_counter()
+            f(arg)
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
+
+
+def get_latency_summary(latencies):
+    def quantile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    return {'count': len(latencies),
+            'mean_sec': sum(latencies) / len(latencies),
+            'p50_sec': quantile(0.5),
+            'p99_sec': quantile(0.99)}
+
+
+def bench_stats_init():
+    """Time to build (or load from the on-disk cache) all Stats tables, in a fresh process."""
+    code = ('import time; start = time.perf_counter(); from stats import Stats; Stats.warmup();'
+            ' print(time.perf_counter() - start)')
+    result = {}
+    for (name, cache_dir) in [('cold_sec', ''), ('cached_sec', None)]:
+        env = dict(os.environ)
+        if cache_dir is not None:
+            env['YAHTZEE_CACHE_DIR'] = cache_dir
+        if name == 'cached_sec':  # Populate the cache, if needed
+            subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env,
+                           check=True, capture_output=True)
+        output = subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, env=env,
+                                check=True, capture_output=True, text=True).stdout
+        result[name] = float(output)
+    return result
+
+
+def bench_get_box_score(bench):
+    """get_box_score calls per second, over random rolls and all boxes."""
+    rng = random.Random(1)
+    rolls = [[rng.randint(1, 6) for _ in range(5)] for _ in range(100)]
+    boxes = Box.nonnone_boxes()
+    result = {}
+    for scorecard_class in [Scorecard, CompactScorecard]:
+        scorecard = scorecard_class()
+        def f():
+            for roll in rolls:
+                for box in boxes:
+                    scorecard.get_box_score(box, roll)
+        result[scorecard_class.__name__] = bench.get_rate(f) * len(rolls) * len(boxes)
+    return result
+
+
+def bench_goals_to_rerolls(bench):
+    """Strategy.goals_to_rerolls calls per second, over random rolls with all boxes as goals."""
+    rng = random.Random(2)
+    rolls = [[rng.randint(1, 6) for _ in range(5)] for _ in range(100)]
+    boxes = Box.nonnone_boxes()
+    def f():
+        for roll in rolls:
+            Strategy.goals_to_rerolls(roll, boxes)
+    return bench.get_rate(f) * len(rolls)
+
+
+def bench_env_steps(bench, game_count=4096):
+    """VectorYahtzeeEnv steps per second (summed over games), with random legal actions."""
+    rng = np.random.default_rng(6)
+    env = VectorYahtzeeEnv(game_count, rng)
+    env.reset()
+    def f():
+        actions = (rng.random((game_count, 1)) * env.get_legal_actions()).argmax(axis=1)
+        env.step(actions)
+    return bench.get_rate(f) * game_count
+
+
+def bench_policy_steps(bench, game_count=1024):
+    """VectorYahtzeeEnv steps per second (summed over games), with actions sampled from a
+    LinearPolicy, as in rl.train (with a batch of that size).
+    """
+    rng = np.random.default_rng(8)
+    env = VectorYahtzeeEnv(game_count, rng)
+    policy = LinearPolicy()
+    observations = [env.reset()]
+    def f():
+        (observations[0], *_) = env.step(policy.get_actions(observations[0], rng))
+    return bench.get_rate(f) * game_count
+
+
+def get_random_player_state(player, rng, roll_num):
+    """Sets player to a random mid-game state: a random number of boxes used, with random rolls."""
+    player._scorecard = player._scorecard_class()
+    boxes = Box.nonnone_boxes()
+    rng.shuffle(boxes)
+    for box in boxes[:rng.randrange(Box.nonnone_count())]:
+        player._scorecard.use_box([rng.randint(1, 6) for _ in range(5)], box)
+    player._turn_num = Box.nonnone_count() - len(player._scorecard.get_boxes_unused()) + 1
+    player._roll = [rng.randint(1, 6) for _ in range(5)]
+    player._roll_num = roll_num
+    return player
+
+
+def bench_decisions(bench, player_names):
+    """Latency of Player._exec_policy, by player and roll_num, over random mid-game states."""
+    rng = random.Random(3)
+    result = {}
+    for name in player_names:
+        player = PLAYERS[name]()
+        player.dice = DiceSource(4)
+        if hasattr(player, 'sim_seed'):
+            player.sim_seed = np.random.SeedSequence(6)
+        result[name] = {f'roll{roll_num}': get_latency_summary(bench.get_latencies(
+                            lambda: get_random_player_state(player, rng, roll_num),
+                            lambda p: p._exec_policy()))
+                        for roll_num in [1, 2, 3]}
+    return result
+
+
+def bench_games(bench, player_names):
+    """Games per second, and the mean score of those games, by player."""
+    result = {}
+    for name in player_names:
+        player = PLAYERS[name]()
+        player.dice = DiceSource(5)
+        if hasattr(player, 'sim_seed'):
+            player.sim_seed = np.random.SeedSequence(7)
+        scores = []
+        with contextlib.redirect_stdout(io.StringIO()):  # Discard the players' reports
+            latencies = bench.get_latencies(lambda: None,
+                                            lambda _: scores.append(player.play()))
+        result[name] = {'games_per_sec': len(latencies) / sum(latencies),
+                        'game_count': len(latencies),
+                        'mean_score': float(np.mean(scores))}
+    return result
+
+
+def bench_optimal_batch(bench, game_count=2**14):
+    """Games per second of optimal play batched with NumPy (TablePolicy over GameBatch, see
+    simulator.py), and its mean score: cold, with a new policy, which computes the turn policy
+    of each state on first use, and warm, replaying the same games once those are computed,
+    as for most states over a long run. Also turn policies computed per second.
+    """
+    policy = TablePolicy()
+    start = time.perf_counter()
+    scores = play_batches(policy, game_count, rng=np.random.default_rng(9))
+    cold_seconds = time.perf_counter() - start
+    games_per_sec = game_count * bench.get_rate(
+        lambda: play_batches(policy, game_count, rng=np.random.default_rng(9)))
+    turn_states = np.flatnonzero(policy.row_by_turn_state >= 0)[:TablePolicy.CHUNK_SIZE]
+    (masks, uppers, yflags, _, _) = StateEncoder.decode_many(
+        turn_states * StateEncoder.TURN_STATE_DIVISOR).T
+    turn_policies_per_sec = len(turn_states) * bench.get_rate(
+        lambda: Solver.get_turn_policies(policy.state_values, masks, uppers, yflags))
+    return {'games_per_sec': games_per_sec,
+            'cold_games_per_sec': game_count / cold_seconds,
+            'turn_policy_count': policy.turn_policy_count,
+            'turn_policies_per_sec': turn_policies_per_sec,
+            'mean_score': float(scores.mean())}
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, baseline):
+    """Prints the ratio of each numeric result to the corresponding baseline result."""
+    def flatten(d, prefix=''):
+        for (k, v) in d.items():
+            if isinstance(v, dict):
+                yield from flatten(v, f'{prefix}{k}.')
+            elif isinstance(v, (int, float)):
+                yield (f'{prefix}{k}', v)
+    baseline_values = dict(flatten(baseline['results']))
+    for (name, value) in flatten(results['results']):
+        if baseline_values.get(name):
+            print(f'{name:<60} {value:>14.6g} {value / baseline_values[name]:>8.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench',
+                 description='Benchmark Yahtzee scoring, players and tables')
+    parser.add_argument('-o', '--output', default=None)   # JSON output file (default: stdout)
+    parser.add_argument('-b', '--baseline', default=None) # JSON output of an earlier run
+    parser.add_argument('-s', '--seconds', type=float, default=1.0)  # Time per benchmark
+    parser.add_argument('-p', '--players', nargs='*', default=None,  # Subset of PLAYERS
+                        choices=sorted(PLAYERS))
+    args = parser.parse_args()
+
+    player_names = sorted(PLAYERS) if args.players is None else args.players
+    for (name, (is_cached, program)) in CACHED_TABLES.items():
+        if name in player_names and not is_cached():
+            print(f'Skipping {name}: Run {program} to compute its tables', file=sys.stderr)
+            player_names.remove(name)
+
+    bench = Bench(args.seconds)
+    results = {'commit': get_commit(),
+               'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+               'python': platform.python_version(),
+               'numpy': np.__version__,
+               'seconds_per_benchmark': args.seconds,
+               'results': {'stats_init': bench_stats_init(),
+                           'get_box_score_ops_per_sec': bench_get_box_score(bench),
+                           'goals_to_rerolls_ops_per_sec': bench_goals_to_rerolls(bench),
+                           'env_steps_per_sec': bench_env_steps(bench),
+                           'policy_steps_per_sec': bench_policy_steps(bench),
+                           'decision_latency': bench_decisions(bench, player_names),
+                           'games': bench_games(bench, player_names),
+                           'optimal_batch': (bench_optimal_batch(bench)
+                                             if 'Player_Optimal' in player_names else None)}}
+
+    text = json.dumps(results, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
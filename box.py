@@ -42,4 +42,4 @@ class Box(IntEnum):
         return len(Box) - 1
 
     def to_index(b):
-        return b.value - 1
+        return int(b) - 1
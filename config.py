@@ -1,4 +1,11 @@
+import os
+
+
 class Config:
     DO_USE_JOKER_RULE = True
     DO_USE_JOKER_RULE_UPPER_SECTION = True
     DO_USE_YAHTZEE_BONUS = True
+
+    # Directory of cached lookup tables. An empty string disables caching.
+    CACHE_DIR = os.environ.get('YAHTZEE_CACHE_DIR',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'yahtzee'))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+import contextlib
+import os
+import pickle
+try:
+    import fcntl
+except ImportError:  # Not POSIX: saves are not serialized between processes
+    fcntl = None
+
+from table_cache import TableCache
+
+
+class DecisionCache:
+    """Bounded LRU memo of decisions, with hit and miss counters.
+    Used by the Monte Carlo players in front of Strategy._get_delta_*_mean_by_goal,
+    whose result depends only on the sorted roll, the roll number, the used boxes and
+    whether the YAHTZEE box holds 50 points (for the Joker Rule).
+
+    If path is given, entries are loaded from it on construction, and save() writes them
+    back, merged with any entries saved there since (e.g., by other worker processes),
+    so that long evaluation runs speed up as they go. Saves hold a lock on the file
+    f'{path}.lock', so that concurrent saves do not drop each other's entries.
+    The file starts with a key (see TableCache.key) of FORMAT_VERSION and the Config rule
+    flags, and a file with another key is ignored, and replaced on save().
+    """
+    DEFAULT_MAXSIZE = 2**18
+    FORMAT_VERSION = 2  # Of the keys and values of the entries (2: keyed by StateEncoder code)
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        if path is not None:
+            self._entries.update(DecisionCache._load(path))
+            self._trim()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def get_key():
+        return TableCache('decisions', DecisionCache.FORMAT_VERSION).key
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path, 'rb') as f:
+                (key, entries) = pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return {}
+        return entries if key == DecisionCache.get_key() else {}
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Holds an exclusive lock on the lock file of self.path, if possible."""
+        if fcntl is None:
+            yield
+            return
+        with open(f'{self.path}.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _trim(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key, compute):
+        """Returns the cached value for key, or else caches and returns compute()."""
+        value = self._entries.get(key)
+        if value is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+        self.misses += 1
+        value = compute()
+        self._entries[key] = value
+        self._trim()
+        return value
+
+    def save(self):
+        """Atomically writes the entries to self.path, if any. Failures to write are not fatal."""
+        if self.path is None:
+            return
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            with self._lock():
+                entries = DecisionCache._load(self.path)
+                for (key, value) in self._entries.items():  # Most recently used last
+                    entries.pop(key, None)
+                    entries[key] = value
+                if len(entries) > self.maxsize:
+                    entries = dict(list(entries.items())[-self.maxsize:])
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump((DecisionCache.get_key(), entries), f,
+                                protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def summary_str(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f'Decision cache: {len(self):,} entries, {self.hits:,} hits,'
+                f' {self.misses:,} misses ({100 * hit_rate:.1f}% hit rate)')
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from config import Config
+from decision_cache import DecisionCache
+from player_bot import Player_MonteCarlo_Slow
+from scorecard import CompactScorecard
+from yahtzee import GameSequence
+
+
+def save_entries(path, worker):
+    for k in range(20):
+        cache = DecisionCache(path=path)
+        cache.get((worker, k), lambda: k)
+        cache.save()
+
+
+class DecisionCacheTest(unittest.TestCase):
+    def test_lru(self):
+        cache = DecisionCache(maxsize=2)
+        assert(cache.get('a', lambda: 1) == 1)
+        assert(cache.get('b', lambda: 2) == 2)
+        assert(cache.get('a', lambda: 0) == 1)  # 'a' is now the most recently used
+        assert(cache.get('c', lambda: 3) == 3)  # Evicts 'b'
+        assert(cache.get('b', lambda: 4) == 4)
+        assert((cache.hits, cache.misses) == (1, 4))
+        assert(len(cache) == 2)
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'decisions.pkl')
+            cache1 = DecisionCache(path=path)
+            cache1.get('a', lambda: 1)
+            cache1.save()
+            cache2 = DecisionCache(path=path)
+            cache2.get('b', lambda: 2)
+            cache1.get('c', lambda: 3)
+            cache2.save()
+            cache1.save()  # Merges with the entries saved by cache2
+            cache3 = DecisionCache(path=path)
+            assert([cache3.get(key, lambda: None) for key in 'abc'] == [1, 2, 3])
+            assert(cache3.misses == 0)
+
+    def test_concurrent_saves(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'decisions.pkl')
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                list(executor.map(save_entries, [path] * 4, range(4)))
+            assert(len(DecisionCache(path=path)) == 4 * 20)
+
+    def test_rule_flags(self):
+        """A file saved with other Config rule flags is ignored."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'decisions.pkl')
+            cache = DecisionCache(path=path)
+            cache.get('a', lambda: 1)
+            cache.save()
+            orig = Config.DO_USE_JOKER_RULE
+            try:
+                Config.DO_USE_JOKER_RULE = not orig
+                assert(len(DecisionCache(path=path)) == 0)
+            finally:
+                Config.DO_USE_JOKER_RULE = orig
+            assert(len(DecisionCache(path=path)) == 1)
+
+            with open(path, 'wb') as f:
+                f.write(b'Not a pickle')
+            assert(len(DecisionCache(path=path)) == 0)
+
+    def test_format_version(self):
+        """A file saved with another format version is ignored."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'decisions.pkl')
+            cache = DecisionCache(path=path)
+            cache.get('a', lambda: 1)
+            cache.save()
+            orig = DecisionCache.FORMAT_VERSION
+            try:
+                DecisionCache.FORMAT_VERSION = orig - 1
+                assert(len(DecisionCache(path=path)) == 0)
+            finally:
+                DecisionCache.FORMAT_VERSION = orig
+
+    def test_player(self):
+        player = Player_MonteCarlo_Slow(is_exact=True, decision_cache=DecisionCache())
+        for _ in range(2):
+            player._scorecard = CompactScorecard()
+            player._turn_num = 1
+            player._roll_num = 2
+            player._roll = [2, 1, 2, 5, 6]
+            player._exec_policy()
+        assert((player.decision_cache.hits, player.decision_cache.misses) == (1, 1))
+
+    def test_seeded_scores(self):
+        """The scores for a seed are the same with and without the cache, even when warm."""
+        def play(decision_cache):
+            player = Player_MonteCarlo_Slow(is_exact=True, decision_cache=decision_cache)
+            with contextlib.redirect_stdout(io.StringIO()):
+                return GameSequence(player, seed=7, is_keeping_scores=True).play(2).scores
+
+        decision_cache = DecisionCache()
+        scores = play(None)
+        assert(play(decision_cache) == scores)
+        assert(play(decision_cache) == scores)
+        assert(decision_cache.hits > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,8 +3,13 @@
 from copy import copy
 import random as r
 
+import numpy as np
+
 
 class Dice:
+    """Dice backed by the global state of the random module.
+    See DiceSource for an alternative with the same roll/reroll interface.
+    """
     SIDES = 6
     COUNT = 5
 
@@ -23,3 +28,146 @@ class Dice:
     @staticmethod
     def seed(s):
         r.seed(s)
+
+
+class DiceSource:
+    """Stream of die values, with the roll/reroll interface of class Dice.
+    Values are drawn from a numpy.random.Generator (PCG64) in blocks of BLOCK_SIZE,
+    and handed out from a buffer, avoiding a Python-level RNG call per die.
+    Each DiceSource is independent of the others, and of the random module.
+      * seed: None, an int, or a numpy.random.SeedSequence.
+      * is_recording: Whether to keep every value handed out, for get_recording().
+    Use spawn() for independent streams (e.g., per game or per worker process),
+    and DiceSource.replay(values) to hand out a recorded stream again.
+    """
+    BLOCK_SIZE = 2**14
+
+    def __init__(self, seed=None, is_recording=False):
+        self._seed_seq = (seed if isinstance(seed, np.random.SeedSequence)
+                          else np.random.SeedSequence(seed))
+        self._rng = np.random.Generator(np.random.PCG64(self._seed_seq))
+        self._buffer = []
+        self._pos = 0
+        self._recording = [] if is_recording else None
+
+    @staticmethod
+    def replay(values):
+        """Returns a DiceSource that hands out the given values, then raises ValueError."""
+        result = DiceSource()
+        result._rng = None
+        result._buffer = np.asarray(values, dtype=int).tolist()
+        return result
+
+    def _refill(self, count):
+        if self._rng is None:
+            raise ValueError('DiceSource: Replayed dice stream is exhausted')
+        block = self._rng.integers(1, Dice.SIDES + 1, size=max(count, DiceSource.BLOCK_SIZE),
+                                   dtype=np.int8)
+        if self._recording is not None:
+            self._recording.append(block)
+        self._buffer = self._buffer[self._pos:] + block.tolist()
+        self._pos = 0
+
+    def get_recording(self):
+        """Returns the values handed out so far, as an int8 array. Requires is_recording."""
+        assert(self._recording is not None)
+        values = np.concatenate(self._recording) if self._recording else np.zeros(0, np.int8)
+        unused_count = len(self._buffer) - self._pos
+        return values[:len(values) - unused_count]
+
+    def reroll(self, roll, indices):
+        if self._pos + len(indices) > len(self._buffer):
+            self._refill(len(indices))
+        result = list(roll)
+        (buffer, pos) = (self._buffer, self._pos)
+        for i in indices:
+            result[i] = buffer[pos]
+            pos += 1
+        self._pos = pos
+        return result
+
+    def roll(self):
+        return self.take(Dice.COUNT)
+
+    def spawn(self, n):
+        """Returns n new DiceSources, independent of this one and of each other."""
+        return [DiceSource(seed_seq, self._recording is not None)
+                for seed_seq in self._seed_seq.spawn(n)]
+
+    def take(self, n):
+        """Returns a list of the next n die values."""
+        if self._pos + n > len(self._buffer):
+            self._refill(n)
+        result = self._buffer[self._pos:self._pos + n]
+        self._pos += n
+        return result
+
+
+class AlignedDice:
+    """Dice that replay a pre-generated stream of die values, aligned to the structure of
+    the game, with the roll/reroll interface of class Dice: the stream is an array of shape
+    (game_count, TURN_COUNT, 3, Dice.COUNT), where stream[game, turn, 0] is the first roll
+    of a turn, and the dice re-rolled for roll #k+1 take the values stream[game, turn, k],
+    in die order. So players that play the same game see the same dice, as far as their
+    moves allow (common random numbers). (Players that re-roll the same number of dice get
+    the same new values, even if they re-roll different dice, which correlates their scores
+    more than aligning the values to die positions.)
+    Call start_game(game) before each game.
+    Use generate() to write a stream to disk, and load() to memory-map it, or draw() to draw
+    one in memory.
+    """
+    TURN_COUNT = 13
+    BLOCK_GAME_COUNT = 2**14
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._game_values = None
+        self._turn = None
+        self._roll_num = None
+
+    @staticmethod
+    def generate(path, game_count, seed=None):
+        """Writes a stream of game_count games, drawn from a numpy.random.Generator (PCG64)
+        seeded with seed, to the .npy file at path, in blocks of BLOCK_GAME_COUNT games.
+        """
+        rng = np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed)))
+        stream = np.lib.format.open_memmap(path, mode='w+', dtype=np.int8,
+                     shape=(game_count, AlignedDice.TURN_COUNT, 3, Dice.COUNT))
+        for start in range(0, game_count, AlignedDice.BLOCK_GAME_COUNT):
+            block = stream[start:start + AlignedDice.BLOCK_GAME_COUNT]
+            block[...] = AlignedDice.draw(rng, len(block))
+        stream.flush()
+        del stream
+
+    @staticmethod
+    def draw(rng, game_count):
+        """Returns a stream of game_count games, drawn from rng (a numpy.random.Generator)."""
+        return rng.integers(1, Dice.SIDES + 1, dtype=np.int8,
+                            size=(game_count, AlignedDice.TURN_COUNT, 3, Dice.COUNT))
+
+    @staticmethod
+    def load(path):
+        """Returns the stream in the .npy file at path, memory-mapped."""
+        return np.load(path, mmap_mode='r')
+
+    def reroll(self, roll, indices):
+        assert(self._roll_num <= 2)
+        values = self._game_values[self._turn][self._roll_num]
+        result = list(roll)
+        for (k, i) in enumerate(sorted(indices)):
+            result[i] = values[k]
+        self._roll_num += 1
+        return result
+
+    def roll(self):
+        """Returns the first roll of the next turn. After the last turn of the game (as
+        Player._use_box rolls once more), returns the first roll of the last turn again.
+        """
+        self._turn = min(self._turn + 1, AlignedDice.TURN_COUNT - 1)
+        self._roll_num = 1
+        return list(self._game_values[self._turn][0])
+
+    def start_game(self, game):
+        self._game_values = self.stream[game].tolist()
+        self._turn = -1
+        self._roll_num = None
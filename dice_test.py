@@ -1,8 +1,43 @@
 #!/usr/bin/env python
 
+import os
+import tempfile
 import unittest
 
-from dice import Dice
+import numpy as np
+
+from dice import AlignedDice, Dice, DiceSource
+from player_bot import Player_NoRerolls_Greedy
+
+
+class AlignedDiceTest(unittest.TestCase):
+    def test_alignment(self):
+        stream = np.arange(2 * AlignedDice.TURN_COUNT * 3 * Dice.COUNT).reshape(
+                     2, AlignedDice.TURN_COUNT, 3, Dice.COUNT)
+        dice = AlignedDice(stream)
+        dice.start_game(1)
+        assert(dice.roll() == stream[1, 0, 0].tolist())
+        assert(dice.reroll([1, 2, 3, 4, 5], [3, 1]) == [1, stream[1, 0, 1, 0], 3,
+                                                        stream[1, 0, 1, 1], 5])
+        assert(dice.reroll([1, 2, 3, 4, 5], [4]) == [1, 2, 3, 4, stream[1, 0, 2, 0]])
+        assert(dice.roll() == stream[1, 1, 0].tolist())
+        for _ in range(AlignedDice.TURN_COUNT):  # Including the roll after the last turn
+            roll = dice.roll()
+        assert(roll == stream[1, -1, 0].tolist())
+
+        dice.start_game(0)
+        assert(dice.roll() == stream[0, 0, 0].tolist())
+
+    def test_generate(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'dice.npy')
+            AlignedDice.generate(path, 10, seed=1)
+            stream = AlignedDice.load(path)
+            assert(stream.shape == (10, AlignedDice.TURN_COUNT, 3, Dice.COUNT))
+            assert(set(np.unique(stream)) == set(range(1, Dice.SIDES + 1)))
+            path2 = os.path.join(tmpdir, 'dice2.npy')
+            AlignedDice.generate(path2, 10, seed=1)
+            assert(np.array_equal(AlignedDice.load(path2), stream))
 
 
 class DiceTest(unittest.TestCase):
@@ -12,5 +47,42 @@ class DiceTest(unittest.TestCase):
         assert(roll1 != roll2)
 
 
+class DiceSourceTest(unittest.TestCase):
+    def test_roll(self):
+        assert(DiceSource(1).roll() == DiceSource(1).roll())
+
+        dice = DiceSource(1)
+        rolls = [dice.roll() for _ in range(DiceSource.BLOCK_SIZE)]  # Spans several blocks
+        assert(all(len(roll) == Dice.COUNT for roll in rolls))
+        assert(set(v for roll in rolls for v in roll) == set(range(1, Dice.SIDES + 1)))
+        assert(DiceSource(1).take(20) != DiceSource(2).take(20))
+
+    def test_reroll(self):
+        dice = DiceSource(3)
+        roll = [1, 2, 3, 4, 5]
+        new_roll = dice.reroll(roll, [0, 4])
+        assert(roll == [1, 2, 3, 4, 5])
+        assert(new_roll[1:4] == [2, 3, 4])
+
+    def test_spawn(self):
+        (dice1, dice2) = DiceSource(7).spawn(2)
+        (dice1_again, _) = DiceSource(7).spawn(2)
+        values1 = dice1.take(100)
+        assert(values1 == dice1_again.take(100))
+        assert(values1 != dice2.take(100))
+
+    def test_record_replay(self):
+        player = Player_NoRerolls_Greedy()
+        player.dice = DiceSource(11, is_recording=True)
+        scores = [player.play() for _ in range(3)]
+        recording = player.dice.get_recording()
+        assert(len(recording) == 3 * Dice.COUNT * 14)  # 13 turns, plus the roll after the last
+
+        player.dice = DiceSource.replay(recording)
+        assert([player.play() for _ in range(3)] == scores)
+        with self.assertRaises(ValueError):
+            player.play()
+
+
 if __name__ == '__main__':
     unittest.main()
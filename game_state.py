@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+from typing import NamedTuple, Tuple
+
+from box import Box
+from dice import Dice
+from scorecard import Scorecard
+from stats import OptimalPlay, Stats
+from util import Util
+
+
+BOXES = tuple(Box.nonnone_boxes())
+
+
+class GameState(NamedTuple):
+    """Compact, immutable snapshot of the state of a game that matters for decisions
+    within a turn. Used by Strategy in place of copies of Player and Scorecard objects.
+      * roll: Tuple of the five dice values.
+      * roll_num: 1, 2 or 3.
+      * used_mask: Bitmask of used boxes, where bit k is set iff box with index k is used.
+      * upper: Raw upper section score.
+      * yflag: Whether the YAHTZEE box has been scored with 50 points.
+    """
+    roll: Tuple[int, ...]
+    roll_num: int
+    used_mask: int
+    upper: int
+    yflag: bool
+
+    @Util.lazy_static
+    def _scores(cls):
+        """Stats.stat_scores as nested lists, which are faster to index one at a time."""
+        return Stats.stat_scores.tolist()
+
+    @Util.lazy_static
+    def _deltas(cls):
+        """srid --> list of deltas (box score - average box score under optimal play)."""
+        return (Stats.stat_scores - OptimalPlay.AVG_BOX_SCORES).tolist()
+
+    @staticmethod
+    def from_player(p):
+        scorecard = p._scorecard
+        return GameState(roll=tuple(p._roll),
+                         roll_num=p._roll_num,
+                         used_mask=scorecard.used_mask,
+                         upper=int(scorecard.get_score_upper_raw()),
+                         yflag=bool(scorecard.box_score[Box.YAHTZEE.to_index()] > 0))
+
+    def get_box_deltas(self):
+        """Returns {box: delta} over the unused boxes, where delta is the box score of the
+        current roll minus the average box score under optimal play.
+        """
+        srid = Stats.stat_roll_to_sroll_data[self.roll][1]
+        deltas = GameState._deltas[srid]
+        result = {box: deltas[k] for k, box in enumerate(BOXES)
+                  if not (self.used_mask >> k) & 1}
+        if self.yflag and self.roll.count(self.roll[0]) == Dice.COUNT:  # Joker Rule
+            for box in Scorecard.boxes_joker:
+                if box in result:
+                    result[box] = (self.get_box_score(box)
+                                   - OptimalPlay.AVG_BOX_SCORES[box.to_index()])
+        return result
+
+    def get_box_score(self, box):
+        """Returns the score of the current roll in the given box, applying the Joker Rule."""
+        srid = Stats.stat_roll_to_sroll_data[self.roll][1]
+        k = box.to_index()
+        if self.yflag and self.roll.count(self.roll[0]) == Dice.COUNT:
+            is_upper_box_used = (self.used_mask >> (self.roll[0] - 1)) & 1
+            joker_score = Scorecard.get_joker_overlay()[1, 1, is_upper_box_used, k]
+            if joker_score >= 0:
+                return int(joker_score)
+        return GameState._scores[srid][k]
+
+    def get_boxes_unused(self):
+        return [box for k, box in enumerate(BOXES) if not (self.used_mask >> k) & 1]
+
+
+def simulate_reroll(state, reroll, dice=Dice):
+    """Returns the state after re-rolling the given (zero-based) dice indices,
+    with dice (Dice, or a DiceSource). The given state is not modified.
+    """
+    roll = tuple(dice.reroll(list(state.roll), reroll))
+    return state._replace(roll=roll, roll_num=state.roll_num + 1)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import random
+import unittest
+
+from box import Box
+from dice import Dice
+from game_state import GameState, simulate_reroll
+from player_bot import Player_NoRerolls_Random
+from scorecard import Scorecard
+
+
+class GameStateTest(unittest.TestCase):
+    def test_matches_scorecard(self):
+        player = Player_NoRerolls_Random()
+        player._scorecard = Scorecard()
+        player._roll_num = 1
+        for _ in range(Box.nonnone_count()):
+            for roll in [Dice.roll(), [3,3,3,3,3]]:
+                player._roll = roll
+                state = GameState.from_player(player)
+                assert(state.get_boxes_unused() == player._scorecard.get_boxes_unused())
+                for box in state.get_boxes_unused():
+                    assert(state.get_box_score(box)
+                           == player._scorecard.get_box_score(box, roll)[0])
+            player._scorecard.use_box([3,3,3,3,3] if random.random() < 0.3 else roll,
+                                      player._scorecard.get_random_unused_box())
+
+    def test_joker(self):
+        used_mask = (1 << Box.YAHTZEE.to_index()) | (1 << Box.THREES.to_index())
+        state = GameState((3,3,3,3,3), 3, used_mask, 15, True)
+        assert(state.get_box_score(Box.STRAIGHT_LARGE) == 40)
+        assert(state.get_box_deltas()[Box.STRAIGHT_LARGE] > 0)
+        assert(state._replace(yflag=False).get_box_score(Box.STRAIGHT_LARGE) == 0)
+
+    def test_simulate_reroll(self):
+        state = GameState((1,2,3,4,5), 1, 0, 0, False)
+        state2 = simulate_reroll(state, [0, 4])
+        assert(state.roll == (1,2,3,4,5))
+        assert(state2.roll[1:4] == (2,3,4))
+        assert(state2.roll_num == 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+import math
+import time
+
+import numpy as np
+
+
+class Instrumentation:
+    """Records where Player.play spends its time, when set as a Player's instrumentation:
+      * Wall time per phase: 'roll' (dice rolls and re-rolls), 'decide1' to 'decide3'
+            (Player._exec_policy on each roll_num, excluding the rolling and scoring it
+            triggers), and 'score' (Scorecard.use_box).
+      * Counts of calls of get_box_score and use_box on the player's scorecard
+            (see CountingScorecard), and of simulated re-rolls, each of which is followed
+            by the scoring of the resulting state (see CountingDice and Strategy).
+            Scoring by table lookup (e.g., Stats.get_best_deltas) is not counted.
+    Timings are kept as histograms with logarithmic bins, so memory use does not grow
+    with the number of games, and quantiles are approximate (within one bin width).
+    Instances from different chunks of games, or different processes, combine with merge().
+    """
+    PHASES = ['roll', 'decide1', 'decide2', 'decide3', 'score']
+    BINS_PER_DECADE = 20
+    MIN_SECONDS = 1e-7  # Lower edge of the first bin
+    BIN_COUNT = 9 * BINS_PER_DECADE  # Up to 100 seconds
+
+    def __init__(self):
+        self.histograms = {phase: np.zeros(Instrumentation.BIN_COUNT, dtype=np.int64)
+                           for phase in Instrumentation.PHASES}
+        self.total_seconds = {phase: 0.0 for phase in Instrumentation.PHASES}
+        self.counts = {}
+        self._stack = []  # [phase, start_time, seconds spent in nested phases]
+
+    @staticmethod
+    def get_bin(seconds):
+        if seconds <= Instrumentation.MIN_SECONDS:
+            return 0
+        k = int(math.log10(seconds / Instrumentation.MIN_SECONDS)
+                * Instrumentation.BINS_PER_DECADE)
+        return min(k, Instrumentation.BIN_COUNT - 1)
+
+    @staticmethod
+    def get_bin_upper_edge(k):
+        return Instrumentation.MIN_SECONDS * 10**((k + 1) / Instrumentation.BINS_PER_DECADE)
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def start(self, phase):
+        self._stack.append([phase, time.perf_counter(), 0.0])
+
+    def stop(self):
+        """Records the time since the matching start(), less the time of nested phases."""
+        (phase, start_time, nested_seconds) = self._stack.pop()
+        elapsed = time.perf_counter() - start_time
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        seconds = elapsed - nested_seconds
+        self.histograms[phase][Instrumentation.get_bin(seconds)] += 1
+        self.total_seconds[phase] += seconds
+
+    def merge(self, other):
+        for phase in Instrumentation.PHASES:
+            self.histograms[phase] += other.histograms[phase]
+            self.total_seconds[phase] += other.total_seconds[phase]
+        for (name, n) in other.counts.items():
+            self.count(name, n)
+
+    def get_quantile(self, phase, q):
+        """Returns the upper edge of the histogram bin holding quantile q of the phase's times,
+        or None if the phase has not been timed.
+        """
+        histogram = self.histograms[phase]
+        count = int(histogram.sum())
+        if count == 0:
+            return None
+        rank = max(1, math.ceil(q * count))
+        return Instrumentation.get_bin_upper_edge(int(np.searchsorted(histogram.cumsum(), rank)))
+
+    def to_dict(self):
+        """Returns the aggregates as a JSON-compatible dict."""
+        phases = {}
+        for phase in Instrumentation.PHASES:
+            count = int(self.histograms[phase].sum())
+            phases[phase] = {'count': count,
+                             'total_sec': self.total_seconds[phase],
+                             'mean_sec': self.total_seconds[phase] / count if count else None,
+                             'p50_sec': self.get_quantile(phase, 0.5),
+                             'p99_sec': self.get_quantile(phase, 0.99),
+                             'histogram': self.histograms[phase].tolist()}
+        return {'phases': phases,
+                'counts': dict(self.counts),
+                'histogram_bin_upper_edges_sec': [Instrumentation.get_bin_upper_edge(k)
+                                                  for k in range(Instrumentation.BIN_COUNT)]}
+
+    def summary_str(self):
+        lines = [f'{"Phase":<8} {"Count":>12} {"Total sec":>10} {"Mean ms":>9}'
+                 f' {"p50 ms":>9} {"p99 ms":>9}']
+        for phase in Instrumentation.PHASES:
+            count = int(self.histograms[phase].sum())
+            if count == 0:
+                continue
+            total = self.total_seconds[phase]
+            lines.append(f'{phase:<8} {count:>12,} {total:>10.2f} {1e3 * total / count:>9.3f}'
+                         f' {1e3 * self.get_quantile(phase, 0.5):>9.3f}'
+                         f' {1e3 * self.get_quantile(phase, 0.99):>9.3f}')
+        for (name, n) in sorted(self.counts.items()):
+            lines.append(f'Calls of {name}: {n:,}')
+        return '\n'.join(lines)
+
+
+class CountingDice:
+    """Wraps the dice of simulated rolls (Dice, or a DiceSource), counting calls of reroll
+    in an Instrumentation, as 'Simulation.reroll'.
+    """
+    def __init__(self, dice, instrumentation):
+        self._dice = dice
+        self._instrumentation = instrumentation
+
+    def reroll(self, roll, indices):
+        self._instrumentation.count('Simulation.reroll')
+        return self._dice.reroll(roll, indices)
+
+    def roll(self):
+        return self._dice.roll()
+
+
+class CountingScorecard:
+    """Wraps a scorecard (e.g., Scorecard or CompactScorecard), counting calls of
+    get_box_score and use_box in an Instrumentation.
+    Other attributes are passed through to the wrapped scorecard.
+    """
+    def __init__(self, scorecard, instrumentation):
+        self._scorecard = scorecard
+        self._instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self._scorecard, name)
+
+    def get_box_score(self, box, roll):
+        self._instrumentation.count('Scorecard.get_box_score')
+        return self._scorecard.get_box_score(box, roll)
+
+    def use_box(self, roll, box):
+        self._instrumentation.count('Scorecard.use_box')
+        return self._scorecard.use_box(roll, box)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import time
+import unittest
+
+from instrumentation import Instrumentation
+from player_bot import Player_MonteCarlo_Slow, Player_NoRerolls_Greedy
+from scorecard import CompactScorecard
+from yahtzee import GameSequence
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_nested_phases(self):
+        instrumentation = Instrumentation()
+        instrumentation.start('decide1')
+        instrumentation.start('roll')
+        time.sleep(0.02)
+        instrumentation.stop()
+        instrumentation.stop()
+        assert(instrumentation.total_seconds['roll'] >= 0.02)
+        assert(instrumentation.total_seconds['decide1'] < 0.01)
+        assert(instrumentation.get_quantile('roll', 0.5) >= 0.02)
+        assert(instrumentation.get_quantile('score', 0.5) is None)
+
+    def test_bins(self):
+        for seconds in [1e-9, 1e-6, 0.0123, 1.0, 1e4]:
+            k = Instrumentation.get_bin(seconds)
+            assert(0 <= k < Instrumentation.BIN_COUNT)
+            if Instrumentation.MIN_SECONDS < seconds < 100:
+                assert(Instrumentation.get_bin_upper_edge(k - 1) <= seconds
+                       < Instrumentation.get_bin_upper_edge(k))
+
+    def test_player(self):
+        player = Player_NoRerolls_Greedy()
+        player.instrumentation = Instrumentation()
+        player.play()
+        player.play()
+        counts = player.instrumentation.to_dict()['phases']
+        assert(counts['decide1']['count'] == 2 * 13)
+        assert(counts['decide2']['count'] == 0)
+        assert(counts['score']['count'] == 2 * 13)
+        assert(counts['roll']['count'] == 2 * 14)  # Including the roll after the last turn
+        assert(player.instrumentation.counts['Scorecard.use_box'] == 2 * 13)
+        assert(player.instrumentation.counts['Scorecard.get_box_score'] == 2 * (13 * 14 // 2))
+
+    def test_simulation(self):
+        """Simulated re-rolls are counted."""
+        player = Player_MonteCarlo_Slow()
+        player.instrumentation = Instrumentation()
+        player._scorecard = CompactScorecard()
+        player._turn_num = 1
+        player._roll_num = 2
+        player._roll = [2, 1, 2, 5, 6]
+        player._exec_policy()
+        assert(player.instrumentation.counts['Simulation.reroll'] == 36 * 13)  # n per goal box
+
+    def test_game_sequence(self):
+        games = GameSequence(Player_NoRerolls_Greedy(), jobs=2, seed=1, is_instrumented=True)
+        games.play(8)
+        phases = games.instrumentation.to_dict()['phases']
+        assert(phases['decide1']['count'] == 8 * 13)
+        assert(games.player.instrumentation is None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,12 +6,24 @@ from copy import deepcopy
 
 from box import Box
 from dice import Dice
+from instrumentation import CountingScorecard
 from scorecard import Scorecard
 # from strategy import Strategy
 
 
 class Player(ABC):
-    def __init__(self):
+    """Base class of the players. scorecard_class is Scorecard, or a class with the same
+    interface, such as CompactScorecard.
+    The dice attribute is Dice, or a DiceSource, and can be replaced between games.
+    The instrumentation attribute is None, or an Instrumentation that records the time spent
+    in each phase of play. When it is None, the only cost is a check per phase.
+    The recorder attribute is None, or a TrajectoryWriter that records every move.
+    """
+    def __init__(self, scorecard_class=Scorecard):
+        self._scorecard_class = scorecard_class
+        self.dice = Dice
+        self.instrumentation = None
+        self.recorder = None
         self._scorecard = None
         self._roll = None
         self._roll_num = None
@@ -27,8 +39,12 @@ class Player(ABC):
         """Carries out first dice roll for each turn.
         Subsequent dice rolls within each turn result from calls to self._reroll().
         """
-        self._roll = Dice.roll()
+        if self.instrumentation is not None:
+            self.instrumentation.start('roll')
+        self._roll = self.dice.roll()
         self._roll_num = 1
+        if self.instrumentation is not None:
+            self.instrumentation.stop()
 
     def _print_new_game(self):
         pass
@@ -79,24 +95,46 @@ class Player(ABC):
     def _reroll(self, reroll):
         assert(self._roll_num <= 2)
         old_roll = self._roll
-        new_roll = Dice.reroll(self._roll, reroll)
+        if self.instrumentation is not None:
+            self.instrumentation.start('roll')
+        new_roll = self.dice.reroll(self._roll, reroll)
+        if self.instrumentation is not None:
+            self.instrumentation.stop()
         self._report_reroll(old_roll, reroll, new_roll)
+        if self.recorder is not None:
+            self.recorder.record_reroll(self._turn_num, self._roll_num, old_roll, reroll)
         self._roll = new_roll
         self._roll_num += 1
 
     def _use_box(self, box):
+        if self.instrumentation is not None:
+            self.instrumentation.start('score')
         self._scorecard.use_box(self._roll, box)
+        if self.instrumentation is not None:
+            self.instrumentation.stop()
+        if self.recorder is not None:
+            self.recorder.record_use_box(self._turn_num, self._roll_num, self._roll, box,
+                                         self._scorecard.get_score())
         self._init_roll()
         self._turn_num += 1
 
     def play(self):
         self._report_new_game()
-        self._scorecard = Scorecard()
+        if self.recorder is not None:
+            self.recorder.start_game()
+        self._scorecard = self._scorecard_class()
+        if self.instrumentation is not None:
+            self._scorecard = CountingScorecard(self._scorecard, self.instrumentation)
         self._turn_num = 1
         self._init_roll()
         while self._turn_num <= Box.nonnone_count():
             if self._roll_num == 1:
                 self._report_turn_beginning()
-            self._exec_policy()
+            if self.instrumentation is None:
+                self._exec_policy()
+            else:
+                self.instrumentation.start(f'decide{self._roll_num}')
+                self._exec_policy()
+                self.instrumentation.stop()
         self._report_summary()
         return self._scorecard.get_score()
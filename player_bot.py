@@ -1,11 +1,48 @@
 #!/usr/bin/env python
 
+from functools import lru_cache, partial
+
+import numpy as np
+
 from box import Box
+from dice import DiceSource
+from game_state import GameState
+from instrumentation import CountingDice
 from player import Player
+from rl import ACTION_BOX_BASE, LinearPolicy, get_observation
+from scorecard import CompactScorecard
+from solver import Solver
+from state_encoder import StateEncoder
 from stats import OptimalPlay, Stats
 from strategy import Strategy
 
 
+def get_goal_deltas(player, get_delta_mean_by_goal):
+    """Returns get_delta_mean_by_goal (one of Strategy._get_delta_*_mean_by_goal) for the
+    Monte Carlo player's current state and unused boxes, memoized in player.decision_cache
+    (if any) by (player class, is_exact, state code), where the state code (see StateEncoder)
+    has upper = 0, as the upper section score does not affect these players.
+    Simulated rolls are drawn from a DiceSource seeded by (player.sim_seed, state code), so the
+    result depends only on the state, whether computed or looked up, and the game dice
+    (player.dice) are not drawn from.
+    """
+    state = GameState.from_player(player)
+    srid = Stats.stat_roll_to_sroll_data[state.roll][1]
+    code = StateEncoder.encode(state.used_mask, 0, int(state.yflag), srid, state.roll_num)
+    def compute():
+        sim_seq = np.random.SeedSequence(player.sim_seed.entropy,
+                                         spawn_key=player.sim_seed.spawn_key + (code,))
+        dice = DiceSource(sim_seq)
+        if player.instrumentation is not None:
+            dice = CountingDice(dice, player.instrumentation)
+        return get_delta_mean_by_goal(state, player._scorecard.get_boxes_unused(), n=36,
+                                      is_exact=player.is_exact, dice=dice)
+    if player.decision_cache is None:
+        return compute()
+    key = (type(player).__name__, player.is_exact, code)
+    return player.decision_cache.get(key, compute)
+
+
 class Player_MonteCarlo_Fast(Player):
     """Player that decides re-rolls using cached probability and scoring data.
     Each box score is compared against "optimal" play,
@@ -13,35 +50,31 @@ class Player_MonteCarlo_Fast(Player):
 
     Implementation overview:
         (1) Map roll to sroll.
-        (2) Determine optimal reroll on sroll, using Stats data.
-        (3) Using unsort, map reroll on sorted dice back to reroll on initial dice ordering.
+        (2) Compare scoring now with each of the 32 re-rolls of the sroll, using the exact
+            expected best delta after the remaining re-roll(s) (see Stats.get_best_deltas).
+        (3) Map the best re-roll on sorted dice back to a re-roll on the initial dice ordering.
+    Decisions are deterministic, and take no simulation.
     """
+    SCORE_NOW_EPS = 1e-9  # Score now rather than keep all dice, when about as good
+
+    def __init__(self, scorecard_class=CompactScorecard):
+        super().__init__(scorecard_class)
+
     def _exec_policy(self):
-        boxes_unused = self._scorecard.get_boxes_unused()
-        if self._roll_num == 1:
-            g2s = Strategy._get_delta_1_mean_by_goal(self, boxes_unused, n=36)
-            box_goal1 = max(g2s, key=g2s.get)
-            reroll1 = Strategy.goals_to_rerolls(self._roll, [box_goal1])[box_goal1]
-            self._reroll(reroll1)
-            return
-        elif self._roll_num == 2:
-            sroll_data = Stats.stat_roll_to_sroll_data[tuple(self._roll)]
-            (sroll, srid, inds, uinds, f_sort, f_unsort) = sroll_data
-            srr2d = { srrid: Stats.get_exp_reroll_delta(srid, srrid, boxes_unused)
-                      for srrid in range(32) }
-            srrid = max(srr2d, key=srr2d.get)
-            sreroll2 = Stats.stat_rerolls[srrid]  # Re-roll using sroll ordering of dice
-            reroll2 = list(map(lambda x: uinds.index(x), sreroll2))
-            self._reroll(reroll2)
-            return
-        else:  # self._roll_num == 3
-            outcomes = { box: self._scorecard.get_box_score(box, self._roll)[0]
-                                  - OptimalPlay.AVG_BOX_SCORES[box.value - 1]
-                         for box in boxes_unused
-                         }
-            scoring_box = max(outcomes, key=lambda b: outcomes[b])
-            self._use_box(scoring_box)
-            return
+        state = GameState.from_player(self)
+        if self._roll_num < 3:
+            (sroll, srid, inds, uinds, f_sort, f_unsort) = (
+                Stats.stat_roll_to_sroll_data[state.roll])
+            exp_deltas = Stats.get_exp_reroll_deltas(srid, state.used_mask, state.yflag,
+                                                     self._roll_num)
+            rrid = int(exp_deltas.argmax())
+            score_now = Stats.get_best_deltas(state.used_mask, state.yflag)[srid]
+            if score_now < exp_deltas[rrid] - Player_MonteCarlo_Fast.SCORE_NOW_EPS:
+                sreroll = Stats.stat_rerolls[rrid]  # Re-roll using sroll ordering of dice
+                self._reroll([inds[pos] for pos in sreroll])
+                return
+        deltas = state.get_box_deltas()
+        self._use_box(max(deltas, key=deltas.get))
 
     def _report_summary(self):
         print(flush=True)
@@ -57,18 +90,26 @@ class Player_MonteCarlo_Slow(Player):
     according to the Yahtzee article on Wikipedia.
     The number of simulated rolls is set by the DEFAULT_MC_ITERATIONS constants
     in class Strategy.
+    If is_exact, roll #3 is not simulated: exact expectations are used instead.
+    If decision_cache (a DecisionCache) is given, the evaluations are memoized in it.
+    The sim_seed attribute is the SeedSequence of the simulated rolls (see get_goal_deltas),
+    which are independent of the dice attribute. Set it, as well as dice, for reproducible play.
     """
+    def __init__(self, is_exact=False, scorecard_class=CompactScorecard, decision_cache=None):
+        super().__init__(scorecard_class)
+        self.is_exact = is_exact
+        self.decision_cache = decision_cache
+        self.sim_seed = np.random.SeedSequence()
+
     def _exec_policy(self):
         if self._roll_num == 1:
-            boxes_unused = self._scorecard.get_boxes_unused()
-            g2s = Strategy._get_delta_1_mean_by_goal(self, boxes_unused, n=36)
+            g2s = get_goal_deltas(self, Strategy._get_delta_1_mean_by_goal)
             box_goal1 = max(g2s, key=g2s.get)
             reroll1 = Strategy.goals_to_rerolls(self._roll, [box_goal1])[box_goal1]
             self._reroll(reroll1)
             return
         elif self._roll_num == 2:
-            boxes_unused = self._scorecard.get_boxes_unused()
-            g2s = Strategy._get_delta_2_mean_by_goal(self, boxes_unused, n=36)
+            g2s = get_goal_deltas(self, Strategy._get_delta_2_mean_by_goal)
             box_goal2 = max(g2s, key=g2s.get)
             reroll2 = Strategy.goals_to_rerolls(self._roll, [box_goal2])[box_goal2]
             self._reroll(reroll2)
@@ -90,11 +131,90 @@ class Player_MonteCarlo_Slow(Player):
         print('.', end='', flush=True)
 
 
+class Player_Optimal(Player):
+    """Player that follows the exact optimal strategy computed by Solver.
+    No simulation is done during play: for each state (used boxes, capped upper score,
+    Yahtzee-scored flag), a turn policy table is derived from Solver.state_values,
+    giving the best rrid (roll #1 and #2) or box (roll #3) for each srid.
+    Each move is then a lookup into that table.
+    Keeping all dice on roll #2 is treated as scoring early.
+    """
+    TURN_POLICY_CACHE_SIZE = 2**15
+
+    def __init__(self, state_values=None, scorecard_class=CompactScorecard):
+        super().__init__(scorecard_class)
+        self._is_default_state_values = state_values is None
+        self._state_values = np.asarray(Solver.state_values if state_values is None
+                                        else state_values)
+        self._get_turn_policy = lru_cache(maxsize=Player_Optimal.TURN_POLICY_CACHE_SIZE)(
+                                    self._compute_turn_policy)
+
+    def __getstate__(self):
+        """Pickles without the turn policy cache, or the (large) default state values,
+        which are reloaded from the on-disk cache when unpickled.
+        """
+        state = dict(vars(self))
+        del state['_get_turn_policy']
+        if self._is_default_state_values:
+            del state['_state_values']
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        if self._is_default_state_values:
+            self._state_values = np.asarray(Solver.state_values)
+        self._get_turn_policy = lru_cache(maxsize=Player_Optimal.TURN_POLICY_CACHE_SIZE)(
+                                    self._compute_turn_policy)
+
+    def _compute_turn_policy(self, turn_state):
+        (mask, upper, yflag) = StateEncoder.decode_turn_state(turn_state)
+        turn_policy = Solver.get_turn_policy(self._state_values, mask, upper, yflag)
+        return tuple(turn_policy.tolist())
+
+    def _exec_policy(self):
+        code = StateEncoder.from_player(self)
+        turn_policy = self._get_turn_policy(code // StateEncoder.TURN_STATE_DIVISOR)
+
+        sroll_data = Stats.stat_roll_to_sroll_data[tuple(self._roll)]
+        (sroll, srid, inds, uinds, f_sort, f_unsort) = sroll_data
+        if self._roll_num < 3:
+            rrid = turn_policy[self._roll_num - 1][srid]
+            if not (rrid == 0 and self._roll_num == 2):
+                sreroll = Stats.stat_rerolls[rrid]  # Re-roll using sroll ordering of dice
+                self._reroll([inds[pos] for pos in sreroll])
+                return
+        self._use_box(Box(turn_policy[2][srid] + 1))
+
+
+class Player_RL(Player):
+    """Player that follows a LinearPolicy trained by self-play reinforcement learning
+    (see rl.py), taking its most probable legal action.
+    If policy is None, the policy has LinearPolicy.trained_weights, which are trained
+    (and cached on disk) on first use.
+    """
+    def __init__(self, policy=None, scorecard_class=CompactScorecard):
+        super().__init__(scorecard_class)
+        self.policy = (LinearPolicy(LinearPolicy.trained_weights) if policy is None
+                       else policy)
+
+    def _exec_policy(self):
+        observation = get_observation(self._scorecard, self._roll, self._roll_num)
+        action = int(self.policy.get_actions(observation[np.newaxis])[0])
+        if action >= ACTION_BOX_BASE:
+            self._use_box(Box(action - ACTION_BOX_BASE + 1))
+            return
+        inds = Stats.stat_roll_to_sroll_data[tuple(self._roll)][2]
+        self._reroll([inds[pos] for pos in Stats.stat_rerolls[action]])  # sroll ordering
+
+
 class Player_NoRerolls_Greedy(Player):
     """Player that on each turn records the dice roll in the best scoring box, without re-rolling.
     Each final box score is compared against the outcome of an optimal player,
     according to the Yahtzee article on Wikipedia.
     """
+    def __init__(self, scorecard_class=CompactScorecard):
+        super().__init__(scorecard_class)
+
     def _exec_policy(self):
         outcomes = { box: self._scorecard.get_box_score(box, self._roll)[0]
                               - OptimalPlay.AVG_BOX_SCORES[box.to_index()]
@@ -107,5 +227,19 @@ class Player_NoRerolls_Greedy(Player):
 class Player_NoRerolls_Random(Player):
     """Player that, on each turn, records the first dice roll in a random scoring box.
     """
+    def __init__(self, scorecard_class=CompactScorecard):
+        super().__init__(scorecard_class)
+
     def _exec_policy(self):
         self._use_box(self._scorecard.get_random_unused_box())
+
+
+BOT_PLAYERS = {  # Factories of the bot players, by name (as in the flags of yahtzee.py)
+    'fast':       Player_MonteCarlo_Fast,
+    'greedy':     Player_NoRerolls_Greedy,
+    'optimal':    Player_Optimal,
+    'random':     Player_NoRerolls_Random,
+    'rl':         Player_RL,
+    'slow':       Player_MonteCarlo_Slow,
+    'slow-exact': partial(Player_MonteCarlo_Slow, is_exact=True),
+}
@@ -1,10 +1,18 @@
 #!/usr/bin/env python
 
+import contextlib
+import io
 import unittest
 
+import numpy as np
+
 from box import Box
-from player_bot import Player_MonteCarlo_Fast
+from dice import DiceSource
+from player_bot import Player_MonteCarlo_Fast, Player_MonteCarlo_Slow, Player_Optimal
+from player_bot import Player_RL
+from rl import LinearPolicy
 from scorecard import Scorecard
+from solver import Solver
 
 
 class Player_MonteCarlo_Fast_Test(unittest.TestCase):
@@ -17,19 +25,95 @@ class Player_MonteCarlo_Fast_Test(unittest.TestCase):
         player._roll_num = 1
         player._roll = [6, 6, 6, 6, 6]  # YAHTZEE
 
+        player._exec_policy()  # Scores now, rather than re-rolling
+        assert(player._turn_num == 2)
+        assert(player._roll_num == 1)
+        assert(player._scorecard.is_box_used[Box.YAHTZEE.to_index()] == 1)
+
+    def test_reroll(self):
+        player = Player_MonteCarlo_Fast()
+        player._scorecard = Scorecard()
+        player._turn_num = 1
+        player._roll_num = 1
+        player._roll = [6, 1, 6, 2, 6]
+
         player._exec_policy()
+        assert(player._turn_num == 1)
         assert(player._roll_num == 2)
-        assert(player._roll == [6, 6, 6, 6, 6])
+        assert([player._roll[k] for k in [0, 2, 4]] == [6, 6, 6])  # The 6s are kept
 
-        player._exec_policy()
-        assert(player._roll_num == 3)
+
+class Player_MonteCarlo_Slow_Test(unittest.TestCase):
+    def test_sim_seed(self):
+        """Simulated rolls are not drawn from the game dice, so the game can be replayed."""
+        player = Player_MonteCarlo_Slow(is_exact=True)
+        player.dice = DiceSource(1, is_recording=True)
+        player.sim_seed = np.random.SeedSequence(2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            score = player.play()
+            recording = player.dice.get_recording()
+            assert(len(recording) <= 3 * 5 * 14)  # Rolls and re-rolls of the game only
+
+            player.dice = DiceSource.replay(recording)
+            player.sim_seed = np.random.SeedSequence(2)
+            assert(player.play() == score)
+
+
+class Player_Optimal_Test(unittest.TestCase):
+    def test_optimal(self):
+        boxes_unused = [Box.YAHTZEE, Box.CHANCE]
+        mask = Solver.MASK_COUNT - 1
+        for box in boxes_unused:
+            mask &= ~(1 << box.to_index())
+        player = Player_Optimal(state_values=Solver.solve(start_mask=mask))
+
+        # Custom initialization
+        player._scorecard = Scorecard()
+        player._scorecard.is_box_used.fill(True)
+        for box in boxes_unused:
+            player._scorecard.is_box_used[box.to_index()] = False
+        player._turn_num = 12
+        player._roll_num = 1
+        player._roll = [6, 6, 6, 6, 6]  # YAHTZEE
+
+        player._exec_policy()  # Keep all dice
+        assert(player._roll_num == 2)
         assert(player._roll == [6, 6, 6, 6, 6])
 
+        player._exec_policy()  # Score early
+        assert(player._turn_num == 13)
+        assert(player._roll_num == 1)
+        assert(player._scorecard.is_box_used[Box.YAHTZEE.to_index()])
+        assert(not player._scorecard.is_box_used[Box.CHANCE.to_index()])
+
+        player._roll = [1, 1, 2, 2, 6]
+        player._exec_policy()  # Chance: Re-roll low dice
+        assert(player._roll_num == 2)
+        assert(player._roll[4] == 6)
+
+
+class Player_RL_Test(unittest.TestCase):
+    def test_rl(self):
+        player = Player_RL(LinearPolicy())
+        player._scorecard = Scorecard()
+        player._turn_num = 1
+        player._roll_num = 1
+        player._roll = [6, 1, 6, 2, 6]
+
+        player._exec_policy()  # As Player_MonteCarlo_Fast, with the initial weights
+        assert(player._roll_num == 2)
+        assert([player._roll[k] for k in [0, 2, 4]] == [6, 6, 6])  # The 6s are kept
+
+        player._roll = [6, 6, 6, 6, 6]  # YAHTZEE
         player._exec_policy()
         assert(player._turn_num == 2)
-        assert(player._roll_num == 1)
         assert(player._scorecard.is_box_used[Box.YAHTZEE.to_index()] == 1)
 
+    def test_play(self):
+        player = Player_RL(LinearPolicy())
+        player.dice = DiceSource(1)
+        assert(player.play() > 0)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import argparse
+import contextlib
+import math
+import os
+from statistics import NormalDist
+import time
+
+import numpy as np
+
+from dice import AlignedDice, Dice
+from player_bot import BOT_PLAYERS
+from score_stats import ScoreStats
+
+
+class PairedComparison:
+    """Comparison of the scores of two players over the same games (e.g., with the same dice,
+    by AlignedDice): the mean of the paired differences (b - a), with a confidence interval,
+    by the normal approximation. As the two scores of a game are correlated, the differences
+    vary less than the difference of independent scores. variance_ratio is the factor by which
+    an unpaired comparison would need more games for an interval of the same width.
+    """
+    def __init__(self, scores_a, scores_b, confidence=0.95):
+        scores_a = np.asarray(scores_a, dtype=float)
+        scores_b = np.asarray(scores_b, dtype=float)
+        assert(len(scores_a) == len(scores_b) >= 2)
+        diffs = scores_b - scores_a
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.count = len(diffs)
+        self.confidence = confidence
+        self.mean = float(diffs.mean())
+        self.stdev = float(diffs.std(ddof=1))
+        self.half_width = z * self.stdev / math.sqrt(self.count)
+        unpaired_variance = float(scores_a.var(ddof=1) + scores_b.var(ddof=1))
+        self.unpaired_half_width = z * math.sqrt(unpaired_variance / self.count)
+        self.variance_ratio = (unpaired_variance / self.stdev**2 if self.stdev > 0
+                               else math.inf)
+
+    @property
+    def interval(self):
+        return (self.mean - self.half_width, self.mean + self.half_width)
+
+    def summary_str(self):
+        (low, high) = self.interval
+        return (f'mean difference {self.mean:+.2f},'
+                f' {100 * self.confidence:g}% CI [{low:+.2f}, {high:+.2f}]'
+                f' (unpaired: +/-{self.unpaired_half_width:.2f};'
+                f' variance ratio {self.variance_ratio:.1f})')
+
+    def to_dict(self):
+        """Returns the comparison as a JSON-compatible dict."""
+        return {'count': self.count,
+                'confidence': self.confidence,
+                'mean': self.mean,
+                'stdev': self.stdev,
+                'interval': list(self.interval),
+                'unpaired_half_width': self.unpaired_half_width,
+                'variance_ratio': self.variance_ratio}
+
+
+def play_stream(player, stream, seed=None):
+    """Plays one game per game of the dice stream (see AlignedDice), and returns the scores.
+    Other randomness (Player_MonteCarlo_Slow's simulated rolls, and the random module, as used
+    by Player_NoRerolls_Random) is seeded from seed (None, an int, or a SeedSequence),
+    independently of the stream.
+    """
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    (sim_seq, other_seq) = seed_seq.spawn(2)
+    dice = AlignedDice(stream)
+    player.dice = dice
+    if hasattr(player, 'sim_seed'):
+        player.sim_seed = sim_seq
+    Dice.seed(int.from_bytes(other_seq.generate_state(4).tobytes(), 'little'))
+    scores = np.empty(len(stream), dtype=np.int64)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for game in range(len(stream)):  # Discard the players' reports
+            dice.start_game(game)
+            scores[game] = player.play()
+    return scores
+
+
+def compare(player_names, stream, seed=None, confidence=0.95):
+    """Plays each named player (see BOT_PLAYERS) over the dice stream, and prints the
+    statistics of its scores, and the comparison with the first player.
+    Returns {name: scores}.
+    """
+    scores_by_name = {}
+    for name in player_names:
+        start = time.perf_counter()
+        scores_by_name[name] = play_stream(BOT_PLAYERS[name](), stream, seed)
+        elapsed = time.perf_counter() - start
+        stats = ScoreStats()
+        stats.add_many(scores_by_name[name])
+        print(f'{name}: {stats.summary_str()} ({len(stream) / elapsed:,.1f} games/sec)')
+    (baseline_name, *other_names) = player_names
+    for name in other_names:
+        comparison = PairedComparison(scores_by_name[baseline_name], scores_by_name[name],
+                                      confidence)
+        print(f'{name} - {baseline_name}: {comparison.summary_str()}')
+    return scores_by_name
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='replay',
+                 description='Compare players over the same pre-generated dice')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = subparsers.add_parser('generate')  # Write a dice stream file
+    generate_parser.add_argument('path')                 # .npy file
+    generate_parser.add_argument('-n', '--number', type=int, default=10_000)  # Number of games
+    generate_parser.add_argument('--seed', type=int, default=None)
+
+    compare_parser = subparsers.add_parser('compare')    # Replay a dice stream file
+    compare_parser.add_argument('path')                  # .npy file, from generate
+    compare_parser.add_argument('players', nargs='+', choices=sorted(BOT_PLAYERS))  # The first is the baseline
+    compare_parser.add_argument('-n', '--number', type=int, default=None)  # Number of games (default: all)
+    compare_parser.add_argument('--seed', type=int, default=None)  # Seed of other randomness
+    compare_parser.add_argument('--confidence', type=float, default=0.95)
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        AlignedDice.generate(args.path, args.number, args.seed)
+    else:
+        stream = AlignedDice.load(args.path)
+        if len(stream[:args.number]) < 2:
+            parser.error('compare needs at least 2 games')
+        compare(args.players, stream[:args.number], args.seed, args.confidence)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+
+from dice import AlignedDice, Dice
+from player_bot import Player_MonteCarlo_Fast, Player_MonteCarlo_Slow, Player_NoRerolls_Greedy
+from replay import PairedComparison, play_stream
+
+
+def get_stream(game_count, seed):
+    rng = np.random.default_rng(seed)
+    return rng.integers(1, Dice.SIDES + 1, (game_count, AlignedDice.TURN_COUNT, 3, Dice.COUNT))
+
+
+class PairedComparisonTest(unittest.TestCase):
+    def test_paired(self):
+        rng = np.random.default_rng(1)
+        scores_a = rng.normal(250, 60, 10_000)
+        scores_b = scores_a + 5 + rng.normal(0, 10, 10_000)  # Strongly correlated
+        comparison = PairedComparison(scores_a, scores_b)
+        (low, high) = comparison.interval
+        assert(low < 5 < high)
+        assert(comparison.half_width < comparison.unpaired_half_width)
+        assert(60 < comparison.variance_ratio < 80)  # About 2 * 60**2 / 10**2
+
+    def test_identical(self):
+        comparison = PairedComparison([200, 250, 300], [200, 250, 300])
+        assert(comparison.mean == comparison.half_width == 0)
+        assert(comparison.variance_ratio == float('inf'))
+
+
+class PlayStreamTest(unittest.TestCase):
+    def test_reproducible(self):
+        stream = get_stream(5, seed=2)
+        scores = play_stream(Player_MonteCarlo_Fast(), stream)
+        assert(np.array_equal(play_stream(Player_MonteCarlo_Fast(), stream), scores))
+        assert(len(scores) == 5)
+
+    def test_replay_game(self):
+        """The score of a game depends only on the dice of that game in the stream."""
+        stream = get_stream(3, seed=3)
+        player = Player_NoRerolls_Greedy()
+        scores = play_stream(player, stream)
+        for game in reversed(range(3)):
+            player.dice.start_game(game)
+            assert(player.play() == scores[game])
+
+    def test_sim_seed(self):
+        """Player_MonteCarlo_Slow simulates with its own dice, leaving the stream aligned."""
+        stream = get_stream(1, seed=4)
+        player = Player_MonteCarlo_Slow()
+        scores = play_stream(player, stream, seed=5)
+        assert(np.array_equal(play_stream(Player_MonteCarlo_Slow(), stream, seed=5), scores))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from box import Box
+from dice import Dice
+from scorecard import CompactScorecard, Scorecard
+from simulator import GameBatch
+from state_encoder import FeatureCache, StateEncoder
+from stats import OptimalPlay, Stats
+from table_cache import TableCache
+from util import Util
+
+
+ACTION_BOX_BASE = GameBatch.ACTION_BOX_BASE
+ACTION_COUNT = ACTION_BOX_BASE + Box.nonnone_count()
+FULL_MASK = 2**Box.nonnone_count() - 1
+
+
+def get_observation(scorecard, roll, roll_num):
+    """Returns the observation of a game: the int64 array (used_mask, upper, yflag, srid, roll_num),
+    where upper is the upper section score capped at Scorecard.UPPER_THRESHOLD (as in Solver),
+    and yflag is 1 iff the YAHTZEE box has been scored with 50 points.
+    See StateEncoder, which encodes observations as single int64 codes.
+    """
+    return np.array(StateEncoder.get_state(scorecard, roll, roll_num), dtype=np.int64)
+
+
+def get_legal_actions(observations):
+    """Returns the (n, ACTION_COUNT) bool array of the legal actions, given (n, 5) observations:
+    re-rolls on rolls #1 and #2, and unused boxes.
+    """
+    (used_mask, upper, yflag, srids, roll_num) = observations.T
+    result = np.empty((len(observations), ACTION_COUNT), dtype=bool)
+    result[:, :ACTION_BOX_BASE] = (roll_num < 3)[:, np.newaxis]
+    result[:, ACTION_BOX_BASE:] = ((used_mask[:, np.newaxis]
+                                    >> np.arange(Box.nonnone_count())) & 1) == 0
+    return result
+
+
+class YahtzeeEnv:
+    """Gym-style environment for one game of Yahtzee, with the rules of scorecard_class,
+    and dice from dice (Dice, or a DiceSource).
+      * Observation: See get_observation().
+      * Action: As for GameBatch. 0 to 31 re-rolls the dice given by the rrid (see Stats)
+            of the sorted roll, on rolls #1 and #2. ACTION_BOX_BASE + k uses the box with index k.
+      * Reward: The increase in score, bonuses included, so the rewards of a game sum to its score.
+    step(action) returns (observation, reward, done, info), and raises ValueError for an
+    illegal action. When done, info['score'] is the final score.
+    """
+    def __init__(self, dice=Dice, scorecard_class=CompactScorecard):
+        self.dice = dice
+        self._scorecard_class = scorecard_class
+        self.scorecard = None
+        self.roll = None
+        self.roll_num = None
+
+    def get_legal_actions(self):
+        return get_legal_actions(self.get_observation()[np.newaxis])[0]
+
+    def get_observation(self):
+        return get_observation(self.scorecard, self.roll, self.roll_num)
+
+    def reset(self):
+        self.scorecard = self._scorecard_class()
+        self.roll = sorted(self.dice.roll())
+        self.roll_num = 1
+        return self.get_observation()
+
+    def step(self, action):
+        if not (0 <= action < ACTION_COUNT and self.get_legal_actions()[action]):
+            raise ValueError(f'Illegal action {action} on roll #{self.roll_num}')
+        if action < ACTION_BOX_BASE:
+            self.roll = sorted(self.dice.reroll(self.roll, Stats.stat_rerolls[action]))
+            self.roll_num += 1
+            return (self.get_observation(), 0, False, {})
+        score = self.scorecard.get_score()
+        self.scorecard.use_box(self.roll, Box(action - ACTION_BOX_BASE + 1))
+        reward = self.scorecard.get_score() - score
+        if self.scorecard.used_mask == FULL_MASK:
+            return (self.get_observation(), reward, True, {'score': self.scorecard.get_score()})
+        self.roll = sorted(self.dice.roll())
+        self.roll_num = 1
+        return (self.get_observation(), reward, False, {})
+
+
+class VectorYahtzeeEnv:
+    """game_count games of Yahtzee on a GameBatch, stepped together with NumPy.
+    step(actions) takes one action per game, as for YahtzeeEnv, and returns
+    (observations, rewards, dones, info), with a row or entry per game.
+    Each game moves on to its next turn when it uses a box, even before roll #3,
+    so the games need not be on the same turn or roll.
+    A game that ends is reset at once, so its observation is the first of a new game,
+    and its final score is in info['scores'] (which is -1 for the games that did not end).
+    """
+    def __init__(self, game_count, rng=None):
+        self.game_count = game_count
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.games = None
+        self.rolls = None
+        self.srids = None
+        self.roll_num = None
+
+    def get_legal_actions(self):
+        return get_legal_actions(self.get_observations())
+
+    def get_observations(self):
+        games = self.games
+        return np.stack([games.used_mask, games.upper, games.yflag, self.srids, self.roll_num],
+                        axis=1).astype(np.int64)
+
+    def reset(self):
+        self.games = GameBatch(self.game_count, self.rng)
+        self.rolls = self.games.roll(self.game_count)
+        self.srids = self.games.get_srids(self.rolls)
+        self.roll_num = np.ones(self.game_count, dtype=np.int64)
+        return self.get_observations()
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.intp)
+        legal_actions = self.get_legal_actions()
+        if not legal_actions[np.arange(self.game_count), actions].all():
+            raise ValueError('Illegal action(s)')
+        rewards = np.zeros(self.game_count, dtype=np.int64)
+        dones = np.zeros(self.game_count, dtype=bool)
+        scores = np.full(self.game_count, -1, dtype=np.int64)
+
+        is_reroll = actions < ACTION_BOX_BASE
+        rerolling = np.flatnonzero(is_reroll)
+        self.rolls[rerolling] = self.games.reroll(self.rolls[rerolling], actions[rerolling])
+        self.roll_num[rerolling] += 1
+
+        scoring = np.flatnonzero(~is_reroll)
+        if len(scoring):
+            score_before = self.games.get_scores(scoring)
+            self.games.use_boxes(scoring, self.srids[scoring],
+                                 actions[scoring] - ACTION_BOX_BASE)
+            rewards[scoring] = self.games.get_scores(scoring) - score_before
+            ending = scoring[self.games.used_mask[scoring] == FULL_MASK]
+            dones[ending] = True
+            scores[ending] = self.games.get_scores(ending)
+            self.games.clear_games(ending)
+            self.rolls[scoring] = self.games.roll(len(scoring))
+            self.roll_num[scoring] = 1
+        self.srids = self.games.get_srids(self.rolls)
+        return (self.get_observations(), rewards, dones, {'scores': scores})
+
+
+class LinearPolicy:
+    """Softmax policy over the legal actions, with logits linear in features of each action
+    (see get_features), so weights has shape (FEATURE_COUNT,). The features are:
+      * delta: For a box, its score (with the Joker Rule) less its mean under optimal play.
+            For a re-roll, the expected best delta after it, with the best remaining
+            re-roll (see Stats.get_best_deltas). Both are divided by DELTA_SCALE.
+      * is_reroll: 1 for re-rolls.
+      * upper_bonus: 1 for an upper box whose score earns the Upper Bonus.
+      * upper_par: For an upper box, its score less three of its dice, divided by DELTA_SCALE.
+      * is_zero: 1 for a box that would score 0.
+      * is_<box>: 1 for the given box. (One feature per box.)
+    The initial weights are those of the delta feature only, with which the most probable
+    action is that of Player_MonteCarlo_Fast.
+    If feature_cache (a FeatureCache of get_features) is given, get_actions() looks up
+    the features there.
+    """
+    FEATURES = (['delta', 'is_reroll', 'upper_bonus', 'upper_par', 'is_zero']
+                + [f'is_{box.name.lower()}' for box in Box.nonnone_boxes()])
+    FEATURE_COUNT = len(FEATURES)
+    DELTA_SCALE = 10.0
+    INITIAL_DELTA_WEIGHT = 10.0
+
+    KEEP_DELTAS_CACHE_SIZE = 2**14  # Entries of _keep_deltas (at most 61 MB, of 462 floats each)
+    TRAINING_GAME_COUNT = 200_000  # Of train(), by default
+    TRAINING_SEED = 1  # Of the rng of train(), for trained_weights
+    TABLE_FORMAT_VERSION = 1
+
+    _cache = TableCache('rl', TABLE_FORMAT_VERSION)
+
+    def __init__(self, weights=None, feature_cache=None):
+        self.weights = (LinearPolicy.get_initial_weights() if weights is None
+                        else np.array(weights, dtype=np.double))
+        self.feature_cache = feature_cache
+
+    @Util.lazy_static
+    def trained_weights(cls):
+        """Weights trained by train() with its defaults, and cached on disk.
+        If they are not cached, training takes a minute or two, with progress on stderr.
+        """
+        return cls.get_trained_weights()
+
+    @staticmethod
+    def get_trained_weights(game_count=TRAINING_GAME_COUNT, seed=TRAINING_SEED):
+        """Returns the weights trained by train() over game_count games, with its rng seeded
+        with seed, from the on-disk cache, where each (game_count, seed) has its own table
+        (see get_weights_name). If they are not cached, they are trained and cached.
+        """
+        def build():
+            print('Training the policy of the Reinforcement Learning Player, which takes'
+                  ' a minute or two. (Run rl.py to train and cache it ahead of time.)',
+                  file=sys.stderr, flush=True)
+            return train(game_count, rng=np.random.default_rng(seed), do_print_progress=True,
+                         progress_file=sys.stderr).weights
+        return LinearPolicy._cache.get(LinearPolicy.get_weights_name(game_count, seed), build)
+
+    @staticmethod
+    def get_weights_name(game_count=TRAINING_GAME_COUNT, seed=TRAINING_SEED):
+        """Returns the name of the cached table of the weights trained over game_count games
+        with the given seed: 'weights' for the defaults (those of trained_weights).
+        """
+        if (game_count, seed) == (LinearPolicy.TRAINING_GAME_COUNT, LinearPolicy.TRAINING_SEED):
+            return 'weights'
+        return f'weights-{game_count}-{seed}'
+
+    @staticmethod
+    def is_trained_cached():
+        """Returns whether trained_weights is cached on disk, so that it need not be trained."""
+        return LinearPolicy._cache.has(LinearPolicy.get_weights_name())
+
+    @Util.lazy_static
+    def _box_features(cls):
+        """The features of the boxes that do not depend on the observation: (13, FEATURE_COUNT)"""
+        result = np.zeros((Box.nonnone_count(), LinearPolicy.FEATURE_COUNT))
+        result[:, LinearPolicy.FEATURES.index('is_aces'):] = np.eye(Box.nonnone_count())
+        return result
+
+    @Util.lazy_static
+    def _keep_deltas(cls):
+        """Bounded cache of the (462,) expected best deltas after each keep, on roll #1 or #2,
+        which depend on (used_mask, yflag, roll_num) only. It is keyed by the StateEncoder code
+        of the state with upper and srid 0, and filled in by get_exp_reroll_deltas().
+        """
+        def compute(states):
+            (used_mask, _, yflag, _, roll_num) = states.T
+            result = np.empty((len(states), len(Stats.stat_keeps)))
+            for roll_index in [0, 1]:
+                rows = np.flatnonzero(roll_num == roll_index + 1)
+                if len(rows):
+                    best_deltas = Stats.get_best_deltas_many(used_mask[rows], yflag[rows],
+                                                             roll_index + 2)
+                    result[rows] = Stats.get_keep_values(best_deltas).T
+            return result
+        return FeatureCache(compute, LinearPolicy.KEEP_DELTAS_CACHE_SIZE)
+
+    @Util.lazy_static
+    def _srolls(cls):
+        return np.array(Stats.stat_srolls)
+
+    @Util.lazy_static
+    def _used_counts(cls):
+        """used_mask --> number of boxes used."""
+        return np.array([bin(mask).count('1') for mask in range(FULL_MASK + 1)])
+
+    @staticmethod
+    def get_initial_weights():
+        weights = np.zeros(LinearPolicy.FEATURE_COUNT)
+        weights[LinearPolicy.FEATURES.index('delta')] = LinearPolicy.INITIAL_DELTA_WEIGHT
+        return weights
+
+    @staticmethod
+    def get_features(observations):
+        """Returns the (n, ACTION_COUNT, FEATURE_COUNT) features of each action,
+        given (n, 5) observations. The features of illegal actions are zero, or arbitrary.
+        """
+        (used_mask, upper, yflag, srids, roll_num) = observations.T
+        features = np.zeros((len(observations), ACTION_COUNT, LinearPolicy.FEATURE_COUNT))
+        (delta, is_reroll, upper_bonus, upper_par, is_zero) = range(5)
+
+        srolls = LinearPolicy._srolls[srids]
+        is_yahtzee = srolls[:, 0] == srolls[:, 4]
+        is_upper_box_used = ((used_mask >> (srolls[:, 0] - 1)) & 1) == 1
+        scores = Scorecard.apply_joker_overlay(np.asarray(Stats.stat_scores)[srids],
+                                               is_yahtzee, yflag == 1, is_upper_box_used)
+        box_features = features[:, ACTION_BOX_BASE:]
+        box_features[:] = LinearPolicy._box_features
+        box_features[..., delta] = ((scores - OptimalPlay.AVG_BOX_SCORES)
+                                    / LinearPolicy.DELTA_SCALE)
+        box_features[..., is_zero] = scores == 0
+        upper_count = len(Scorecard.boxes_section_upper)
+        upper_scores = scores[:, :upper_count]
+        box_features[:, :upper_count, upper_bonus] = (
+            (upper[:, np.newaxis] < Scorecard.UPPER_THRESHOLD)
+            & (upper[:, np.newaxis] + upper_scores >= Scorecard.UPPER_THRESHOLD))
+        box_features[:, :upper_count, upper_par] = (
+            (upper_scores - 3 * np.arange(1, upper_count + 1)) / LinearPolicy.DELTA_SCALE)
+
+        rerolling = np.flatnonzero(roll_num < 3)
+        if len(rerolling):
+            features[rerolling, :ACTION_BOX_BASE, is_reroll] = 1
+            features[rerolling, :ACTION_BOX_BASE, delta] = (
+                LinearPolicy.get_exp_reroll_deltas(observations[rerolling])
+                / LinearPolicy.DELTA_SCALE)
+        return features
+
+    @staticmethod
+    def get_exp_reroll_deltas(observations):
+        """Returns the (n, 32) expected best deltas after each rrid, given (n, 5) observations
+        on roll #1 or #2. The expected deltas after each keep are cached by state, and computed
+        for all the states of a batch missing from the cache together (see _keep_deltas).
+        """
+        (used_mask, upper, yflag, srids, roll_num) = observations.T
+        zeros = np.zeros_like(used_mask)
+        codes = StateEncoder.encode_many(np.stack([used_mask, zeros, yflag, zeros, roll_num],
+                                                  axis=1))
+        (keys, inverse) = np.unique(codes, return_inverse=True)
+        keep_deltas = LinearPolicy._keep_deltas.get_many(keys)
+        return keep_deltas[inverse[:, np.newaxis], Stats.stat_kid_by_rrid[srids]]
+
+    def get_probabilities(self, features, legal_actions):
+        """Returns the (n, ACTION_COUNT) probabilities of each action."""
+        logits = np.where(legal_actions, features @ self.weights, -np.inf)
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def get_actions(self, observations, rng=None):
+        """Returns an action for each of the (n, 5) observations: the most probable legal action,
+        or, if rng is given, one sampled from the policy.
+        Ties are broken in favor of the highest action, so that scoring now is preferred to
+        keeping all dice (rrid 0), whose expected value on roll #2 is the same.
+        """
+        if self.feature_cache is None:
+            features = LinearPolicy.get_features(observations)
+        else:
+            features = self.feature_cache.get_many(StateEncoder.encode_many(observations))
+        legal_actions = get_legal_actions(observations)
+        if rng is None:
+            logits = np.where(legal_actions, features @ self.weights, -np.inf)
+            return ACTION_COUNT - 1 - logits[:, ::-1].argmax(axis=1)
+        return sample_actions(self.get_probabilities(features, legal_actions), rng)
+
+
+def evaluate(policy, game_count, batch_size=4096, rng=None):
+    """Plays game_count games with the policy's most probable actions. Returns the scores."""
+    env = VectorYahtzeeEnv(min(batch_size, game_count), rng)
+    observations = env.reset()
+    scores = []
+    while len(scores) < game_count:
+        (observations, rewards, dones, info) = env.step(policy.get_actions(observations))
+        scores.extend(info['scores'][dones].tolist())
+    return np.array(scores[:game_count])
+
+
+def train(game_count=LinearPolicy.TRAINING_GAME_COUNT, batch_size=1024, rollout_steps=64,
+          learning_rate=0.05, policy=None, rng=None, do_print_progress=False,
+          progress_file=None):
+    """Trains a LinearPolicy by self-play on a VectorYahtzeeEnv of batch_size games, with
+    REINFORCE: after every rollout_steps steps, the weights follow the policy gradient, with
+    the return of each step (the rest of its game's score) less a baseline, the mean return
+    over the steps with the same number of boxes used and roll_num.
+    Steps of games that have not ended by the end of a rollout are used after a later one.
+    Training stops once game_count games have ended. Returns the policy.
+    If do_print_progress, the mean score of recent games is printed to progress_file
+    (default: stdout) after each rollout in which games ended.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    policy = LinearPolicy() if policy is None else policy
+    env = VectorYahtzeeEnv(batch_size, rng)
+    observations = env.reset()
+    optimizer = AdamOptimizer(learning_rate)
+    history = []  # [grads, rewards, dones, baseline_keys, is_pending] by step
+    games_ended = 0
+    scores = []
+    start = time.perf_counter()
+    while games_ended < game_count:
+        for _ in range(rollout_steps):
+            features = LinearPolicy.get_features(observations)
+            probabilities = policy.get_probabilities(features, get_legal_actions(observations))
+            actions = sample_actions(probabilities, rng)
+            grads = (features[np.arange(batch_size), actions]
+                     - np.einsum('na,naf->nf', probabilities, features))
+            baseline_keys = (LinearPolicy._used_counts[observations[:, 0]] * 3
+                             + observations[:, 4] - 1)
+            (observations, rewards, dones, info) = env.step(actions)
+            history.append([grads, rewards, dones, baseline_keys,
+                            np.ones(batch_size, dtype=bool)])
+            games_ended += int(dones.sum())
+            scores.extend(info['scores'][dones].tolist())
+
+        # The steps of games that have ended since, with their returns
+        returns = np.zeros(batch_size)
+        is_ended = np.zeros(batch_size, dtype=bool)
+        steps = []
+        for step in reversed(history):
+            (grads, rewards, dones, baseline_keys, is_pending) = step
+            returns = rewards + np.where(dones, 0, returns)
+            is_ended |= dones
+            is_used = is_ended & is_pending
+            steps.append((grads[is_used], returns[is_used], baseline_keys[is_used]))
+            step[4] = is_pending & ~is_ended
+        while history and not history[0][4].any():
+            history.pop(0)
+
+        grads = np.concatenate([step[0] for step in steps])
+        returns = np.concatenate([step[1] for step in steps])
+        baseline_keys = np.concatenate([step[2] for step in steps])
+        key_counts = np.bincount(baseline_keys, minlength=3 * (Box.nonnone_count() + 1))
+        baselines = (np.bincount(baseline_keys, weights=returns, minlength=len(key_counts))
+                     / np.maximum(key_counts, 1))
+        advantages = returns - baselines[baseline_keys]
+        gradient = (advantages @ grads) / max(len(advantages), 1)
+        policy.weights += optimizer.get_step(gradient)
+
+        if do_print_progress and scores:
+            elapsed = time.perf_counter() - start
+            print(f'{games_ended:>9,} games: mean score {np.mean(scores):.2f}'
+                  f' ({games_ended / elapsed:,.0f} games/sec)', file=progress_file, flush=True)
+            scores = []
+    return policy
+
+
+class AdamOptimizer:
+    """Adam (Kingma and Ba, 2014), for gradient ascent: each weight takes steps of about
+    learning_rate, whatever the scale of its gradient.
+    """
+    BETA1 = 0.9
+    BETA2 = 0.999
+    EPS = 1e-8
+
+    def __init__(self, learning_rate):
+        self.learning_rate = learning_rate
+        self.m = 0.0
+        self.v = 0.0
+        self.t = 0
+
+    def get_step(self, gradient):
+        self.t += 1
+        self.m = AdamOptimizer.BETA1 * self.m + (1 - AdamOptimizer.BETA1) * gradient
+        self.v = AdamOptimizer.BETA2 * self.v + (1 - AdamOptimizer.BETA2) * gradient**2
+        m_hat = self.m / (1 - AdamOptimizer.BETA1**self.t)
+        v_hat = self.v / (1 - AdamOptimizer.BETA2**self.t)
+        return self.learning_rate * m_hat / (np.sqrt(v_hat) + AdamOptimizer.EPS)
+
+
+def sample_actions(probabilities, rng):
+    """Returns an action for each row of the (n, ACTION_COUNT) probabilities, sampled from it."""
+    thresholds = rng.random((len(probabilities), 1))
+    actions = (probabilities.cumsum(axis=1) < thresholds).sum(axis=1)
+    return actions.clip(max=ACTION_COUNT - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='rl',
+                 description='Train (and cache) the policy of the Reinforcement Learning Player')
+    parser.add_argument('-f', '--force', action='store_true')  # Train even if cached
+    parser.add_argument('-n', '--number', type=int,  # Number of training games
+                        default=LinearPolicy.TRAINING_GAME_COUNT)
+    parser.add_argument('--seed', type=int, default=LinearPolicy.TRAINING_SEED)
+    parser.add_argument('-e', '--evaluate', type=int, default=100_000)  # Number of evaluation games
+    args = parser.parse_args()
+
+    # Weights trained with other than the defaults are cached apart from trained_weights,
+    # which the Reinforcement Learning Player uses.
+    weights_name = LinearPolicy.get_weights_name(args.number, args.seed)
+    start = time.perf_counter()
+    if args.force:
+        policy = train(args.number, rng=np.random.default_rng(args.seed),
+                       do_print_progress=True)
+        LinearPolicy._cache.save(weights_name, policy.weights)
+    else:
+        policy = LinearPolicy(LinearPolicy.get_trained_weights(args.number, args.seed))
+    elapsed = time.perf_counter() - start
+    print(f'Weights ({weights_name}, in {elapsed:.1f} seconds):')
+    for (feature, weight) in zip(LinearPolicy.FEATURES, policy.weights):
+        print(f'  {feature:<20} {weight:>8.3f}')
+    scores = evaluate(policy, args.evaluate, rng=np.random.default_rng(args.seed + 1))
+    print(f'Mean score over {args.evaluate:,} games: {scores.mean():.2f}'
+          f' (stdev {scores.std():.2f})')
+
+
+if __name__ == '__main__':
+    main()
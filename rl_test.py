@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import contextlib
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from box import Box
+from config import Config
+from dice import DiceSource
+from rl import ACTION_BOX_BASE, ACTION_COUNT, LinearPolicy, VectorYahtzeeEnv, YahtzeeEnv
+from rl import evaluate, get_legal_actions, train
+from scorecard import Scorecard
+from stats import OptimalPlay, Stats
+
+
+def get_random_actions(legal_actions, rng):
+    return (rng.random(legal_actions.shape) * legal_actions).argmax(axis=1)
+
+
+class LinearPolicyTest(unittest.TestCase):
+    def test_features(self):
+        yahtzee_6s = Stats.stat_sroll_to_srid[(6, 6, 6, 6, 6)]
+        observations = np.array([[0, 0, 0, yahtzee_6s, 1], [0, 60, 0, yahtzee_6s, 3]])
+        features = LinearPolicy.get_features(observations)
+        assert(features.shape == (2, ACTION_COUNT, LinearPolicy.FEATURE_COUNT))
+        (delta, is_reroll, upper_bonus, upper_par, is_zero) = range(5)
+
+        yahtzee = ACTION_BOX_BASE + Box.YAHTZEE.to_index()
+        sixes = ACTION_BOX_BASE + Box.SIXES.to_index()
+        assert(features[0, yahtzee, delta]
+               == (50 - OptimalPlay.AVG_BOX_SCORES[Box.YAHTZEE.to_index()]) / 10)
+        assert(features[0, sixes, upper_par] == (30 - 18) / 10)
+        assert(features[0, sixes, upper_bonus] == 0 and features[1, sixes, upper_bonus] == 1)
+        assert(features[0, ACTION_BOX_BASE + Box.ACES.to_index(), is_zero] == 1)
+        assert(features[0, 31, is_reroll] == 1 and features[1, 31, is_reroll] == 0)
+
+        exp_deltas = Stats.get_exp_reroll_deltas(yahtzee_6s, 0, False, 1)
+        assert(np.allclose(features[0, :ACTION_BOX_BASE, delta], exp_deltas / 10))
+
+    def test_keep_deltas_cached(self):
+        observations = np.array([[0, 0, 0, 7, 1], [3, 5, 1, 100, 2], [0, 0, 0, 9, 1]])
+        deltas = LinearPolicy.get_exp_reroll_deltas(observations)
+        misses = LinearPolicy._keep_deltas.misses
+        assert(np.array_equal(LinearPolicy.get_exp_reroll_deltas(observations), deltas))
+        assert(LinearPolicy._keep_deltas.misses == misses)
+        assert(len(LinearPolicy._keep_deltas) <= LinearPolicy.KEEP_DELTAS_CACHE_SIZE)
+        assert(np.allclose(deltas[1], Stats.get_exp_reroll_deltas(100, 3, True, 2)))
+
+    def test_initial_policy(self):
+        """The initial policy plays about as well as Player_MonteCarlo_Fast."""
+        scores = evaluate(LinearPolicy(), 500, rng=np.random.default_rng(1))
+        assert(len(scores) == 500)
+        assert(215 < scores.mean() < 250)
+
+    def test_sampled_actions_are_legal(self):
+        rng = np.random.default_rng(2)
+        env = VectorYahtzeeEnv(100, rng)
+        observations = env.reset()
+        for _ in range(40):
+            actions = LinearPolicy().get_actions(observations, rng)
+            assert(get_legal_actions(observations)[np.arange(100), actions].all())
+            (observations, rewards, dones, info) = env.step(actions)
+
+    def test_train(self):
+        policy = train(100, batch_size=32, rollout_steps=48, rng=np.random.default_rng(3))
+        assert(policy.weights.shape == (LinearPolicy.FEATURE_COUNT,))
+        assert(not np.array_equal(policy.weights, LinearPolicy.get_initial_weights()))
+
+    def test_trained_weights_by_arguments(self):
+        """Weights trained with other than the defaults do not replace trained_weights."""
+        assert(LinearPolicy.get_weights_name() == 'weights')
+        assert(LinearPolicy.get_weights_name(100, 3) == 'weights-100-3')
+        orig_cache_dir = Config.CACHE_DIR
+        with tempfile.TemporaryDirectory() as tmpdir, open(os.devnull, 'w') as devnull:
+            try:
+                Config.CACHE_DIR = tmpdir
+                with contextlib.redirect_stderr(devnull):
+                    weights = LinearPolicy.get_trained_weights(100, 3)
+                assert(LinearPolicy._cache.has('weights-100-3'))
+                assert(not LinearPolicy.is_trained_cached())
+                assert(np.array_equal(LinearPolicy.get_trained_weights(100, 3), weights))
+            finally:
+                Config.CACHE_DIR = orig_cache_dir
+
+
+class VectorYahtzeeEnvTest(unittest.TestCase):
+    def test_matches_scorecard(self):
+        """Replays the moves of random games through Scorecard."""
+        rng = np.random.default_rng(4)
+        env = VectorYahtzeeEnv(50, rng)
+        observations = env.reset()
+        scorecards = [Scorecard() for _ in range(50)]
+        reward_sums = np.zeros(50, dtype=int)
+        game_count = 0
+        while game_count < 200:
+            actions = get_random_actions(env.get_legal_actions(), rng)
+            (observations2, rewards, dones, info) = env.step(actions)
+            reward_sums += rewards
+            for game in np.flatnonzero(actions >= ACTION_BOX_BASE):
+                sroll = list(Stats.stat_srolls[observations[game, 3]])
+                scorecards[game].use_box(sroll, Box(actions[game] - ACTION_BOX_BASE + 1))
+                assert(observations2[game, 4] == 1)
+            for game in np.flatnonzero(dones):
+                assert(info['scores'][game] == scorecards[game].get_score()
+                       == reward_sums[game])
+                scorecards[game] = Scorecard()
+                reward_sums[game] = 0
+                assert(observations2[game, 0] == 0)
+            game_count += int(dones.sum())
+            observations = observations2
+        assert((info['scores'][~dones] == -1).all())
+
+    def test_illegal_action(self):
+        env = VectorYahtzeeEnv(2, np.random.default_rng(5))
+        env.reset()
+        env.step([ACTION_BOX_BASE, 31])
+        with self.assertRaises(ValueError):
+            env.step([ACTION_BOX_BASE, 31])  # The first box is used in game 0
+
+
+class YahtzeeEnvTest(unittest.TestCase):
+    def test_rewards_sum_to_score(self):
+        rng = np.random.default_rng(6)
+        env = YahtzeeEnv(DiceSource(6))
+        observation = env.reset()
+        (reward_sum, done, step_count) = (0, False, 0)
+        while not done:
+            legal_actions = env.get_legal_actions()
+            action = int(get_random_actions(legal_actions[np.newaxis], rng)[0])
+            (observation, reward, done, info) = env.step(action)
+            reward_sum += reward
+            step_count += 1
+        assert(Box.nonnone_count() <= step_count <= 3 * Box.nonnone_count())
+        assert(info['score'] == reward_sum == env.scorecard.get_score())
+
+    def test_illegal_actions(self):
+        env = YahtzeeEnv(DiceSource(7))
+        env.reset()
+        env.step(31)
+        env.step(31)
+        with self.assertRaises(ValueError):
+            env.step(31)  # No re-roll on roll #3
+        env.step(ACTION_BOX_BASE)
+        with self.assertRaises(ValueError):
+            env.step(ACTION_BOX_BASE)  # The box is used
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import math
+
+import numpy as np
+
+
+class ScoreStats:
+    """Streaming statistics of game scores, in O(1) memory (unless is_keeping_scores):
+    count, mean and variance (by Welford's algorithm), min, max, and a histogram with one
+    bin per score from 0 to MAX_SCORE, from which quantiles are read.
+    Instances from different chunks of games, or different processes, combine with merge().
+    """
+    MAX_SCORE = 1575  # 13 Yahtzees, scored optimally
+
+    def __init__(self, is_keeping_scores=False):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared differences from the mean
+        self.min = None
+        self.max = None
+        self.histogram = np.zeros(ScoreStats.MAX_SCORE + 1, dtype=np.int64)
+        self.scores = [] if is_keeping_scores else None
+
+    def add(self, score):
+        assert(0 <= score <= ScoreStats.MAX_SCORE)
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (score - self.mean)
+        self.min = score if self.min is None else min(self.min, score)
+        self.max = score if self.max is None else max(self.max, score)
+        self.histogram[score] += 1
+        if self.scores is not None:
+            self.scores.append(score)
+
+    def add_many(self, scores):
+        """Adds an array of scores, as a single merge."""
+        scores = np.asarray(scores, dtype=np.int64)
+        if len(scores) == 0:
+            return
+        other = ScoreStats(self.scores is not None)
+        assert(scores.min() >= 0 and scores.max() <= ScoreStats.MAX_SCORE)
+        other.count = len(scores)
+        other.mean = float(scores.mean())
+        other.m2 = float(((scores - other.mean)**2).sum())
+        other.min = int(scores.min())
+        other.max = int(scores.max())
+        other.histogram = np.bincount(scores, minlength=ScoreStats.MAX_SCORE + 1)
+        if other.scores is not None:
+            other.scores = scores.tolist()
+        self.merge(other)
+
+    def merge(self, other):
+        """Adds the scores summarized by other, by Chan et al.'s parallel variance formula."""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.histogram += other.histogram
+        if self.scores is not None:
+            self.scores.extend(other.scores)
+
+    def get_quantile(self, q):
+        """Returns the smallest score s such that at least a fraction q of scores are <= s."""
+        assert(self.count > 0 and 0 <= q <= 1)
+        rank = max(1, math.ceil(q * self.count))
+        return int(np.searchsorted(np.cumsum(self.histogram), rank))
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def variance(self):
+        """Sample variance."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def summary_str(self):
+        if self.count == 0:
+            return 'No scores'
+        quantiles = '  '.join(f'p{round(100 * q)}={self.get_quantile(q)}'
+                              for q in [0.05, 0.25, 0.5, 0.75, 0.95])
+        return (f'mean {self.mean:.2f}, stdev {self.stdev:.2f},'
+                f' min {self.min}, max {self.max}, {quantiles}')
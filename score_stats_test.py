@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import pickle
+import statistics
+import unittest
+
+import numpy as np
+
+from score_stats import ScoreStats
+
+
+class ScoreStatsTest(unittest.TestCase):
+    def test_add(self):
+        scores = [120, 250, 98, 1575, 0, 187, 250]
+        stats = ScoreStats(is_keeping_scores=True)
+        for score in scores:
+            stats.add(score)
+        assert(stats.count == len(scores))
+        assert(abs(stats.mean - statistics.mean(scores)) < 1e-9)
+        assert(abs(stats.variance - statistics.variance(scores)) < 1e-6)
+        assert((stats.min, stats.max) == (0, 1575))
+        assert(stats.scores == scores)
+        assert(stats.get_quantile(0.5) == statistics.median_low(scores))
+        assert(stats.get_quantile(0) == 0)
+        assert(stats.get_quantile(1) == 1575)
+
+    def test_merge(self):
+        rng = np.random.default_rng(1)
+        scores = rng.integers(40, 400, size=1000)
+        stats = ScoreStats()
+        for k in range(0, 1000, 300):
+            chunk_stats = ScoreStats()
+            chunk_stats.add_many(scores[k:k + 300])
+            stats.merge(pickle.loads(pickle.dumps(chunk_stats)))
+        assert(stats.count == 1000)
+        assert(abs(stats.mean - scores.mean()) < 1e-9)
+        assert(abs(stats.variance - scores.var(ddof=1)) < 1e-6)
+        assert((stats.min, stats.max) == (scores.min(), scores.max()))
+        assert(stats.get_quantile(0.25) == int(np.quantile(scores, 0.25, method='inverted_cdf')))
+
+    def test_empty(self):
+        stats = ScoreStats()
+        stats.merge(ScoreStats())
+        stats.add_many([])
+        assert(stats.count == 0)
+        assert(stats.summary_str() == 'No scores')
+
+
+if __name__ == '__main__':
+    unittest.main()
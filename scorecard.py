@@ -3,9 +3,14 @@
 import numpy as np
 import random as r
 
+from array import array
 from box import Box
 from collections import Counter
 from config import Config
+from copy import deepcopy
+from functools import lru_cache
+from itertools import combinations_with_replacement as cwr
+from itertools import product
 from util import Util
 
 
@@ -21,6 +26,7 @@ class Scorecard:
                           Box.STRAIGHT_SMALL: 30,
                           Box.STRAIGHT_LARGE: 40,
                           Box.YAHTZEE: 50}
+    boxes_joker = [Box.FULL_HOUSE, Box.STRAIGHT_SMALL, Box.STRAIGHT_LARGE]
 
     def __init__(self):
         self.box_score = np.zeros(Box.nonnone_count(), dtype=int)
@@ -28,6 +34,59 @@ class Scorecard:
         self.is_box_used.fill(False)
         self.yahtzee_bonus_count = 0
 
+    @Util.lazy_static
+    def raw_scores(cls):
+        """rid --> list of the 13 box scores of the roll, without the Joker Rule.
+        As in class Stats, the rid of a roll is its index in product(range(1, 7), repeat=5).
+        The scores of a Yahtzee roll are overridden by the Joker Rule as given by
+        Scorecard.get_joker_overlay().
+        """
+        scorecard = Scorecard()  # No YAHTZEE scored, so no Joker Rule
+        scores_by_sroll = {sroll: [scorecard.get_box_score_by_rules(box, sroll)[0]
+                                   for box in Box.nonnone_boxes()]
+                           for sroll in cwr(range(1, 7), 5)}
+        return [scores_by_sroll[tuple(sorted(roll))]
+                for roll in product(range(1, 7), repeat=5)]
+
+    @staticmethod
+    def roll_to_rid(roll):
+        (a, b, c, d, e) = roll
+        return ((((a - 1) * 6 + b - 1) * 6 + c - 1) * 6 + d - 1) * 6 + e - 1
+
+    @staticmethod
+    def get_joker_overlay():
+        """Returns a read-only (2, 2, 2, 13) array indexed by
+        [is_yahtzee, is_yahtzee_scored, is_upper_box_used, box index], holding the score
+        that the Joker Rule gives the box, or -1 where the raw score stands.
+        is_yahtzee_scored means that the YAHTZEE box holds 50 points, and is_upper_box_used
+        refers to the upper section box of the Yahtzee's pip value.
+        """
+        return Scorecard._build_joker_overlay(Config.DO_USE_JOKER_RULE,
+                                              Config.DO_USE_JOKER_RULE_UPPER_SECTION)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _build_joker_overlay(do_use_joker_rule, do_use_joker_rule_upper_section):
+        overlay = np.full((2, 2, 2, Box.nonnone_count()), -1, dtype=int)
+        if do_use_joker_rule:
+            for is_upper_box_used in [0, 1]:
+                if is_upper_box_used or not do_use_joker_rule_upper_section:
+                    for box in Scorecard.boxes_joker:
+                        overlay[1, 1, is_upper_box_used, box.to_index()] = (
+                            Scorecard.boxes_other_scores[box])
+        overlay.flags.writeable = False
+        return overlay
+
+    @staticmethod
+    def apply_joker_overlay(scores, is_yahtzee, is_yahtzee_scored, is_upper_box_used):
+        """Vectorized Joker Rule: Given raw scores (..., 13) and flags that broadcast
+        against scores[..., 0], returns the scores with the Joker Rule applied.
+        """
+        overlay = Scorecard.get_joker_overlay()[np.asarray(is_yahtzee, dtype=np.intp),
+                                                np.asarray(is_yahtzee_scored, dtype=np.intp),
+                                                np.asarray(is_upper_box_used, dtype=np.intp)]
+        return np.where(overlay >= 0, overlay, scores)
+
     def get_array_scoring(self, vals):
         counter = Counter(vals)
         pips = counter.keys()
@@ -68,7 +127,7 @@ class Scorecard:
         if is_yahtzee and Config.DO_USE_JOKER_RULE:
             is_yahtzee_already_used = self.box_score[Box.YAHTZEE.to_index()] > 0
             if is_yahtzee_already_used:
-                is_upper_box_already_used = self.is_box_used[vals[0]]
+                is_upper_box_already_used = self.is_box_used[vals[0] - 1]
                 if is_upper_box_already_used or (not Config.DO_USE_JOKER_RULE_UPPER_SECTION):
                     boxes[Box.KIND3.to_index()]  = 1
                     boxes[Box.KIND4.to_index()]  = 1
@@ -80,7 +139,26 @@ class Scorecard:
         return boxes
 
     def get_box_score(self, box, roll):
-        assert(not self.is_box_used[box.to_index()])
+        """Returns (score, is_yahtzee), by lookup in Scorecard.raw_scores
+        and Scorecard.get_joker_overlay().
+        """
+        k = box.to_index()
+        assert(not self.is_box_used[k])
+        scores = Scorecard.raw_scores[Scorecard.roll_to_rid(roll)]
+        is_yahtzee = scores[Box.YAHTZEE.to_index()] > 0
+        if is_yahtzee:
+            is_yahtzee_scored = self.box_score[Box.YAHTZEE.to_index()] > 0
+            is_upper_box_used = self.is_box_used[roll[0] - 1]
+            joker_score = Scorecard.get_joker_overlay()[1, int(is_yahtzee_scored),
+                                                        int(is_upper_box_used), k]
+            if joker_score >= 0:
+                return (int(joker_score), is_yahtzee)
+        return (scores[k], is_yahtzee)
+
+    def get_box_score_by_rules(self, box, roll):
+        """Returns (score, is_yahtzee), computed from the rules via get_array_scoring.
+        Used to build Scorecard.raw_scores.
+        """
         scoring_boxes = self.get_array_scoring(roll)
         is_yahtzee = scoring_boxes[Box.YAHTZEE.to_index()]
 
@@ -95,6 +173,14 @@ class Scorecard:
             score = self.boxes_other_scores[box]
         return (score, is_yahtzee)
 
+    @property
+    def used_mask(self):
+        """Bitmask of used boxes, where bit k is set iff the box with index k is used."""
+        return sum(1 << k for k, is_used in enumerate(self.is_box_used.tolist()) if is_used)
+
+    def copy(self):
+        return deepcopy(self)
+
     def get_boxes_unused(self):
         return [b for b in Box
                 if b != Box.NONE and not self.is_box_used[b.to_index()]]
@@ -174,9 +260,89 @@ class Scorecard:
     def use_box(self, roll, box):
         assert(not self.is_box_used[box.to_index()])
         (score, is_yahtzee) = self.get_box_score(box, roll)
+        is_yahtzee_already_scored = self.box_score[Box.YAHTZEE.to_index()] > 0
         self.box_score[box.to_index()] = score
         self.is_box_used[box.to_index()] = True
         if (Config.DO_USE_YAHTZEE_BONUS
-                and self.box_score[Box.YAHTZEE.to_index()] > 0
+                and is_yahtzee_already_scored
                 and is_yahtzee):
             self.yahtzee_bonus_count += 1
+
+
+class CompactScorecard:
+    """Scorecard with the same interface as class Scorecard, but lower per-move cost.
+    Box usage is held as a bitmask (see used_mask), and box scores in an array('h').
+    The raw upper section score and the total score are maintained as boxes are used,
+    so that get_score() is O(1), and copy() is cheap.
+    """
+    __slots__ = ('box_score', 'used_mask', 'upper_raw', 'total', 'yahtzee_bonus_count')
+
+    BOXES = tuple(Box.nonnone_boxes())
+
+    def __init__(self):
+        self.box_score = array('h', [0] * Box.nonnone_count())
+        self.used_mask = 0
+        self.upper_raw = 0
+        self.total = 0
+        self.yahtzee_bonus_count = 0
+
+    @property
+    def is_box_used(self):
+        return [((self.used_mask >> k) & 1) == 1 for k in range(Box.nonnone_count())]
+
+    def copy(self):
+        result = CompactScorecard.__new__(CompactScorecard)
+        result.box_score = array('h', self.box_score)
+        result.used_mask = self.used_mask
+        result.upper_raw = self.upper_raw
+        result.total = self.total
+        result.yahtzee_bonus_count = self.yahtzee_bonus_count
+        return result
+
+    def get_box_score(self, box, roll):
+        """Returns (score, is_yahtzee). See Scorecard.get_box_score."""
+        k = box.to_index()
+        assert(not (self.used_mask >> k) & 1)
+        scores = Scorecard.raw_scores[Scorecard.roll_to_rid(roll)]
+        is_yahtzee = scores[Box.YAHTZEE.to_index()] > 0
+        if is_yahtzee:
+            is_yahtzee_scored = self.box_score[Box.YAHTZEE.to_index()] > 0
+            is_upper_box_used = (self.used_mask >> (roll[0] - 1)) & 1
+            joker_score = Scorecard.get_joker_overlay()[1, int(is_yahtzee_scored),
+                                                        is_upper_box_used, k]
+            if joker_score >= 0:
+                return (int(joker_score), is_yahtzee)
+        return (scores[k], is_yahtzee)
+
+    def get_boxes_unused(self):
+        mask = self.used_mask
+        return [box for k, box in enumerate(CompactScorecard.BOXES) if not (mask >> k) & 1]
+
+    def get_random_unused_box(self):
+        return r.choice(self.get_boxes_unused())
+
+    def get_score(self):
+        return self.total
+
+    def get_score_upper_raw(self):
+        return self.upper_raw
+
+    print = Scorecard.print
+    print_full = Scorecard.print_full
+
+    def use_box(self, roll, box):
+        k = box.to_index()
+        (score, is_yahtzee) = self.get_box_score(box, roll)
+        if (Config.DO_USE_YAHTZEE_BONUS
+                and is_yahtzee
+                and self.box_score[Box.YAHTZEE.to_index()] > 0):
+            self.yahtzee_bonus_count += 1
+            self.total += Scorecard.YAHTZEE_BONUS
+        self.box_score[k] = score
+        self.used_mask |= 1 << k
+        self.total += score
+        if k < len(Scorecard.boxes_section_upper):
+            if (self.upper_raw < Scorecard.UPPER_THRESHOLD
+                    and self.upper_raw + score >= Scorecard.UPPER_THRESHOLD):
+                self.total += Scorecard.UPPER_BONUS
+            self.upper_raw += score
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 
+import random
 import unittest
+from itertools import product
 
 from box import Box
-from scorecard import Scorecard
+from config import Config
+from scorecard import CompactScorecard, Scorecard
 
 
 class ScorecardTest(unittest.TestCase):
@@ -20,6 +23,84 @@ class ScorecardTest(unittest.TestCase):
         assert_scoring_boxes([6,6,6,6,6],
                              [Box.SIXES, Box.KIND3, Box.KIND4, Box.YAHTZEE, Box.CHANCE])
 
+    def test_box_score_matches_rules(self):
+        sc = Scorecard()
+        for roll in product(range(1, 7), repeat=5):
+            for box in Box.nonnone_boxes():
+                assert(sc.get_box_score(box, roll) == sc.get_box_score_by_rules(box, roll))
+
+    def test_joker_overlay_matches_rules(self):
+        orig_flags = (Config.DO_USE_JOKER_RULE, Config.DO_USE_JOKER_RULE_UPPER_SECTION,
+                      Config.DO_USE_YAHTZEE_BONUS)
+        try:
+            for flags in product([False, True], repeat=3):
+                (Config.DO_USE_JOKER_RULE, Config.DO_USE_JOKER_RULE_UPPER_SECTION,
+                 Config.DO_USE_YAHTZEE_BONUS) = flags
+                for (yahtzee_roll, pip) in product([None, [1,2,3,4,6], [5,5,5,5,5]],
+                                                   range(1, 7)):
+                    for is_upper_box_used in [False, True]:
+                        sc = Scorecard()
+                        if yahtzee_roll:
+                            sc.use_box(yahtzee_roll, Box.YAHTZEE)
+                        if is_upper_box_used:
+                            sc.use_box([pip] * 5, Box(pip))
+                        for box in sc.get_boxes_unused():
+                            assert(sc.get_box_score(box, [pip] * 5)
+                                   == sc.get_box_score_by_rules(box, [pip] * 5))
+        finally:
+            (Config.DO_USE_JOKER_RULE, Config.DO_USE_JOKER_RULE_UPPER_SECTION,
+             Config.DO_USE_YAHTZEE_BONUS) = orig_flags
+
+    def test_joker_rule(self):
+        sc = Scorecard()
+        sc.use_box([2,2,2,2,2], Box.YAHTZEE)
+        sc.use_box([1,1,1,4,4], Box.FOURS)
+        assert(sc.get_box_score(Box.FULL_HOUSE, [3,3,3,3,3]) == (0, True))
+        assert(sc.get_box_score(Box.FULL_HOUSE, [4,4,4,4,4]) == (25, True))
+
+    def test_yahtzee_bonus(self):
+        sc = Scorecard()
+        sc.use_box([6,6,6,6,6], Box.YAHTZEE)
+        assert(sc.yahtzee_bonus_count == 0)
+        sc.use_box([6,6,6,6,6], Box.SIXES)
+        assert(sc.yahtzee_bonus_count == 1)
+        assert(sc.get_score() == 50 + 30 + 100)
+
+
+class CompactScorecardTest(unittest.TestCase):
+    def test_matches_scorecard(self):
+        rng = random.Random(12)
+        for game in range(200):
+            sc = Scorecard()
+            csc = CompactScorecard()
+            for turn in range(Box.nonnone_count()):
+                # Favor Yahtzees, to exercise the Joker Rule and the Yahtzee Bonus
+                roll = ([rng.randint(1, 6)] * 5 if rng.random() < 0.3
+                        else [rng.randint(1, 6) for _ in range(5)])
+                assert(csc.get_boxes_unused() == sc.get_boxes_unused())
+                for box in sc.get_boxes_unused():
+                    assert(csc.get_box_score(box, roll) == sc.get_box_score(box, roll))
+                box = rng.choice(sc.get_boxes_unused())
+                sc.use_box(roll, box)
+                csc.use_box(roll, box)
+                assert(list(csc.box_score) == sc.box_score.tolist())
+                assert(csc.is_box_used == sc.is_box_used.tolist())
+                assert(csc.used_mask == sc.used_mask)
+                assert(csc.get_score_upper_raw() == sc.get_score_upper_raw())
+                assert(csc.get_score() == sc.get_score())
+            assert(csc.yahtzee_bonus_count == sc.yahtzee_bonus_count)
+
+    def test_copy(self):
+        csc = CompactScorecard()
+        csc.use_box([5,5,5,5,5], Box.YAHTZEE)
+        clone = csc.copy()
+        clone.use_box([5,5,5,5,5], Box.FIVES)
+        assert(Box.FIVES in csc.get_boxes_unused())
+        assert(Box.FIVES not in clone.get_boxes_unused())
+        assert(csc.get_score() == 50)
+        assert(clone.get_score() == 50 + 25 + 100)
+        assert(list(csc.box_score) != list(clone.box_score))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+import numpy as np
+
+from box import Box
+from config import Config
+from scorecard import Scorecard
+from solver import Solver
+from state_encoder import StateEncoder
+from stats import OptimalPlay, Stats, rolls_to_rids
+from util import Util
+
+
+class GameBatch:
+    """N games of Yahtzee, played in lockstep with NumPy arrays, rather than as Player objects.
+    The scorecards are held as a (N, 13) array of box scores, plus arrays for the bitmask of
+    used boxes (see Solver), the raw upper section score, and the Yahtzee Bonus count.
+    Rolls are (N, 5) arrays, kept sorted, so that re-rolls are expressed as rrids
+    (see Stats) on the sorted dice.
+
+    A policy is a function policy(games, srids, roll_num) --> actions, with one action per game:
+      * 0 to 31: Re-roll the dice given by the rrid (only valid on rolls #1 and #2).
+      * ACTION_BOX_BASE + k: Use the box with index k.
+    Policies are called for all N games, but actions are ignored for games that have
+    already used a box during the current turn.
+    """
+    ACTION_BOX_BASE = 32
+
+    def __init__(self, game_count, rng=None):
+        self.game_count = game_count
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.box_score = np.zeros((game_count, Box.nonnone_count()), dtype=np.int16)
+        self.used_mask = np.zeros(game_count, dtype=np.int32)
+        self.upper_raw = np.zeros(game_count, dtype=np.int16)
+        self.yahtzee_bonus_count = np.zeros(game_count, dtype=np.int16)
+        self.turn_num = 1
+
+    @Util.lazy_static
+    def _reroll_dice(cls):
+        """rrid --> (5,) bool array of the sorted dice to be re-rolled."""
+        result = np.zeros((32, 5), dtype=bool)
+        for rrid, reroll in enumerate(Stats.stat_rerolls):
+            result[rrid, reroll] = True
+        return result
+
+    @Util.lazy_static
+    def _srolls(cls):
+        return np.array(Stats.stat_srolls)
+
+    @property
+    def is_box_used(self):
+        return ((self.used_mask[:, np.newaxis] >> np.arange(Box.nonnone_count())) & 1) == 1
+
+    @property
+    def upper(self):
+        """Upper section score, capped at Scorecard.UPPER_THRESHOLD."""
+        return np.minimum(self.upper_raw, Scorecard.UPPER_THRESHOLD)
+
+    @property
+    def yflag(self):
+        """Whether the YAHTZEE box has been scored with 50 points."""
+        return self.box_score[:, Box.YAHTZEE.to_index()] > 0
+
+    def get_box_scores(self, srids, games=slice(None)):
+        """Returns the (len(srids), 13) scores of each box for the given games and srids,
+        applying the Joker Rule. Used boxes are not masked out.
+        """
+        srolls = GameBatch._srolls[srids]
+        is_yahtzee = srolls[:, 0] == srolls[:, 4]
+        is_upper_box_used = ((self.used_mask[games] >> (srolls[:, 0] - 1)) & 1) == 1
+        scores = Scorecard.apply_joker_overlay(np.asarray(Stats.stat_scores)[srids],
+                                               is_yahtzee, self.yflag[games], is_upper_box_used)
+        return scores.astype(np.int16)
+
+    def clear_games(self, games):
+        """Resets the scorecards of the given games, for new games."""
+        self.box_score[games] = 0
+        self.used_mask[games] = 0
+        self.upper_raw[games] = 0
+        self.yahtzee_bonus_count[games] = 0
+
+    def get_scores(self, games=slice(None)):
+        upper_bonus = np.where(self.upper_raw[games] >= Scorecard.UPPER_THRESHOLD,
+                               Scorecard.UPPER_BONUS, 0)
+        yahtzee_bonus = Scorecard.YAHTZEE_BONUS * self.yahtzee_bonus_count[games].astype(int)
+        return self.box_score[games].sum(axis=1, dtype=int) + upper_bonus + yahtzee_bonus
+
+    def get_srids(self, rolls):
+        return np.asarray(Stats.stat_rid_to_srid)[rolls_to_rids(rolls)]
+
+    def play(self, policy):
+        """Plays all 13 turns of all games. Returns the final scores."""
+        while self.turn_num <= Box.nonnone_count():
+            self.play_turn(policy)
+        return self.get_scores()
+
+    def play_turn(self, policy):
+        """Plays one turn of all games. Boxes chosen before roll #3 are only used at the end of
+        the turn, so that the policy sees the same state for all three rolls.
+        """
+        rolls = self.roll(self.game_count)
+        is_active = np.ones(self.game_count, dtype=bool)
+        boxes = np.zeros(self.game_count, dtype=np.intp)
+        final_srids = np.zeros(self.game_count, dtype=np.intp)
+        for roll_num in range(1, 4):
+            srids = self.get_srids(rolls)
+            actions = policy(self, srids, roll_num)
+            is_using_box = is_active & (actions >= GameBatch.ACTION_BOX_BASE)
+            assert(roll_num < 3 or (is_using_box == is_active).all())
+            boxes[is_using_box] = actions[is_using_box] - GameBatch.ACTION_BOX_BASE
+            final_srids[is_using_box] = srids[is_using_box]
+            is_active &= ~is_using_box
+            if roll_num < 3:
+                rolls = self.reroll(rolls, np.where(is_active, actions, 0))
+        self.use_boxes(np.arange(self.game_count), final_srids, boxes)
+        self.turn_num += 1
+
+    def reroll(self, rolls, rrids):
+        """Returns the (n, 5) sorted rolls after re-rolling the given rrid of each sorted roll."""
+        is_rerolled = GameBatch._reroll_dice[rrids]
+        new_dice = self.rng.integers(1, 7, size=rolls.shape)
+        return np.sort(np.where(is_rerolled, new_dice, rolls), axis=1)
+
+    def roll(self, count):
+        """Returns count sorted rolls, as a (count, 5) array."""
+        return np.sort(self.rng.integers(1, 7, size=(count, 5)), axis=1)
+
+    def use_boxes(self, games, srids, boxes):
+        """Records the scores of the given srids in the given boxes of the given games."""
+        bits = (1 << boxes).astype(np.int32)
+        assert(not (self.used_mask[games] & bits).any())
+        scores = self.get_box_scores(srids, games)[np.arange(len(games)), boxes]
+        if Config.DO_USE_YAHTZEE_BONUS:
+            srolls = GameBatch._srolls[srids]
+            is_yahtzee = srolls[:, 0] == srolls[:, 4]
+            self.yahtzee_bonus_count[games] += is_yahtzee & self.yflag[games]
+        self.box_score[games, boxes] = scores
+        self.used_mask[games] |= bits
+        is_upper = boxes < len(Scorecard.boxes_section_upper)
+        self.upper_raw[games[is_upper]] += scores[is_upper]
+
+
+class BatchPolicy:
+    """Policies for GameBatch. See GameBatch for the calling convention."""
+
+    @staticmethod
+    def greedy(games, srids, roll_num):
+        """Use the box with the best score relative to optimal play, without re-rolling.
+        Matches Player_NoRerolls_Greedy.
+        """
+        deltas = games.get_box_scores(srids) - OptimalPlay.AVG_BOX_SCORES
+        deltas[games.is_box_used] = -np.inf
+        return GameBatch.ACTION_BOX_BASE + deltas.argmax(axis=1)
+
+    @staticmethod
+    def random(games, srids, roll_num):
+        """Use a random unused box, without re-rolling. Matches Player_NoRerolls_Random."""
+        weights = games.rng.random((games.game_count, Box.nonnone_count()))
+        weights[games.is_box_used] = -1
+        return GameBatch.ACTION_BOX_BASE + weights.argmax(axis=1)
+
+
+class TablePolicy:
+    """Policy that follows the exact optimal strategy, as does Player_Optimal.
+    Turn policy tables (see Solver.get_turn_policy) are computed once per distinct state,
+    and then shared by all games in that state. The states first seen in a call are computed
+    together, in chunks (see Solver.get_turn_policies), and the tables are kept as rows
+    of one uint8 array, found by turn state (see StateEncoder) through row_by_turn_state.
+    """
+    CHUNK_SIZE = 256  # Number of new states computed together, bounding temporary memory
+    def __init__(self, state_values=None):
+        self.state_values = np.asarray(Solver.state_values if state_values is None
+                                       else state_values)
+        self.turn_policies = np.zeros((0, 3, 252), dtype=np.uint8)
+        self.turn_policy_count = 0
+        self.row_by_turn_state = np.full(self.state_values.size, -1, dtype=np.int32)
+
+    def __call__(self, games, srids, roll_num):
+        states = np.stack([games.used_mask, games.upper, games.yflag, srids,
+                           np.full(games.game_count, roll_num)], axis=1)
+        turn_states = StateEncoder.encode_many(states) // StateEncoder.TURN_STATE_DIVISOR
+        rows = self.get_rows(turn_states)
+        choices = self.turn_policies[rows, roll_num - 1, srids]
+        if roll_num == 1:
+            return choices
+        elif roll_num == 2:  # Keeping all dice is treated as scoring early.
+            boxes = self.turn_policies[rows, 2, srids]
+            return np.where(choices == 0, GameBatch.ACTION_BOX_BASE + boxes, choices)
+        else:
+            return GameBatch.ACTION_BOX_BASE + choices
+
+    def get_rows(self, turn_states):
+        """Returns the rows of turn_policies for the given turn states, computing new ones."""
+        new_turn_states = np.unique(turn_states[self.row_by_turn_state[turn_states] < 0])
+        for start in range(0, len(new_turn_states), TablePolicy.CHUNK_SIZE):
+            chunk = new_turn_states[start:start + TablePolicy.CHUNK_SIZE]
+            (masks, uppers, yflags, _, _) = StateEncoder.decode_many(
+                chunk * StateEncoder.TURN_STATE_DIVISOR).T
+            self.append_turn_policies(chunk, Solver.get_turn_policies(self.state_values,
+                                                                      masks, uppers, yflags))
+        return self.row_by_turn_state[turn_states]
+
+    def append_turn_policies(self, turn_states, turn_policies):
+        count = self.turn_policy_count + len(turn_policies)
+        if count > len(self.turn_policies):  # Grow geometrically, so appends copy little
+            grown = np.zeros((max(count, 2 * len(self.turn_policies)), 3, 252), dtype=np.uint8)
+            grown[:self.turn_policy_count] = self.turn_policies[:self.turn_policy_count]
+            self.turn_policies = grown
+        self.turn_policies[self.turn_policy_count:count] = turn_policies
+        self.row_by_turn_state[turn_states] = np.arange(self.turn_policy_count, count)
+        self.turn_policy_count = count
+
+
+def play_batches(policy, game_count, batch_size=2**16, rng=None):
+    """Plays game_count games, in batches of up to batch_size games. Returns the scores."""
+    rng = np.random.default_rng() if rng is None else rng
+    scores = []
+    for start in range(0, game_count, batch_size):
+        games = GameBatch(min(batch_size, game_count - start), rng)
+        scores.append(games.play(policy))
+    return np.concatenate(scores) if scores else np.zeros(0, dtype=int)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='simulator',
+                 description='Play many games of Yahtzee in lockstep, with NumPy')
+    parser.add_argument('-n', '--number', type=int, default=100_000)  # Number of games
+    parser.add_argument('--seed', type=int, default=None)
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-g', '--greedy', action='store_true')    # Greedy policy
+    group.add_argument('-o', '--optimal', action='store_true')   # Optimal policy (see solver.py)
+    group.add_argument('-r', '--random', action='store_true')    # Random policy
+
+    args = parser.parse_args()
+
+    if args.greedy:
+        policy = BatchPolicy.greedy
+    elif args.optimal:
+        policy = TablePolicy()
+    else:
+        policy = BatchPolicy.random
+
+    start = time.perf_counter()
+    scores = play_batches(policy, args.number, rng=np.random.default_rng(args.seed))
+    elapsed = time.perf_counter() - start
+    print(f'Mean score over {args.number:,} games: {scores.mean():.2f}'
+          f' (stdev {scores.std():.2f}, {args.number / elapsed:,.0f} games/sec)')
+
+
+if __name__ == '__main__':
+    main()
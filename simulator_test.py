@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+
+from box import Box
+from scorecard import Scorecard
+from simulator import BatchPolicy, GameBatch, TablePolicy, play_batches
+from solver import Solver
+from state_encoder import StateEncoder
+from stats import Stats
+
+
+class GameBatchTest(unittest.TestCase):
+    def test_matches_scorecard(self):
+        """Replays the rolls and boxes of batched random games through Scorecard."""
+        games = GameBatch(2000, np.random.default_rng(1))
+        history = []
+        def recording_policy(games, srids, roll_num):
+            actions = BatchPolicy.random(games, srids, roll_num)
+            if roll_num == 1:  # The random policy always uses a box on roll #1
+                history.append((srids, actions - GameBatch.ACTION_BOX_BASE))
+            return actions
+
+        scores = games.play(recording_policy)
+        for game in range(games.game_count):
+            sc = Scorecard()
+            for (srids, boxes) in history:
+                sc.use_box(list(Stats.stat_srolls[srids[game]]), Box(boxes[game] + 1))
+            assert(sc.get_score() == scores[game])
+            assert(list(sc.box_score) == list(games.box_score[game]))
+
+    def test_joker_and_bonus(self):
+        games = GameBatch(2)
+        yahtzee_4s = Stats.stat_sroll_to_srid[(4,4,4,4,4)]
+        games.use_boxes(np.array([0, 1]), np.array([yahtzee_4s] * 2),
+                        np.array([Box.YAHTZEE.to_index(), Box.CHANCE.to_index()]))
+        games.use_boxes(np.array([0]), np.array([yahtzee_4s]),
+                        np.array([Box.FOURS.to_index()]))
+        scores = games.get_box_scores(np.array([yahtzee_4s] * 2))
+        assert(scores[0, Box.FULL_HOUSE.to_index()] == 25)
+        assert(scores[1, Box.FULL_HOUSE.to_index()] == 0)
+        assert(list(games.yahtzee_bonus_count) == [1, 0])
+        assert(list(games.get_scores()) == [50 + 20 + 100, 20])
+
+    def test_policies(self):
+        rng = np.random.default_rng(2)
+        assert(35 < play_batches(BatchPolicy.random, 2000, rng=rng).mean() < 55)
+        assert(105 < play_batches(BatchPolicy.greedy, 2000, rng=rng).mean() < 125)
+
+    def test_table_policy(self):
+        """Turn policies are computed once per state, and kept in rows by turn state."""
+        rng = np.random.default_rng(3)
+        state_values = rng.random((Solver.MASK_COUNT, Solver.UPPER_COUNT, Solver.YFLAG_COUNT))
+        policy = TablePolicy(state_values)
+        play_batches(policy, 300, rng=rng)
+        turn_states = np.flatnonzero(policy.row_by_turn_state >= 0)
+        rows = policy.row_by_turn_state[turn_states]
+        assert(sorted(rows.tolist()) == list(range(policy.turn_policy_count)))
+        assert(policy.turn_policy_count > 300)
+        (masks, uppers, yflags, _, _) = StateEncoder.decode_many(
+            turn_states * StateEncoder.TURN_STATE_DIVISOR).T
+        assert(np.array_equal(policy.turn_policies[rows, 2],
+                              Solver.get_turn_policies(state_values, masks, uppers, yflags)[:, 2]))
+        count = policy.turn_policy_count
+        assert(np.array_equal(policy.get_rows(turn_states), rows))
+        assert(policy.turn_policy_count == count)
+
+
+if __name__ == '__main__':
+    unittest.main()
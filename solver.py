@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+import numpy as np
+
+from box import Box
+from config import Config
+from scorecard import Scorecard
+from stats import Stats
+from table_cache import TableCache
+from util import Util
+
+
+class Solver:
+    """Exact optimal-strategy solver, by dynamic programming over the full game state.
+    Terms used here, in addition to those described in class Stats:
+      * mask: Bitmask of the used boxes, where bit k is set iff the box with index k is used.
+      * upper: Upper section score, capped at Scorecard.UPPER_THRESHOLD (= 63),
+            which is all that matters for the Upper Bonus.
+      * yflag: 1 iff the YAHTZEE box has been scored with 50 points,
+            which enables the Yahtzee Bonus and the Joker Rule.
+      * state: (mask, upper, yflag), at the beginning of a turn.
+
+    Solver.state_values[mask, upper, yflag] is the expected final score still to be
+    collected from the given state, under optimal play.
+    The within-turn keep/reroll decisions are found by backward induction over the
+    three rolls of a turn, using Stats.stat_keep_prob, so that re-rolls keeping the same
+    multiset of dice are evaluated once.
+    All (upper, yflag) combinations for a given mask are solved together, as matrix operations.
+    """
+    MASK_COUNT = 2**13
+    UPPER_COUNT = Scorecard.UPPER_THRESHOLD + 1
+    YFLAG_COUNT = 2
+
+    TABLE_FORMAT_VERSION = 1
+
+    _cache = TableCache('solver', TABLE_FORMAT_VERSION)
+
+    @Util.lazy_static
+    def state_values(cls):
+        return cls._cache.get('state_values', cls.solve)
+
+    @staticmethod
+    def is_cached():
+        """Returns whether state_values is cached on disk, so that it need not be solved."""
+        return Solver._cache.has('state_values')
+
+    @Util.lazy_static
+    def _is_yahtzee(cls):
+        """srid --> whether the sroll is a Yahtzee (five of a kind)."""
+        return np.array([len(set(sroll)) == 1 for sroll in Stats.stat_srolls])
+
+    @Util.lazy_static
+    def _sroll_pips(cls):
+        """srid --> pip value of the first die, which identifies the Yahtzee for the Joker Rule."""
+        return np.array([sroll[0] for sroll in Stats.stat_srolls])
+
+    @staticmethod
+    def get_box_values(state_values, mask, upper, yflag):
+        """Returns the value of using each box, for each srid: (13, 252, ...) array,
+        with -inf for boxes already used. The value is the box score, plus bonuses,
+        plus the value of the resulting state.
+        upper and yflag are integers, or integer arrays that broadcast against each other.
+        """
+        upper = np.asarray(upper)
+        yflag = np.asarray(yflag)
+        shape = (252,) + np.broadcast(upper, yflag).shape
+        srid_axes = (slice(None),) + (np.newaxis,) * (len(shape) - 1)
+        is_yahtzee = Solver._is_yahtzee[srid_axes]
+
+        bonus = np.zeros(shape)
+        if Config.DO_USE_YAHTZEE_BONUS:
+            bonus = bonus + Scorecard.YAHTZEE_BONUS * (is_yahtzee & (yflag == 1))
+
+        pips = Solver._sroll_pips[srid_axes]
+        is_upper_box_used = ((mask >> (pips - 1)) & 1) == 1
+        scores = Scorecard.apply_joker_overlay(np.asarray(Stats.stat_scores)[srid_axes],
+                                               is_yahtzee, yflag == 1, is_upper_box_used)
+
+        result = np.full((Box.nonnone_count(),) + shape, -np.inf)
+        for box in Box.nonnone_boxes():
+            k = box.to_index()
+            if mask & (1 << k):
+                continue
+            next_values = state_values[mask | (1 << k)]
+            score = scores[..., k]
+            if box in Scorecard.boxes_section_upper:
+                next_upper = np.minimum(upper + score, Scorecard.UPPER_THRESHOLD)
+                upper_bonus = Scorecard.UPPER_BONUS * ((upper < Scorecard.UPPER_THRESHOLD)
+                                 & (next_upper == Scorecard.UPPER_THRESHOLD))
+                result[k] = score + upper_bonus + next_values[next_upper, yflag]
+                continue
+            if box == Box.YAHTZEE:
+                next_yflag = np.where(score > 0, 1, yflag)
+                result[k] = score + next_values[upper, next_yflag]
+                continue
+            result[k] = score + next_values[upper, yflag]
+        return result + bonus
+
+    @staticmethod
+    def get_box_values_many(state_values, masks, uppers, yflags):
+        """Returns the (n, 252, 13) values of using each box (see get_box_values) for each srid,
+        in each of n states, given as arrays of masks, uppers and yflags.
+        Only the upper boxes and YAHTZEE lead to states that depend on the srid.
+        """
+        (masks, uppers, yflags) = (np.asarray(a)[:, np.newaxis] for a in (masks, uppers, yflags))
+        is_yahtzee = Solver._is_yahtzee
+        is_upper_box_used = ((masks >> (Solver._sroll_pips - 1)) & 1) == 1
+        scores = Scorecard.apply_joker_overlay(np.asarray(Stats.stat_scores),
+                                               is_yahtzee, yflags == 1, is_upper_box_used)
+
+        next_masks = masks | (1 << np.arange(Box.nonnone_count()))
+        result = scores + state_values[next_masks, uppers, yflags][:, np.newaxis, :]
+
+        upper_count = len(Scorecard.boxes_section_upper)
+        upper_scores = scores[..., :upper_count]
+        next_uppers = np.minimum(uppers[..., np.newaxis] + upper_scores,
+                                 Scorecard.UPPER_THRESHOLD)
+        upper_bonus = Scorecard.UPPER_BONUS * (
+            (uppers[..., np.newaxis] < Scorecard.UPPER_THRESHOLD)
+            & (next_uppers == Scorecard.UPPER_THRESHOLD))
+        result[..., :upper_count] = (upper_scores + upper_bonus
+            + state_values[next_masks[:, np.newaxis, :upper_count], next_uppers,
+                           yflags[..., np.newaxis]])
+
+        k = Box.YAHTZEE.to_index()
+        yahtzee_values = state_values[next_masks[:, k], uppers[:, 0], 1][:, np.newaxis]
+        result[..., k] = np.where(scores[..., k] > 0, scores[..., k] + yahtzee_values,
+                                  result[..., k])
+
+        if Config.DO_USE_YAHTZEE_BONUS:
+            result += (Scorecard.YAHTZEE_BONUS * (is_yahtzee & (yflags == 1)))[..., np.newaxis]
+        is_box_used = ((masks >> np.arange(Box.nonnone_count())) & 1) == 1
+        return np.where(is_box_used[:, np.newaxis, :], -np.inf, result)
+
+    @staticmethod
+    def get_turn_policy(state_values, mask, upper, yflag):
+        """Returns a (3, 252) array for the given state: the best rrid by srid for rolls #1
+        and #2, and the best box index by srid for roll #3.
+        Ties are broken in favor of the lowest rrid, so rrid 0 (keeping all dice) is preferred.
+        """
+        return Solver.get_turn_policies(state_values, [mask], [upper], [yflag])[0]
+
+    @staticmethod
+    def get_turn_policies(state_values, masks, uppers, yflags):
+        """Returns the turn policies (see get_turn_policy) of n states, given as arrays of masks,
+        uppers and yflags, as an (n, 3, 252) uint8 array. The states are evaluated together,
+        as matrix operations, reducing over the last (contiguous) axis. Actions whose values
+        differ only by rounding may be chosen differently for different n.
+        """
+        box_values = Solver.get_box_values_many(state_values, masks, uppers, yflags)
+        keep_prob = Stats.stat_keep_prob.T
+        values3 = box_values.max(axis=2)
+        values_by_rrid2 = np.take(values3 @ keep_prob, Stats.stat_kid_by_rrid, axis=1)
+        values2 = values_by_rrid2.max(axis=2)
+        values_by_rrid1 = np.take(values2 @ keep_prob, Stats.stat_kid_by_rrid, axis=1)
+        return np.stack([values_by_rrid1.argmax(axis=2),
+                         values_by_rrid2.argmax(axis=2),
+                         box_values.argmax(axis=2)], axis=1).astype(np.uint8)
+
+    @staticmethod
+    def get_state_value(roll3_values):
+        """Expected value of a turn, given the (252, n) values of the srid reached on roll #3."""
+        values2 = Stats.get_best_keep_values(roll3_values)
+        values1 = Stats.get_best_keep_values(values2)
+        return Stats.get_keep_value(Stats.stat_keep_to_kid[()], values1)
+
+    @staticmethod
+    def solve(start_mask=0, do_print_progress=False):
+        """Returns the (8192, 64, 2) table of optimal expected remaining scores by state.
+        Only masks that are supersets of start_mask are solved (which is useful for testing),
+        and other entries are left at zero.
+        """
+        state_values = np.zeros((Solver.MASK_COUNT, Solver.UPPER_COUNT, Solver.YFLAG_COUNT))
+        upper = np.arange(Solver.UPPER_COUNT)[:, np.newaxis]
+        yflag = np.arange(Solver.YFLAG_COUNT)[np.newaxis, :]
+        full_mask = Solver.MASK_COUNT - 1
+        for mask in range(full_mask - 1, -1, -1):  # Successor states have larger masks
+            if mask & start_mask != start_mask:
+                continue
+            box_values = Solver.get_box_values(state_values, mask, upper, yflag)
+            roll3_values = box_values.max(axis=0).reshape(252, -1)
+            state_value = Solver.get_state_value(roll3_values)
+            state_values[mask] = state_value.reshape(Solver.UPPER_COUNT, Solver.YFLAG_COUNT)
+            if do_print_progress and mask % 512 == 0:
+                print(f'Solved mask {mask:>4}', flush=True)
+        return state_values
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='solver',
+                 description='Compute (and cache) the optimal Yahtzee strategy tables')
+    parser.add_argument('-f', '--force', action='store_true')  # Solve even if cached
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.force:
+        state_values = Solver.solve(do_print_progress=True)
+        Solver._cache.save('state_values', state_values)
+    else:
+        state_values = Solver.state_values
+    elapsed = time.perf_counter() - start
+    print(f'Expected score under optimal play: {state_values[0, 0, 0]:.4f}'
+          f' (in {elapsed:.1f} seconds)')
+
+
+if __name__ == '__main__':
+    main()
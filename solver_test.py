@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+
+from box import Box
+from solver import Solver
+from stats import Stats
+
+
+def only_box_mask(box):
+    return (Solver.MASK_COUNT - 1) & ~(1 << box.to_index())
+
+
+class SolverTest(unittest.TestCase):
+    def test_chance_only(self):
+        mask = only_box_mask(Box.CHANCE)
+        state_values = Solver.solve(start_mask=mask)
+        assert(abs(state_values[mask, 0, 0] - 70/3) < 10e-6)
+
+    def test_yahtzee_only(self):
+        mask = only_box_mask(Box.YAHTZEE)
+        state_values = Solver.solve(start_mask=mask)
+        # P(Yahtzee within three rolls) is about 4.6%.
+        assert(abs(state_values[mask, 0, 0] - 50 * 0.04602864) < 10e-6)
+
+    def test_upper_bonus(self):
+        mask = only_box_mask(Box.ACES)
+        state_values = Solver.solve(start_mask=mask)
+        # With upper = 62, any ace earns the Upper Bonus.
+        p_no_aces = (5/6)**15  # All five dice, over three rolls
+        assert(abs(state_values[mask, 62, 0] - state_values[mask, 0, 0]
+                   - 35 * (1 - p_no_aces)) < 10e-6)
+
+    def test_box_values(self):
+        state_values = np.zeros((Solver.MASK_COUNT, Solver.UPPER_COUNT, Solver.YFLAG_COUNT))
+        mask = 1 << Box.YAHTZEE.to_index()
+        box_values = Solver.get_box_values(state_values, mask, 0, 1)
+        assert(box_values.shape == (Box.nonnone_count(), 252))
+        assert(box_values[Box.YAHTZEE.to_index(), 0] == -np.inf)
+        # (1,1,1,1,1) as a Full House is worth 0 while ACES is unused; Yahtzee Bonus is 100
+        assert(box_values[Box.FULL_HOUSE.to_index(), 0] == 100)
+        assert(box_values[Box.ACES.to_index(), 0] == 105)
+
+    def test_box_values_many(self):
+        rng = np.random.default_rng(1)
+        state_values = rng.random((Solver.MASK_COUNT, Solver.UPPER_COUNT, Solver.YFLAG_COUNT))
+        masks = np.array([0, 1 << Box.YAHTZEE.to_index(), 0b0111111, 0b1010101010101])
+        uppers = np.array([0, 60, 63, 12])
+        yflags = np.array([0, 1, 0, 1])
+        box_values = Solver.get_box_values_many(state_values, masks, uppers, yflags)
+        turn_policies = Solver.get_turn_policies(state_values, masks, uppers, yflags)
+        assert(box_values.shape == (4, 252, Box.nonnone_count()))
+        assert(turn_policies.shape == (4, 3, 252))
+        for (k, state) in enumerate(zip(masks.tolist(), uppers.tolist(), yflags.tolist())):
+            assert(np.array_equal(box_values[k], Solver.get_box_values(state_values, *state).T))
+            turn_policy = Solver.get_turn_policy(state_values, *state)
+            assert(np.array_equal(turn_policies[k, 2], turn_policy[2]))
+            # Re-rolls of equal value, up to rounding, may be chosen differently
+            values2 = box_values[k].max(axis=1)
+            values_by_rrid = Stats.get_values_by_rrid(values2)
+            chosen_values = values_by_rrid[np.arange(252), turn_policies[k, 1]]
+            assert(np.allclose(chosen_values, values_by_rrid.max(axis=1), rtol=0, atol=1e-12))
+            assert((turn_policies[k, 1] == turn_policy[1]).mean() > 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
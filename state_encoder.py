@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+from collections import OrderedDict
+
+import numpy as np
+
+from box import Box
+from scorecard import Scorecard
+from stats import Stats
+
+
+class StateEncoder:
+    """Canonical encoding of the state of a game at a decision, as one int64 code:
+    (used_mask, upper, yflag, srid, roll_num), as in Solver and Stats, with upper capped at
+    Scorecard.UPPER_THRESHOLD, and yflag = 1 iff the YAHTZEE box has been scored with 50 points.
+    These are the observations of rl.YahtzeeEnv, and encode_many()/decode_many() convert
+    (n, 5) arrays of them.
+
+    The code is in mixed radix, most significant first, so the code of a turn state,
+    (used_mask, upper, yflag), is code // TURN_STATE_DIVISOR, which is also the flat index
+    of that state in Solver.state_values (of shape (8192, 64, 2)).
+    """
+    MASK_COUNT = 2**13
+    UPPER_COUNT = Scorecard.UPPER_THRESHOLD + 1
+    YFLAG_COUNT = 2
+    SRID_COUNT = 252
+    ROLL_NUM_COUNT = 3
+
+    TURN_STATE_DIVISOR = SRID_COUNT * ROLL_NUM_COUNT
+    CODE_COUNT = MASK_COUNT * UPPER_COUNT * YFLAG_COUNT * TURN_STATE_DIVISOR
+
+    @staticmethod
+    def encode(used_mask, upper, yflag, srid, roll_num):
+        turn_state = StateEncoder.encode_turn_state(used_mask, upper, yflag)
+        return ((turn_state * StateEncoder.SRID_COUNT + srid) * StateEncoder.ROLL_NUM_COUNT
+                + roll_num - 1)
+
+    @staticmethod
+    def decode(code):
+        """Returns (used_mask, upper, yflag, srid, roll_num)."""
+        (turn_state, srid_roll) = divmod(code, StateEncoder.TURN_STATE_DIVISOR)
+        (srid, roll_index) = divmod(srid_roll, StateEncoder.ROLL_NUM_COUNT)
+        return StateEncoder.decode_turn_state(turn_state) + (srid, roll_index + 1)
+
+    @staticmethod
+    def encode_turn_state(used_mask, upper, yflag):
+        upper = min(upper, Scorecard.UPPER_THRESHOLD)
+        return (used_mask * StateEncoder.UPPER_COUNT + upper) * StateEncoder.YFLAG_COUNT + yflag
+
+    @staticmethod
+    def decode_turn_state(turn_state):
+        """Returns (used_mask, upper, yflag)."""
+        (mask_upper, yflag) = divmod(turn_state, StateEncoder.YFLAG_COUNT)
+        (used_mask, upper) = divmod(mask_upper, StateEncoder.UPPER_COUNT)
+        return (used_mask, upper, yflag)
+
+    @staticmethod
+    def encode_many(states):
+        """Returns the int64 codes of an (n, 5) array of states."""
+        states = np.asarray(states, dtype=np.int64)
+        (used_mask, upper, yflag, srid, roll_num) = states.T
+        upper = np.minimum(upper, Scorecard.UPPER_THRESHOLD)
+        return ((((used_mask * StateEncoder.UPPER_COUNT + upper) * StateEncoder.YFLAG_COUNT
+                  + yflag) * StateEncoder.SRID_COUNT + srid) * StateEncoder.ROLL_NUM_COUNT
+                + roll_num - 1)
+
+    @staticmethod
+    def decode_many(codes):
+        """Returns the (n, 5) int64 array of the states of the given codes."""
+        codes = np.asarray(codes, dtype=np.int64)
+        result = np.empty((len(codes), 5), dtype=np.int64)
+        (codes, result[:, 4]) = np.divmod(codes, StateEncoder.ROLL_NUM_COUNT)
+        (codes, result[:, 3]) = np.divmod(codes, StateEncoder.SRID_COUNT)
+        (codes, result[:, 2]) = np.divmod(codes, StateEncoder.YFLAG_COUNT)
+        (result[:, 0], result[:, 1]) = np.divmod(codes, StateEncoder.UPPER_COUNT)
+        result[:, 4] += 1
+        return result
+
+    @staticmethod
+    def from_player(p):
+        """Returns the code of the state of Player p."""
+        return StateEncoder.encode(*StateEncoder.get_state(p._scorecard, p._roll, p._roll_num))
+
+    @staticmethod
+    def get_state(scorecard, roll, roll_num):
+        """Returns (used_mask, upper, yflag, srid, roll_num), given a scorecard and a roll."""
+        upper = min(int(scorecard.get_score_upper_raw()), Scorecard.UPPER_THRESHOLD)
+        yflag = int(scorecard.box_score[Box.YAHTZEE.to_index()] > 0)
+        srid = Stats.stat_roll_to_sroll_data[tuple(roll)][1]
+        return (scorecard.used_mask, upper, yflag, srid, roll_num)
+
+
+class FeatureCache:
+    """Bounded LRU cache of arrays derived from states (e.g., the features of a learned
+    player's actions), keyed by StateEncoder code, with hit and miss counters.
+    compute(states) returns the rows derived from an (n, 5) array of states, as an (n, ...)
+    array, and is called once per get_many(), for all its missing codes together.
+    This pays off only when states recur: in whole games, most states at a decision are
+    seen once (about 3/4 of them, over 20,000 games), though early turns recur often.
+    """
+    DEFAULT_MAXSIZE = 2**12
+
+    def __init__(self, compute, maxsize=DEFAULT_MAXSIZE):
+        self.compute = compute
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, codes):
+        """Returns the rows for the given codes, as an (n, ...) array."""
+        codes = [int(code) for code in codes]
+        rows = {}
+        for code in codes:
+            row = self._entries.get(code)
+            if row is not None:
+                self._entries.move_to_end(code)
+                rows[code] = row
+        missing = [code for code in dict.fromkeys(codes) if code not in rows]
+        self.hits += len(codes) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            for (code, row) in zip(missing, self.compute(StateEncoder.decode_many(missing))):
+                rows[code] = row
+                self._entries[code] = row
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return np.array([rows[code] for code in codes])
+
+    def summary_str(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups else 0.0
+        return (f'Feature cache: {len(self):,} entries, {self.hits:,} hits,'
+                f' {self.misses:,} misses ({100 * hit_rate:.1f}% hit rate)')
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as np
+
+from rl import LinearPolicy
+from scorecard import Scorecard
+from solver import Solver
+from state_encoder import FeatureCache, StateEncoder
+
+
+class FeatureCacheTest(unittest.TestCase):
+    def test_lru(self):
+        batches = []
+        def compute(states):
+            batches.append(len(states))
+            return states[:, 3:4] * 10
+        cache = FeatureCache(compute, maxsize=2)
+        codes = [StateEncoder.encode(0, 0, 0, srid, 1) for srid in range(3)]
+        rows = cache.get_many([codes[0], codes[1], codes[0]])
+        assert(rows.tolist() == [[0], [10], [0]])
+        assert(batches == [2])  # The missing codes are computed together, once each
+        assert(cache.get_many([codes[0]]).tolist() == [[0]])  # codes[0] is now the most recent
+        cache.get_many([codes[2]])  # Evicts codes[1]
+        cache.get_many([codes[1]])
+        assert(batches == [2, 1, 1])
+        assert((cache.hits, cache.misses) == (2, 4))
+        assert(len(cache) == 2)
+
+    def test_policy(self):
+        observations = np.array([[0, 0, 0, 7, 1], [5, 3, 1, 100, 3], [0, 0, 0, 7, 1]])
+        policy = LinearPolicy(feature_cache=FeatureCache(LinearPolicy.get_features))
+        assert(np.array_equal(policy.get_actions(observations),
+                              LinearPolicy().get_actions(observations)))
+        assert((policy.feature_cache.hits, policy.feature_cache.misses) == (1, 2))
+
+
+class StateEncoderTest(unittest.TestCase):
+    def test_round_trip(self):
+        rng = np.random.default_rng(1)
+        states = np.column_stack([rng.integers(0, StateEncoder.MASK_COUNT, 1000),
+                                  rng.integers(0, StateEncoder.UPPER_COUNT, 1000),
+                                  rng.integers(0, 2, 1000),
+                                  rng.integers(0, StateEncoder.SRID_COUNT, 1000),
+                                  rng.integers(1, 4, 1000)])
+        codes = StateEncoder.encode_many(states)
+        assert(np.array_equal(StateEncoder.decode_many(codes), states))
+        assert(0 <= codes.min() and codes.max() < StateEncoder.CODE_COUNT)
+        for (state, code) in zip(states[:20].tolist(), codes[:20].tolist()):
+            assert(StateEncoder.encode(*state) == code)
+            assert(StateEncoder.decode(code) == tuple(state))
+
+    def test_upper_is_capped(self):
+        assert(StateEncoder.encode(3, 80, 0, 5, 2)
+               == StateEncoder.encode(3, Scorecard.UPPER_THRESHOLD, 0, 5, 2))
+        assert(StateEncoder.encode_many([[3, 80, 0, 5, 2]])[0]
+               == StateEncoder.encode(3, 80, 0, 5, 2))
+
+    def test_turn_state(self):
+        """The code of a turn state is its flat index in Solver.state_values."""
+        shape = (Solver.MASK_COUNT, Solver.UPPER_COUNT, 2)
+        for (used_mask, upper, yflag) in [(0, 0, 0), (1, 17, 1), (8191, 63, 1)]:
+            code = StateEncoder.encode(used_mask, upper, yflag, 251, 3)
+            turn_state = code // StateEncoder.TURN_STATE_DIVISOR
+            assert(turn_state == np.ravel_multi_index((used_mask, upper, yflag), shape))
+            assert(turn_state == StateEncoder.encode_turn_state(used_mask, upper, yflag))
+            assert(StateEncoder.decode_turn_state(turn_state) == (used_mask, upper, yflag))
+
+
+if __name__ == '__main__':
+    unittest.main()
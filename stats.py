@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 
 from dataclasses import dataclass
+from functools import lru_cache
 from itertools import combinations_with_replacement as cwr
 from itertools import product
-from statistics import mean
 from typing import Callable, List
 
 import numpy as np
@@ -11,6 +11,7 @@ import numpy.typing as npt
 
 from box import Box
 from scorecard import Scorecard
+from table_cache import TableCache
 from util import Util
 
 
@@ -37,7 +38,13 @@ def inds_to_permutation(inds):
     return permutation
 
 
-@Util.init_static
+def rolls_to_rids(rolls):
+    """Map an array of rolls (last axis = 5 dice) to rids, matching the ordering of
+    product(range(1, 7), repeat=5).
+    """
+    return (np.asarray(rolls) - 1) @ np.array([6**4, 6**3, 6**2, 6, 1])
+
+
 class Stats:
     """Some types of data used in this class:
       * roll: Roll of five dice.
@@ -53,112 +60,305 @@ class Stats:
       * srid = Sorted Roll ID, with values from 0 to 251.
             The 252 sorted outcomes, or srolls, are indexed via the generator
                 itertools.combinations_with_replacement(range(1, 7), repeat=5)
+      * keep: A sorted tuple of the 0 to 5 dice kept (i.e., not re-rolled), as a multiset.
+            Re-rolls that keep the same multiset of dice, such as re-rolling either 3 of
+            (3,3,4,5,6), have the same outcomes, so there are only 462 distinct keeps.
+      * kid = Keep ID, with values from 0 to 461, indexing the list Stats.stat_keeps:
+            keeps are ordered by size, then by combinations_with_replacement(range(1, 7), size).
+            So kid 0 is the empty keep (re-rolling all five dice).
       * delta = Delta from OptimalScore = Score - Mean Score using Optimal Strategy
             One possible strategy is to seek the maximum box score in each round, but this
             would place undue emphasis on pursuing FIVES and SIXES boxes before the ACES box.
+
+    Each stat_* table is built (or loaded from the on-disk cache) on first access,
+    so that importing this module is cheap. Call Stats.warmup() to build them all eagerly.
     """
+    TABLES = ['stat_srolls', 'stat_sroll_to_srid', 'stat_rerolls', 'stat_rid_to_srid',
+              'stat_roll_to_sroll_data', 'stat_scores',
+              'stat_keeps', 'stat_keep_to_kid', 'stat_keep_prob_csr', 'stat_keep_prob',
+              'stat_kid_by_rrid', 'stat_srid_to_kids']
+    TABLE_FORMAT_VERSION = 2
 
-    @classmethod
-    def _init_static(cls):
-        stat_srolls = [sroll for sroll in cwr(range(1, 7), 5)]
-        setattr(cls, 'stat_srolls', stat_srolls)
-        # ----------------------------------------
-        stat_sroll_to_srid = { sroll: k
-                               for k, sroll in enumerate(cwr(range(1, 7), 5)) }
-        setattr(cls, 'stat_sroll_to_srid', stat_sroll_to_srid)
-        # ----------------------------------------
-        stat_rerolls = [Util.reverse([(4 - pos) for pos in range(5)
-                        if (k // 2**pos) % 2 == 1])
-                        for k in range(0, 32)]
-        setattr(cls, 'stat_rerolls', stat_rerolls)
-        # ----------------------------------------
-        """sroll, re-roll --> probability of subsequent sroll outcomes.
-           shape=(srid, rrid, srid) = (252, 32, 252)
+    # Array-valued tables are cached on disk. See TableCache.
+    _cache = TableCache('stats', TABLE_FORMAT_VERSION)
+
+    @staticmethod
+    def _build_keep_prob(keeps, rid_to_srid):
+        """Vectorized construction of the dense keep probabilities (see stat_keep_prob_csr).
+        For each keep size, all keeps of that size are combined with all 6**(5 - size)
+        outcomes of the re-rolled dice, mapped to target srids via rid_to_srid
+        (which sorts the dice), and tallied with a single scatter-add (bincount).
         """
-        stat_reroll_prob = np.zeros(shape=(252, 32, 252), dtype=np.double)
-        setattr(cls, 'stat_reroll_prob', stat_reroll_prob)
-        for srid in range(252):
-            for rrid in range(32):
-                reroll = stat_rerolls[rrid]
-                length = len(reroll)
-                if length == 0:
-                    stat_reroll_prob[srid, rrid, srid] = 1
-                elif length == 1:
-                    roll2 = list(stat_srolls[srid])
-                    for d1 in range(1, 7):
-                        roll2[reroll[0]] = d1
-                        srid2 = stat_sroll_to_srid[tuple(sorted(roll2))]
-                        stat_reroll_prob[srid, rrid, srid2] += 1/6
-                elif length == 2:
-                    roll2 = list(stat_srolls[srid])
-                    for (d1,d2) in product(range(1, 7), repeat=2):
-                        roll2[reroll[0]] = d1
-                        roll2[reroll[1]] = d2
-                        srid2 = stat_sroll_to_srid[tuple(sorted(roll2))]
-                        stat_reroll_prob[srid, rrid, srid2] = 1/(6**2)
-                elif length == 3:
-                    roll2 = list(stat_srolls[srid])
-                    for (d1,d2,d3) in product(range(1, 7), repeat=3):
-                        roll2[reroll[0]] = d1
-                        roll2[reroll[1]] = d2
-                        roll2[reroll[2]] = d3
-                        srid2 = stat_sroll_to_srid[tuple(sorted(roll2))]
-                        stat_reroll_prob[srid, rrid, srid2] = 1/(6**3)
-                elif length == 4:
-                    roll2 = list(stat_srolls[srid])
-                    for (d1,d2,d3,d4) in product(range(1, 7), repeat=4):
-                        roll2[reroll[0]] = d1
-                        roll2[reroll[1]] = d2
-                        roll2[reroll[2]] = d3
-                        roll2[reroll[3]] = d4
-                        srid2 = stat_sroll_to_srid[tuple(sorted(roll2))]
-                        stat_reroll_prob[srid, rrid, srid2] = 1/(6**4)
-                else:  # length == 5
-                    assert(length ==5)
-                    roll2 = list(stat_srolls[srid])
-                    for (d1,d2,d3,d4,d5) in product(range(1, 7), repeat=5):
-                        roll2[reroll[0]] = d1
-                        roll2[reroll[1]] = d2
-                        roll2[reroll[2]] = d3
-                        roll2[reroll[3]] = d4
-                        roll2[reroll[4]] = d5
-                        srid2 = stat_sroll_to_srid[tuple(sorted(roll2))]
-                        stat_reroll_prob[srid, rrid, srid2] = 1/(6**5)
-        # ----------------------------------------
+        result = np.zeros(shape=(len(keeps), 252), dtype=np.double)
+        kid = 0
+        for size in range(6):
+            size_keeps = [keep for keep in keeps if len(keep) == size]
+            size_keeps = np.array(size_keeps, dtype=np.intp).reshape(len(size_keeps), size)
+            outcome_count = 6**(5 - size)
+            outcomes = np.array(list(product(range(1, 7), repeat=5 - size)),
+                                dtype=np.intp).reshape(outcome_count, 5 - size)
+            rolls = np.concatenate(
+                [np.repeat(size_keeps[:, np.newaxis, :], outcome_count, axis=1),
+                 np.repeat(outcomes[np.newaxis, :, :], len(size_keeps), axis=0)], axis=2)
+            tgt_srids = rid_to_srid[rolls_to_rids(rolls)]
+            flat = (np.arange(len(size_keeps))[:, np.newaxis] * 252 + tgt_srids).ravel()
+            counts = np.bincount(flat, minlength=len(size_keeps) * 252)
+            result[kid:kid + len(size_keeps)] = counts.reshape(-1, 252) / outcome_count
+            kid += len(size_keeps)
+        return result
+
+    @staticmethod
+    def _dense_to_csr(dense):
+        """Returns the compressed sparse row (CSR) form of a 2D array: (data, indices, indptr)."""
+        (rows, indices) = np.nonzero(dense)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(dense)))])
+        return (dense[rows, indices], indices, indptr)
+
+    @staticmethod
+    def _csr_to_dense(data, indices, indptr, column_count):
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        result = np.zeros(shape=(len(indptr) - 1, column_count), dtype=data.dtype)
+        result[rows, indices] = data
+        return result
+
+    @staticmethod
+    def _build_kid_by_rrid(srolls, rerolls, keep_to_kid):
+        """(srid, rrid) --> kid of the dice kept, as an integer array of shape (252, 32)."""
+        result = np.zeros(shape=(252, 32), dtype=np.intp)
+        for srid, sroll in enumerate(srolls):
+            for rrid, reroll in enumerate(rerolls):
+                keep = tuple(die for pos, die in enumerate(sroll) if pos not in reroll)
+                result[srid, rrid] = keep_to_kid[keep]
+        return result
+
+    @staticmethod
+    def _build_rid_to_srid(sroll_to_srid):
+        """rid --> srid, as an integer array of length 6**5."""
+        rolls = np.array(list(product(range(1, 7), repeat=5)), dtype=np.intp)
+        srolls = np.sort(rolls, axis=1)
+        srid_by_sroll_rid = np.zeros(6**5, dtype=np.intp)
+        for sroll, srid in sroll_to_srid.items():
+            srid_by_sroll_rid[rolls_to_rids(np.array(sroll))] = srid
+        return srid_by_sroll_rid[rolls_to_rids(srolls)]
+
+    @staticmethod
+    def _build_roll_to_sroll_data(rid_to_srid, sroll_inds):
         """Given a roll, return the sorted roll data:
              sroll, sorted roll ID, sort and unsort functions.
         """
-        stat_roll_to_sroll_data = {}
-        setattr(cls, 'stat_roll_to_sroll_data', stat_roll_to_sroll_data)
-        for roll in product(range(1, 7), repeat=5):
-            zipped = zip(roll, range(5))
-            szipped = sorted(zipped, key=lambda pair: pair[0])
-            sroll = list(map(lambda pair: pair[0], szipped))
-            srid = stat_sroll_to_srid[tuple(sroll)]
-            inds = list(map(lambda x: x[1], szipped))
-            uinds = [inds.index(k) for k in range(5)]
+        result = {}
+        srids = rid_to_srid.tolist()
+        inds_list = sroll_inds.tolist()
+        uinds_list = np.argsort(sroll_inds, axis=1).tolist()
+        for rid, roll in enumerate(product(range(1, 7), repeat=5)):
+            inds = inds_list[rid]
+            uinds = uinds_list[rid]
+            sroll = [roll[k] for k in inds]
             f_sort = inds_to_permutation(inds)
             f_unsort = inds_to_permutation(uinds)
-            stat_roll_to_sroll_data[roll] = (sroll, srid, inds, uinds,
-                                             f_sort, f_unsort)
-        # ----------------------------------------
-        """sroll, choice of scoring box --> resulting box score.
+            result[roll] = (sroll, srids[rid], inds, uinds, f_sort, f_unsort)
+        return result
+
+    @staticmethod
+    def _build_scores(srolls):
+        """sroll, choice of scoring box --> resulting box score, without the Joker Rule.
            So score_stats.shape = (252, 13), and dtype=int.
         """
-        stat_scores = np.zeros(shape=(252, 13), dtype=int)
-        setattr(cls, 'stat_scores', stat_scores)
-        for k, sroll in enumerate(cwr(range(1, 7), 5)):
-            for box in Box.nonnone_boxes():
-                score = Scorecard().get_box_score(box, sroll)[0]
-                stat_scores[k, box.to_index()] = score
+        raw_scores = np.array(Scorecard.raw_scores, dtype=int)
+        return raw_scores[rolls_to_rids(np.array(srolls))]
 
     @staticmethod
-    def get_exp_reroll_delta(srid, rrid, boxes_unused):
-        # Return expected delta score from srid, re-rolling rrid
-        result = mean(
-            [Stats.stat_reroll_prob[76, 7, tgt_srid]
-                * max([Stats.stat_scores[tgt_srid, box.to_index()]
-                       for box in boxes_unused])
-            for tgt_srid in range(252)
-            ])
+    def _build_sroll_inds():
+        """rid --> indices of the dice of the roll, in sorted order.
+        Ties keep their original order, so that the sort is stable.
+        """
+        rolls = np.array(list(product(range(1, 7), repeat=5)), dtype=np.intp)
+        return np.argsort(rolls, axis=1, kind='stable')
+
+    @Util.lazy_static
+    def stat_srolls(cls):
+        srolls = cls._cache.get('srolls', lambda: np.array(list(cwr(range(1, 7), 5))))
+        return [tuple(sroll) for sroll in srolls.tolist()]
+
+    @Util.lazy_static
+    def stat_sroll_to_srid(cls):
+        return { sroll: k for k, sroll in enumerate(cls.stat_srolls) }
+
+    @Util.lazy_static
+    def stat_rerolls(cls):
+        return [Util.reverse([(4 - pos) for pos in range(5)
+                if (k // 2**pos) % 2 == 1])
+                for k in range(0, 32)]
+
+    @Util.lazy_static
+    def stat_rid_to_srid(cls):
+        return cls._cache.get('rid_to_srid',
+                              lambda: cls._build_rid_to_srid(cls.stat_sroll_to_srid))
+
+    @Util.lazy_static
+    def stat_reroll_prob(cls):
+        """sroll, re-roll --> probability of subsequent sroll outcomes.
+           shape=(srid, rrid, srid) = (252, 32, 252)
+           This dense form takes 16 MB, so it is built only on request (e.g., by tests),
+           and is not in Stats.TABLES. See stat_keep_prob_csr.
+        """
+        return cls.stat_keep_prob[cls.stat_kid_by_rrid]
+
+    @Util.lazy_static
+    def stat_roll_to_sroll_data(cls):
+        sroll_inds = cls._cache.get('sroll_inds', cls._build_sroll_inds)
+        return cls._build_roll_to_sroll_data(cls.stat_rid_to_srid, sroll_inds)
+
+    @Util.lazy_static
+    def stat_scores(cls):
+        return cls._cache.get('scores', lambda: cls._build_scores(cls.stat_srolls))
+
+    @Util.lazy_static
+    def stat_keeps(cls):
+        return [keep for size in range(6) for keep in cwr(range(1, 7), size)]
+
+    @Util.lazy_static
+    def stat_keep_to_kid(cls):
+        return { keep: k for k, keep in enumerate(cls.stat_keeps) }
+
+    @Util.lazy_static
+    def stat_keep_prob_csr(cls):
+        """keep --> probability of subsequent sroll outcomes, after re-rolling the other dice,
+           in compressed sparse row form, as the arrays (data, indices, indptr):
+           kid reaches srid indices[j] with probability data[j], for j in
+           range(indptr[kid], indptr[kid + 1]).
+           Only 4,368 of the 462 * 252 probabilities are nonzero, as the kept dice stay.
+        """
+        build = lru_cache()(lambda: cls._dense_to_csr(
+                                cls._build_keep_prob(cls.stat_keeps, cls.stat_rid_to_srid)))
+        return tuple(cls._cache.get(name, lambda k=k: build()[k])
+                     for k, name in enumerate(['keep_prob_data', 'keep_prob_indices',
+                                               'keep_prob_indptr']))
+
+    @Util.lazy_static
+    def stat_keep_prob(cls):
+        """Dense form of stat_keep_prob_csr. shape=(kid, srid) = (462, 252)
+           This holds the distinct rows of stat_reroll_prob, in 1/17 of the memory.
+           It is kept in memory (not on disk) for products with arrays of values,
+           where BLAS beats NumPy-level sparse products at this size.
+        """
+        return cls._csr_to_dense(*cls.stat_keep_prob_csr, 252)
+
+    @Util.lazy_static
+    def stat_kid_by_rrid(cls):
+        """sroll, re-roll --> kid of the dice kept. shape=(srid, rrid) = (252, 32)
+           So stat_keep_prob[stat_kid_by_rrid[srid, rrid]] == stat_reroll_prob[srid, rrid].
+        """
+        return cls._cache.get('kid_by_rrid',
+                              lambda: cls._build_kid_by_rrid(cls.stat_srolls, cls.stat_rerolls,
+                                                             cls.stat_keep_to_kid))
+
+    @Util.lazy_static
+    def stat_srid_to_kids(cls):
+        """sroll --> distinct keeps available, as the pair of integer arrays (kids, offsets):
+           kids[offsets[srid]:offsets[srid + 1]] lists the kids for srid in increasing order,
+           and len(offsets) == 253. (This is 4,368 keeps in all, rather than 252 * 32.)
+        """
+        kids_by_srid = [np.unique(kids) for kids in np.asarray(cls.stat_kid_by_rrid)]
+        offsets = np.cumsum([0] + [len(kids) for kids in kids_by_srid])
+        return (np.concatenate(kids_by_srid), offsets)
+
+    @classmethod
+    def warmup(cls):
+        """Builds (or loads) all tables now, rather than on first use."""
+        for name in Stats.TABLES:
+            getattr(cls, name)
+
+    @staticmethod
+    @lru_cache(maxsize=2**14)
+    def get_best_deltas(used_mask, yflag=False, roll_num=3):
+        """srid --> best delta over the unused boxes, as a read-only (252,) array.
+        The Joker Rule is applied to Yahtzee srolls if yflag is set.
+        For roll_num 1 or 2, this is the expected best delta of an sroll on that roll,
+        with the best re-roll(s) before scoring (where rrid 0, keeping all dice, covers
+        scoring early).
+        """
+        if roll_num < 3:
+            next_deltas = Stats.get_best_deltas(used_mask, yflag, roll_num + 1)
+            result = Stats.get_best_keep_values(next_deltas)
+        else:
+            result = Stats.get_best_deltas_many([used_mask], [yflag])[:, 0]
+        result.flags.writeable = False
         return result
+
+    @staticmethod
+    def get_best_deltas_many(used_masks, yflags, roll_num=3):
+        """As get_best_deltas, for arrays of n used_masks and yflags, as a (252, n) array,
+        computed together (and not cached).
+        """
+        used_masks = np.asarray(used_masks, dtype=np.int64)
+        yflags = np.asarray(yflags, dtype=bool)
+        if roll_num < 3:
+            return Stats.get_best_keep_values(
+                       Stats.get_best_deltas_many(used_masks, yflags, roll_num + 1))
+        srolls = np.array(Stats.stat_srolls)
+        is_yahtzee = srolls[:, 0] == srolls[:, 4]
+        is_upper_box_used = ((used_masks[:, np.newaxis] >> (srolls[:, 0] - 1)) & 1) == 1
+        scores = Scorecard.apply_joker_overlay(Stats.stat_scores, is_yahtzee,
+                                               yflags[:, np.newaxis], is_upper_box_used)
+        deltas = scores - OptimalPlay.AVG_BOX_SCORES  # (n, 252, 13)
+        is_box_used = ((used_masks[:, np.newaxis] >> np.arange(Box.nonnone_count())) & 1) == 1
+        deltas[np.broadcast_to(is_box_used[:, np.newaxis, :], deltas.shape)] = -np.inf
+        return deltas.max(axis=2).T
+
+    @staticmethod
+    def get_best_keep_values(values):
+        """Given values (252, ...) of each srid after a re-roll, returns the (252, ...) values
+        of each srid before the re-roll, with the best keep for each srid (and column).
+        Only the distinct keeps of each srid are evaluated.
+        """
+        (kids, offsets) = Stats.stat_srid_to_kids
+        keep_values = Stats.get_keep_values(values)
+        return np.maximum.reduceat(keep_values[kids], offsets[:-1], axis=0)
+
+    @staticmethod
+    def get_values_by_rrid(values):
+        """Given values (252, ...) of each srid after a re-roll, returns the (252, 32, ...)
+        expected values of each (srid, rrid) before the re-roll.
+        """
+        return Stats.get_keep_values(values)[Stats.stat_kid_by_rrid]
+
+    @staticmethod
+    def get_keep_value(kid, values):
+        """Given values (252, ...) of each srid after a re-roll, returns the expected value
+        after re-rolling all but the dice of the given keep, from its sparse row.
+        """
+        (data, indices, indptr) = Stats.stat_keep_prob_csr
+        (start, stop) = (indptr[kid], indptr[kid + 1])
+        return data[start:stop] @ values[indices[start:stop]]
+
+    @staticmethod
+    def get_keep_values(values):
+        """Given values (252, ...) of each srid after a re-roll, returns the (462, ...)
+        expected values after each keep.
+        """
+        return Stats.stat_keep_prob @ values
+
+    @staticmethod
+    def reroll_to_rrid(roll, reroll):
+        """Maps a re-roll (zero-based dice indices) of roll to the rrid of the equivalent
+        re-roll of the sorted roll.
+        """
+        (sroll, srid, inds, uinds, f_sort, f_unsort) = Stats.stat_roll_to_sroll_data[tuple(roll)]
+        return sum(1 << (4 - uinds[k]) for k in reroll)
+
+    @staticmethod
+    def get_exp_reroll_delta(srid, rrid, boxes_unused):
+        """Returns the expected best delta over boxes_unused, after re-rolling rrid from srid."""
+        used_mask = sum(1 << box.to_index() for box in Box.nonnone_boxes()
+                        if box not in boxes_unused)
+        return Stats.get_exp_reroll_deltas(srid, used_mask)[rrid]
+
+    @staticmethod
+    def get_exp_reroll_deltas(srid, used_mask, yflag=False, roll_num=2):
+        """Returns a (32,) array of the expected best delta over the unused boxes,
+        after re-rolling each rrid from srid on the given roll_num (1 or 2),
+        and then playing the remaining re-roll (if any) optimally.
+        """
+        keep_deltas = Stats.get_keep_values(Stats.get_best_deltas(used_mask, yflag, roll_num + 1))
+        return keep_deltas[Stats.stat_kid_by_rrid[srid]]
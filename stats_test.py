@@ -1,15 +1,48 @@
 #!/usr/bin/env python
 
+import subprocess
+import sys
 import unittest
 
 from itertools import combinations_with_replacement as cwr
+from itertools import product
 from statistics import mean
 
+import numpy as np
+
 from box import Box
-from stats import Stats
+from stats import OptimalPlay, Stats
+
+
+def reroll_prob_by_loops():
+    """Reference (slow) construction of Stats.stat_reroll_prob, one outcome at a time."""
+    result = np.zeros(shape=(252, 32, 252), dtype=np.double)
+    for srid in range(252):
+        for rrid in range(32):
+            reroll = Stats.stat_rerolls[rrid]
+            roll2 = list(Stats.stat_srolls[srid])
+            for dice in product(range(1, 7), repeat=len(reroll)):
+                for pos, die in zip(reroll, dice):
+                    roll2[pos] = die
+                srid2 = Stats.stat_sroll_to_srid[tuple(sorted(roll2))]
+                result[srid, rrid, srid2] += 1/(6**len(reroll))
+    return result
 
 
 class StatsTest(unittest.TestCase):
+    def test_lazy_tables(self):
+        code = ('from stats import Stats\n'
+                'from util import Util\n'
+                'assert(not any(Util.is_lazy_static_built(Stats, t) for t in Stats.TABLES))\n'
+                'Stats.stat_scores\n'
+                'assert(Util.is_lazy_static_built(Stats, "stat_scores"))\n'
+                'assert(not Util.is_lazy_static_built(Stats, "stat_reroll_prob"))\n'
+                'Stats.warmup()\n'
+                'assert(all(Util.is_lazy_static_built(Stats, t) for t in Stats.TABLES))\n'
+                'assert(not Util.is_lazy_static_built(Stats, "stat_reroll_prob"))\n')
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+
     def test_crw(self):
         assert(list(cwr(range(1, 7), 5))[76] == (1,2,3,4,5))
 
@@ -21,6 +54,59 @@ class StatsTest(unittest.TestCase):
         def is_one_sixth(srid2):
             return eq_approx(1/6, Stats.stat_reroll_prob[76, 2, srid2])
         assert(all(map(is_one_sixth, [28, 63, 73, 76, 78, 79])))
+        assert(np.allclose(Stats.stat_reroll_prob.sum(axis=2), 1))
+
+    def test_reroll_prob_matches_loops(self):
+        assert(np.allclose(Stats.stat_reroll_prob, reroll_prob_by_loops()))
+
+
+    def test_keeps(self):
+        assert(len(Stats.stat_keeps) == 462)
+        assert(Stats.stat_keeps[0] == ())
+        assert(Stats.stat_keeps[1] == (1,))
+        assert(Stats.stat_keeps[461] == (6, 6, 6, 6, 6))
+        assert(all(Stats.stat_keep_to_kid[keep] == kid
+                   for kid, keep in enumerate(Stats.stat_keeps)))
+        assert(np.allclose(Stats.stat_keep_prob.sum(axis=1), 1))
+
+    def test_kid_by_rrid(self):
+        assert(Stats.stat_kid_by_rrid[76, 0] == Stats.stat_keep_to_kid[(1, 2, 3, 4, 5)])
+        assert(Stats.stat_kid_by_rrid[76, 2] == Stats.stat_keep_to_kid[(1, 2, 3, 5)])
+        assert(Stats.stat_kid_by_rrid[76, 31] == Stats.stat_keep_to_kid[()])
+
+    def test_keep_prob_csr(self):
+        (data, indices, indptr) = Stats.stat_keep_prob_csr
+        assert(len(data) == len(indices) == indptr[-1] == 4368)
+        assert(np.all(data > 0))
+        assert(np.array_equal(Stats._csr_to_dense(data, indices, indptr, 252),
+                              Stats.stat_keep_prob))
+        assert(np.array_equal(Stats._dense_to_csr(Stats.stat_keep_prob)[2], indptr))
+
+        values = np.random.default_rng(2).random((252, 2))
+        for kid in [0, 100, 461]:
+            assert(np.allclose(Stats.get_keep_value(kid, values),
+                               Stats.stat_keep_prob[kid] @ values))
+
+    def test_srid_to_kids(self):
+        (kids, offsets) = Stats.stat_srid_to_kids
+        assert(len(offsets) == 253 and offsets[-1] == len(kids))
+        assert(list(kids[offsets[0]:offsets[1]])  # (1,1,1,1,1)
+               == [Stats.stat_keep_to_kid[(1,) * size] for size in range(6)])
+        for srid in range(252):
+            assert(set(kids[offsets[srid]:offsets[srid + 1]])
+                   == set(Stats.stat_kid_by_rrid[srid]))
+
+    def test_best_keep_values(self):
+        values = np.random.default_rng(1).random((252, 3))
+        expected = (Stats.stat_reroll_prob @ values).max(axis=1)
+        assert(np.allclose(Stats.get_best_keep_values(values), expected))
+        assert(np.allclose(Stats.get_values_by_rrid(values), Stats.stat_reroll_prob @ values))
+
+
+    def test_rid_to_srid(self):
+        for rid, roll in enumerate(product(range(1, 7), repeat=5)):
+            srid = Stats.stat_rid_to_srid[rid]
+            assert(Stats.stat_srolls[srid] == tuple(sorted(roll)))
 
 
     def test_rerolls(self):
@@ -40,6 +126,50 @@ class StatsTest(unittest.TestCase):
         exp_rr_ds = Stats.get_exp_reroll_delta(76, 7, Box.nonnone_boxes())
         assert(exp_rr_ds > 0)
 
+    def test_exp_reroll_deltas(self):
+        boxes_unused = [Box.FOURS, Box.YAHTZEE]
+        used_mask = sum(1 << box.to_index() for box in Box.nonnone_boxes()
+                        if box not in boxes_unused)
+        best_deltas = [max(Stats.stat_scores[tgt_srid, box.to_index()]
+                           - OptimalPlay.AVG_BOX_SCORES[box.to_index()]
+                           for box in boxes_unused)
+                       for tgt_srid in range(252)]
+        exp_rr_ds = Stats.get_exp_reroll_deltas(251, used_mask)
+        assert(exp_rr_ds.shape == (32,))
+        assert(exp_rr_ds[0] == 50 - OptimalPlay.AVG_BOX_SCORES[Box.YAHTZEE.to_index()])
+        for rrid in range(32):
+            expected = sum(Stats.stat_reroll_prob[251, rrid, tgt_srid] * best_deltas[tgt_srid]
+                           for tgt_srid in range(252))
+            assert(abs(exp_rr_ds[rrid] - expected) < 10e-9)
+            assert(Stats.get_exp_reroll_delta(251, rrid, boxes_unused) == exp_rr_ds[rrid])
+
+
+    def test_best_deltas(self):
+        best_deltas = Stats.get_best_deltas(0)
+        assert(best_deltas.shape == (252,))
+        assert(best_deltas[251] == 50 - OptimalPlay.AVG_BOX_SCORES[Box.YAHTZEE.to_index()])
+
+        used_mask = sum(1 << box.to_index() for box in Box.nonnone_boxes()
+                        if box != Box.ACES)
+        assert(Stats.get_best_deltas(used_mask)[0]
+               == 5 - OptimalPlay.AVG_BOX_SCORES[Box.ACES.to_index()])
+
+    def test_best_deltas_many(self):
+        used_masks = [0, 1, 0b1000000000000, 0b0111111111111, 0b1010101010101]
+        yflags = [False, True, True, True, False]
+        for roll_num in [1, 2, 3]:
+            best_deltas = Stats.get_best_deltas_many(used_masks, yflags, roll_num)
+            assert(best_deltas.shape == (252, len(used_masks)))
+            for (k, (used_mask, yflag)) in enumerate(zip(used_masks, yflags)):
+                assert(np.allclose(best_deltas[:, k],
+                                   Stats.get_best_deltas(used_mask, yflag, roll_num)))
+
+    def test_reroll_to_rrid(self):
+        assert(Stats.reroll_to_rrid([1,2,3,4,5], []) == 0)
+        assert(Stats.reroll_to_rrid([1,2,3,4,5], [0]) == 16)
+        assert(Stats.reroll_to_rrid([5,4,3,2,1], [0]) == 1)
+        assert(Stats.reroll_to_rrid([5,4,3,2,1], [0,1,2,3,4]) == 31)
+
 
     def test_srolls(self):
         assert(Stats.stat_srolls[0] == (1, 1, 1, 1, 1))
@@ -1,14 +1,14 @@
 #!/usr/bin/env python
 
 from collections import Counter, defaultdict
-from copy import deepcopy
-from statistics import mean
+from statistics import fmean
 
 import numpy as np
 
 from box import Box
 from dice import Dice
-from stats import OptimalPlay
+from game_state import simulate_reroll
+from stats import Stats
 from util import Util
 
 
@@ -17,43 +17,55 @@ class Strategy:
     DEFAULT_MC_ITERATIONS_ROLL2 = 6  # Number of times roll #3 is sampled
 
     @staticmethod
-    def _get_delta_1_mean_by_goal(p, bs, n=DEFAULT_MC_ITERATIONS_ROLL1):
-        def get_delta_mean_from_reroll(p, reroll1, n):
-            return mean([get_delta_sample_from_reroll(p, reroll1) for _ in range(n)])
-
-        def get_delta_sample_from_reroll(p, reroll1):
-            player = deepcopy(p)
-            player._reroll(reroll1)
-            boxes_unused2 = player._scorecard.get_boxes_unused()
-            g2s = Strategy._get_delta_2_mean_by_goal(player, boxes_unused2)
+    def _get_delta_1_mean_by_goal(state, bs, n=DEFAULT_MC_ITERATIONS_ROLL1, is_exact=False,
+                                  dice=Dice):
+        """Takes a GameState on roll #1. Returns the mean best delta by goal box.
+        If is_exact, each sampled roll #2 is evaluated with exact expectations.
+        Samples are drawn from dice (Dice, or a DiceSource).
+        """
+        def get_delta_mean_from_reroll(state, reroll1, n):
+            return fmean([get_delta_sample_from_reroll(state, reroll1) for _ in range(n)])
+
+        def get_delta_sample_from_reroll(state, reroll1):
+            state2 = simulate_reroll(state, reroll1, dice)
+            boxes_unused2 = state2.get_boxes_unused()
+            g2s = Strategy._get_delta_2_mean_by_goal(state2, boxes_unused2, is_exact=is_exact,
+                                                     dice=dice)
             score = max(g2s.values())
             return score
 
-        assert(p._roll_num == 1)
-        g2r = Strategy.goals_to_rerolls(p._roll, bs)
-        g2s = {b: get_delta_mean_from_reroll(p, g2r[b], n) for b in bs}
+        assert(state.roll_num == 1)
+        g2r = Strategy.goals_to_rerolls(state.roll, bs)
+        g2s = {b: get_delta_mean_from_reroll(state, g2r[b], n) for b in bs}
         return g2s
 
     @staticmethod
-    def _get_delta_2_mean_by_goal(p, bs, n=DEFAULT_MC_ITERATIONS_ROLL2):
-        def get_delta_mean_from_reroll(p, reroll2, n):
-            return mean([get_delta_sample_from_reroll(p, reroll2)
+    def _get_delta_2_mean_by_goal(state, bs, n=DEFAULT_MC_ITERATIONS_ROLL2, is_exact=False,
+                                  dice=Dice):
+        """Takes a GameState on roll #2. Returns the mean best delta by goal box.
+        If is_exact, the mean is the exact expectation over the 252 srolls of roll #3,
+        computed from Stats.stat_keep_prob_csr, and n is ignored.
+        Otherwise, it is estimated from n samples drawn from dice (Dice, or a DiceSource).
+        """
+        def get_delta_mean_from_reroll(state, reroll2, n):
+            if is_exact:
+                srid = Stats.stat_roll_to_sroll_data[state.roll][1]
+                rrid = Stats.reroll_to_rrid(state.roll, reroll2)
+                best_deltas = Stats.get_best_deltas(state.used_mask, state.yflag)
+                kid = Stats.stat_kid_by_rrid[srid, rrid]
+                return float(Stats.get_keep_value(kid, best_deltas))
+            return fmean([get_delta_sample_from_reroll(state, reroll2)
                                for _ in range(n)])
 
-        def get_delta_sample_from_reroll(p, reroll2):
-            player = deepcopy(p)
-            player._reroll(reroll2)
-            final_outcomes = {
-                box: player._scorecard.get_box_score(box, player._roll)[0]
-                         - OptimalPlay.AVG_BOX_SCORES[box.to_index()]
-                for box in player._scorecard.get_boxes_unused()
-                }
+        def get_delta_sample_from_reroll(state, reroll2):
+            state3 = simulate_reroll(state, reroll2, dice)
+            final_outcomes = state3.get_box_deltas()
             score = max(final_outcomes.values())
             return score
 
-        assert(p._roll_num == 2)
-        g2r = Strategy.goals_to_rerolls(p._roll, bs)
-        g2s = {b: get_delta_mean_from_reroll(p, g2r[b], n) for b in bs}
+        assert(state.roll_num == 2)
+        g2r = Strategy.goals_to_rerolls(state.roll, bs)
+        g2s = {b: get_delta_mean_from_reroll(state, g2r[b], n) for b in bs}
         return g2s
 
     @staticmethod
@@ -2,7 +2,11 @@
 
 import unittest
 
+from itertools import product
+from statistics import fmean
+
 from box import Box
+from game_state import GameState
 from strategy import Strategy
 
 
@@ -45,6 +49,22 @@ class StrategyTest(unittest.TestCase):
 
         StrategyTest.assert_reroll_for_box([1,2,3,4,5], Box.CHANCE, [0,1,2])
 
+    def test_exact_delta_2(self):
+        used_mask = (1 << Box.ACES.to_index()) | (1 << Box.CHANCE.to_index())
+        state = GameState((5,2,5,6,5), 2, used_mask, 3, False)
+        bs = state.get_boxes_unused()
+        g2s = Strategy._get_delta_2_mean_by_goal(state, bs, is_exact=True)
+        g2r = Strategy.goals_to_rerolls(state.roll, bs)
+        for box in bs:
+            reroll = g2r[box]
+            deltas = []
+            for dice in product(range(1, 7), repeat=len(reroll)):
+                roll = list(state.roll)
+                for k, die in zip(reroll, dice):
+                    roll[k] = die
+                deltas.append(max(state._replace(roll=tuple(roll)).get_box_deltas().values()))
+            assert(abs(g2s[box] - fmean(deltas)) < 10e-9)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import hashlib
+import os
+
+import numpy as np
+
+from config import Config
+
+
+class TableCache:
+    """Versioned on-disk cache of NumPy lookup tables.
+    Each table is stored in its own .npy file, so that it can be loaded with
+    np.load(mmap_mode='r'), letting processes on one host share it via the page cache.
+    The cache directory name includes a hash of the table-format version and
+    of the Config rule flags, so changing either one invalidates old tables.
+    Caching is disabled when Config.CACHE_DIR is empty.
+    """
+    RULE_FLAGS = ['DO_USE_JOKER_RULE',
+                  'DO_USE_JOKER_RULE_UPPER_SECTION',
+                  'DO_USE_YAHTZEE_BONUS']
+
+    def __init__(self, prefix, version):
+        self.prefix = prefix
+        self.version = version
+
+    @property
+    def key(self):
+        flags = ','.join(f'{flag}={getattr(Config, flag)}' for flag in TableCache.RULE_FLAGS)
+        text = f'{self.prefix}:v{self.version}:{flags}'
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    @property
+    def path(self):
+        if not Config.CACHE_DIR:
+            return None
+        return os.path.join(Config.CACHE_DIR, f'{self.prefix}-v{self.version}-{self.key}')
+
+    def has(self, name):
+        """Returns whether the named table is cached on disk (never, if caching is disabled)."""
+        path = self.path
+        return path is not None and os.path.exists(os.path.join(path, f'{name}.npy'))
+
+    def get(self, name, build):
+        """Returns the named table, memory-mapped from disk if present.
+        Otherwise builds it with build(), then saves it for subsequent processes.
+        """
+        path = self.path
+        if path is None:
+            return build()
+        filename = os.path.join(path, f'{name}.npy')
+        try:
+            return np.load(filename, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+        table = build()
+        self.save(name, table)
+        return table
+
+    def save(self, name, table):
+        """Atomically writes a table to the cache. Failures to write are not fatal."""
+        path = self.path
+        if path is None:
+            return
+        filename = os.path.join(path, f'{name}.npy')
+        tmp_filename = f'{filename}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(path, exist_ok=True)
+            with open(tmp_filename, 'wb') as f:
+                np.save(f, np.asarray(table))
+            os.replace(tmp_filename, filename)
+        except OSError:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from config import Config
+from table_cache import TableCache
+
+
+class TableCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.orig_cache_dir = Config.CACHE_DIR
+        Config.CACHE_DIR = self.tmpdir.name
+
+    def tearDown(self):
+        Config.CACHE_DIR = self.orig_cache_dir
+        self.tmpdir.cleanup()
+
+    def test_build_once_then_mmap(self):
+        build_count = 0
+        def build():
+            nonlocal build_count
+            build_count += 1
+            return np.arange(12).reshape(3, 4)
+
+        cache = TableCache('test', 1)
+        table1 = cache.get('table', build)
+        table2 = cache.get('table', build)
+        assert(build_count == 1)
+        assert(isinstance(table2, np.memmap))
+        assert(np.array_equal(table1, table2))
+        assert(os.path.exists(os.path.join(cache.path, 'table.npy')))
+
+    def test_has(self):
+        cache = TableCache('test', 1)
+        assert(not cache.has('table'))
+        cache.get('table', lambda: np.ones(3))
+        assert(cache.has('table'))
+        assert(not cache.has('other'))
+
+    def test_key_depends_on_rules_and_version(self):
+        cache = TableCache('test', 1)
+        key = cache.key
+        assert(TableCache('test', 2).key != key)
+
+        orig = Config.DO_USE_JOKER_RULE
+        try:
+            Config.DO_USE_JOKER_RULE = not orig
+            assert(cache.key != key)
+        finally:
+            Config.DO_USE_JOKER_RULE = orig
+
+    def test_disabled(self):
+        Config.CACHE_DIR = ''
+        cache = TableCache('test', 1)
+        assert(cache.path is None)
+        orig_cwd = os.getcwd()
+        try:
+            os.chdir(self.tmpdir.name)
+            open('table.npy', 'wb').close()  # In the working directory, which is not the cache
+            assert(not cache.has('table'))
+        finally:
+            os.chdir(orig_cwd)
+        assert(np.array_equal(cache.get('table', lambda: np.ones(3)), np.ones(3)))
+
+
+if __name__ == '__main__':
+    unittest.main()
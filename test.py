@@ -2,12 +2,25 @@
 
 import unittest
 
-from dice_test import DiceTest
-from player_bot_test import Player_MonteCarlo_Fast_Test
-from scorecard_test import ScorecardTest
+from decision_cache_test import DecisionCacheTest
+from dice_test import AlignedDiceTest, DiceSourceTest, DiceTest
+from game_state_test import GameStateTest
+from instrumentation_test import InstrumentationTest
+from player_bot_test import Player_MonteCarlo_Fast_Test, Player_MonteCarlo_Slow_Test
+from player_bot_test import Player_Optimal_Test, Player_RL_Test
+from replay_test import PairedComparisonTest, PlayStreamTest
+from rl_test import LinearPolicyTest, VectorYahtzeeEnvTest, YahtzeeEnvTest
+from score_stats_test import ScoreStatsTest
+from scorecard_test import CompactScorecardTest, ScorecardTest
+from simulator_test import GameBatchTest
+from solver_test import SolverTest
+from state_encoder_test import FeatureCacheTest, StateEncoderTest
 from stats_test import StatsTest
 from strategy_test import StrategyTest
-from util_test import LongestConsecutiveSequenceTest
+from table_cache_test import TableCacheTest
+from trajectory_test import TrajectoryTest
+from util_test import LazyStaticTest, LongestConsecutiveSequenceTest
+from yahtzee_test import GameSequenceTest, TournamentTest
 
 
 if __name__ == '__main__':
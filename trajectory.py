@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+import os
+import struct
+
+import numpy as np
+
+from box import Box
+
+
+TRAJECTORY_DTYPE = np.dtype([('game_id', '<i8'),
+                             ('turn', 'u1'),
+                             ('roll_num', 'u1'),
+                             ('roll', 'u1', (5,)),
+                             ('action', 'u1'),
+                             ('box', 'u1'),
+                             ('score', '<i2')])
+TRAJECTORY_HEADER = b'YAHTZEE-TRAJ-v1\n'  # The format of the records depends on the version
+TRAJECTORY_STRUCT = struct.Struct('<qBB5BBBh')  # The layout of TRAJECTORY_DTYPE
+assert(TRAJECTORY_STRUCT.size == TRAJECTORY_DTYPE.itemsize)
+
+
+class TrajectoryWriter:
+    """Appends the moves of games to a trajectory file: a short header, followed by
+    fixed-width records of TRAJECTORY_DTYPE, one per move, so that the file can be
+    memory-mapped (see TrajectoryReader). Each record holds the state at the move
+    (game_id, turn, roll_num and roll, in die order) and the move:
+      * Re-rolls have box = Box.NONE (0), and an action whose bit i is set iff die i is re-rolled.
+      * Scoring moves have the box used, and an action of 0.
+    score is the score of the game after the move, so the reward of a move is the change
+    in score since the previous record of the game.
+
+    Records are buffered, and written in chunks of chunk_size records, and on flush()
+    or close(). An existing file is appended to, with game IDs continuing from its last game.
+    Set Player.recorder to a TrajectoryWriter to record the games of that player.
+    """
+    DEFAULT_CHUNK_SIZE = 2**16
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._buffer = bytearray(chunk_size * TRAJECTORY_DTYPE.itemsize)
+        self._buffered_count = 0
+        self._file = open(path, 'ab')
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() == 0:
+            self._file.write(TRAJECTORY_HEADER)
+            last_records = np.empty(0, dtype=TRAJECTORY_DTYPE)
+        else:
+            reader = TrajectoryReader(path)
+            self._file.truncate(reader.get_offset(len(reader)))  # Drop any partial record
+            last_records = reader.get_records(max(0, len(reader) - 1), len(reader))
+        self.game_id = int(last_records['game_id'][0]) if len(last_records) else -1
+        self._score = 0  # The score after the last scoring move, for re-roll records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        raise TypeError('TrajectoryWriter cannot be pickled: Give each process its own file')
+
+    def _append(self, turn, roll_num, roll, action, box, score):
+        TRAJECTORY_STRUCT.pack_into(self._buffer,
+                                    self._buffered_count * TRAJECTORY_STRUCT.size,
+                                    self.game_id, turn, roll_num, *roll, action, box, score)
+        self._buffered_count += 1
+        if self._buffered_count == self.chunk_size:
+            self.flush()
+
+    def append_file(self, path):
+        """Appends the games of the trajectory file at path, with new game IDs."""
+        self.flush()
+        game_id_offset = self.game_id + 1
+        for records in TrajectoryReader(path).iter_chunks(self.chunk_size):
+            records['game_id'] += game_id_offset
+            self._file.write(records.tobytes())
+            self.game_id = int(records['game_id'][-1])
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def flush(self):
+        self._file.write(memoryview(self._buffer)[:self._buffered_count
+                                                  * TRAJECTORY_STRUCT.size])
+        self._file.flush()
+        self._buffered_count = 0
+
+    def record_reroll(self, turn, roll_num, roll, reroll):
+        action = sum(1 << k for k in reroll)
+        self._append(turn, roll_num, roll, action, 0, self._score)
+
+    def record_use_box(self, turn, roll_num, roll, box, score):
+        self._score = score
+        self._append(turn, roll_num, roll, 0, int(box), score)
+
+    def start_game(self):
+        self.game_id += 1
+        self._score = 0
+
+
+class TrajectoryReader:
+    """Reads a trajectory file written by TrajectoryWriter, either memory-mapped as a whole
+    (get_records), or in chunks (iter_chunks), which also sees records appended while
+    reading, as by another process.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(len(TRAJECTORY_HEADER))
+        if header != TRAJECTORY_HEADER:
+            raise ValueError(f'Not a trajectory file (or unsupported version): {path}')
+
+    def __len__(self):
+        """Returns the number of complete records in the file."""
+        return ((os.path.getsize(self.path) - len(TRAJECTORY_HEADER))
+                // TRAJECTORY_DTYPE.itemsize)
+
+    @staticmethod
+    def get_offset(index):
+        """Returns the offset in the file of the record with the given index."""
+        return len(TRAJECTORY_HEADER) + index * TRAJECTORY_DTYPE.itemsize
+
+    def get_records(self, start=0, stop=None):
+        """Returns the records in [start, stop) as a read-only memory-mapped record array."""
+        stop = len(self) if stop is None else stop
+        if stop <= start:
+            return np.empty(0, dtype=TRAJECTORY_DTYPE)
+        return np.memmap(self.path, dtype=TRAJECTORY_DTYPE, mode='r',
+                         offset=TrajectoryReader.get_offset(start), shape=(stop - start,))
+
+    def get_final_scores(self):
+        """Returns the final score of each complete game, by game ID."""
+        final_scores = {}
+        for records in self.iter_chunks():
+            is_final = (records['box'] != Box.NONE) & (records['turn'] == Box.nonnone_count())
+            for (game_id, score) in zip(records['game_id'][is_final].tolist(),
+                                        records['score'][is_final].tolist()):
+                final_scores[game_id] = score
+        return final_scores
+
+    def iter_chunks(self, chunk_size=TrajectoryWriter.DEFAULT_CHUNK_SIZE):
+        """Yields the records of the file in order, as record arrays of up to chunk_size."""
+        with open(self.path, 'rb') as f:
+            f.seek(len(TRAJECTORY_HEADER))
+            while True:
+                data = f.read(chunk_size * TRAJECTORY_DTYPE.itemsize)
+                count = len(data) // TRAJECTORY_DTYPE.itemsize
+                if count == 0:
+                    return
+                if count * TRAJECTORY_DTYPE.itemsize < len(data):  # A partial record
+                    f.seek(count * TRAJECTORY_DTYPE.itemsize - len(data), os.SEEK_CUR)
+                yield np.frombuffer(data, dtype=TRAJECTORY_DTYPE, count=count).copy()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from box import Box
+from dice import DiceSource
+from player_bot import Player_MonteCarlo_Fast
+from trajectory import TRAJECTORY_DTYPE, TrajectoryReader, TrajectoryWriter
+
+
+def play_recorded(path, game_count, seed):
+    player = Player_MonteCarlo_Fast()
+    player.dice = DiceSource(seed)
+    with TrajectoryWriter(path, chunk_size=16) as recorder:
+        player.recorder = recorder
+        return [player.play() for _ in range(game_count)]
+
+
+class TrajectoryTest(unittest.TestCase):
+    def test_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'games.traj')
+            scores = play_recorded(path, 3, seed=1)
+            reader = TrajectoryReader(path)
+            records = reader.get_records()
+            assert(len(records) == len(reader))
+            assert(reader.get_final_scores() == dict(enumerate(scores)))
+
+            is_use_box = records['box'] != Box.NONE
+            assert(is_use_box.sum() == 3 * Box.nonnone_count())
+            assert((records['action'][is_use_box] == 0).all())
+            for game_id in range(3):
+                game_records = records[records['game_id'] == game_id]
+                game_boxes = game_records['box'][game_records['box'] != Box.NONE]
+                assert(sorted(game_boxes.tolist()) == list(range(1, Box.nonnone_count() + 1)))
+            for (record, next_record) in zip(records[:-1], records[1:]):
+                if record['box'] == Box.NONE:  # A re-roll keeps the dice not re-rolled
+                    assert(next_record['roll_num'] == record['roll_num'] + 1)
+                    assert(next_record['game_id'] == record['game_id'])
+                    if next_record['box'] == Box.NONE:
+                        assert(next_record['score'] == record['score'])
+                    for die in range(5):
+                        if not (record['action'] >> die) & 1:
+                            assert(next_record['roll'][die] == record['roll'][die])
+                else:
+                    assert(next_record['roll_num'] == 1)
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'games.traj')
+            scores = play_recorded(path, 2, seed=2)
+            with open(path, 'ab') as f:
+                f.write(b'\0' * (TRAJECTORY_DTYPE.itemsize // 2))  # A partial record
+            scores += play_recorded(path, 1, seed=3)
+            assert(TrajectoryReader(path).get_final_scores() == dict(enumerate(scores)))
+
+            other_path = os.path.join(tmpdir, 'other.traj')
+            other_scores = play_recorded(other_path, 2, seed=4)
+            with TrajectoryWriter(path) as recorder:
+                recorder.append_file(other_path)
+            assert(TrajectoryReader(path).get_final_scores()
+                   == dict(enumerate(scores + other_scores)))
+
+    def test_iter_chunks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'games.traj')
+            play_recorded(path, 1, seed=5)
+            reader = TrajectoryReader(path)
+            chunks = list(reader.iter_chunks(chunk_size=10))
+            assert(all(len(chunk) == 10 for chunk in chunks[:-1]))
+            assert(np.array_equal(np.concatenate(chunks), reader.get_records()))
+
+    def test_not_a_trajectory(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'games.txt')
+            with open(path, 'w') as f:
+                f.write('Not a trajectory file\n')
+            with self.assertRaises(ValueError):
+                TrajectoryReader(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
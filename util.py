@@ -27,16 +27,36 @@ class LongestConsecutiveSequence:
         return (self.min, self.length)
 
 
+class LazyStatic:
+    """Class attribute whose value is computed by build(cls) on first access.
+    The computed value then replaces the descriptor on the class,
+    so subsequent accesses are plain attribute lookups.
+    """
+    def __init__(self, build):
+        self.build = build
+        self.name = build.__name__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        value = self.build(owner)
+        setattr(owner, self.name, value)
+        return value
+
+
 class Util:
     @staticmethod
     def reverse(xs):
         return xs[::-1]
 
     @staticmethod
-    def init_static(cls):
-        assert(getattr(cls, '_init_static'))
-        cls._init_static()
-        return cls
+    def lazy_static(build):
+        return LazyStatic(build)
+
+    @staticmethod
+    def is_lazy_static_built(cls, name):
+        return not isinstance(vars(cls).get(name), LazyStatic)
 
     @staticmethod
     def longest_consecutive_sequence(items)->LongestConsecutiveSequence:
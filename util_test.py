@@ -5,6 +5,25 @@ import unittest
 from util import Util
 
 
+class LazyStaticTest(unittest.TestCase):
+    def test_lazy_static(self):
+        build_count = 0
+
+        class C:
+            @Util.lazy_static
+            def table(cls):
+                nonlocal build_count
+                build_count += 1
+                return [cls.__name__]
+
+        assert(not Util.is_lazy_static_built(C, 'table'))
+        assert(build_count == 0)
+        assert(C.table == ['C'])
+        assert(C.table == ['C'])
+        assert(build_count == 1)
+        assert(Util.is_lazy_static_built(C, 'table'))
+
+
 class LongestConsecutiveSequenceTest(unittest.TestCase):
     def test_consecutive_dice(self):
         assert(Util.longest_consecutive_sequence([1]).tup()         == (1,1))
@@ -1,97 +1,475 @@
 #!/usr/bin/env python
 
 import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import signal
-from statistics import mean
 import sys
+import time
 
+import numpy as np
+
+from decision_cache import DecisionCache
+from dice import AlignedDice, Dice, DiceSource
+from instrumentation import Instrumentation
 from player_human import Player_Human
 from player_bot import Player_MonteCarlo_Fast
 from player_bot import Player_MonteCarlo_Slow
 from player_bot import Player_NoRerolls_Greedy
 from player_bot import Player_NoRerolls_Random
+from player_bot import Player_Optimal
+from player_bot import Player_RL
+from player_bot import BOT_PLAYERS
+from replay import PairedComparison, play_stream
+from rl import LinearPolicy
+from score_stats import ScoreStats
+from solver import Solver
+from trajectory import TrajectoryWriter
 
 
 class GameSequence:
-    def __init__(self, player):
-        self.game_scores = []
+    """Plays a sequence of games, optionally sharded across jobs worker processes.
+    The games are split into chunks, each with its own seed, spawned from a master
+    SeedSequence: one child per job, and one grandchild per chunk of that job's shard.
+    Results are therefore reproducible for a given (seed, jobs) pair.
+    Scores are accumulated in a ScoreStats, which also keeps the individual scores
+    iff is_keeping_scores. If is_instrumented, the time spent in each phase of play is
+    accumulated in an Instrumentation (see Player.instrumentation).
+    If trajectory_path is given, every move of every game, including discarded games, is
+    appended to the trajectory file there (see trajectory.py), in chunk order.
+    """
+    CHUNKS_PER_JOB = 16
+    PROGRESS_INTERVAL = 10.0  # Minimum number of seconds between progress reports
+
+    def __init__(self, player, jobs=1, seed=None, is_keeping_scores=False,
+                 is_instrumented=False, trajectory_path=None):
+        self.stats = ScoreStats(is_keeping_scores)
+        self.instrumentation = Instrumentation() if is_instrumented else None
         self.discarded_game_count = 0
         self.player:Player = player
+        self.jobs = jobs
+        self.seed = seed
+        self.trajectory_path = trajectory_path
+
+    def get_chunks(self, game_count):
+        """Returns a list of (game_count, SeedSequence) pairs, one per chunk."""
+        if game_count < 0:
+            raise ValueError(f'game_count must be at least 0, not {game_count}')
+        result = []
+        job_seqs = np.random.SeedSequence(self.seed).spawn(self.jobs)
+        for job, job_seq in enumerate(job_seqs):
+            shard_count = game_count // self.jobs + (1 if job < game_count % self.jobs else 0)
+            chunk_count = min(shard_count, GameSequence.CHUNKS_PER_JOB)
+            for chunk, chunk_seq in enumerate(job_seq.spawn(chunk_count)):
+                chunk_game_count = (shard_count // chunk_count
+                                    + (1 if chunk < shard_count % chunk_count else 0))
+                result.append((chunk_game_count, chunk_seq))
+        return result
 
     def play(self, game_count=10, min_score=0):
-        """Play multiple games. If game_count == 0, then game play continues forever.
+        """Play multiple games, discarding those with scores below min_score.
+        Returns self.stats.
         """
-        while game_count > 0 and len(self.game_scores) < game_count:
-            score = self.player.play()
-            if score >= min_score:
-                self.game_scores.append(score)
+        chunks = self.get_chunks(game_count)
+        chunk_results = [None] * len(chunks)
+        is_keeping_scores = self.stats.scores is not None
+        is_instrumented = self.instrumentation is not None
+        trajectory_paths = [None] * len(chunks)
+        if self.trajectory_path is not None:  # Each worker writes its chunks to its own files
+            trajectory_paths = [self.trajectory_path if self.jobs == 1
+                                else f'{self.trajectory_path}.{os.getpid()}.{k}.tmp'
+                                for k in range(len(chunks))]
+        progress = Progress(game_count, GameSequence.PROGRESS_INTERVAL)
+        if self.jobs == 1:
+            for k, (chunk_game_count, seed_seq) in enumerate(chunks):
+                chunk_results[k] = play_chunk(self.player, chunk_game_count, seed_seq,
+                                              min_score, is_keeping_scores, is_instrumented,
+                                              trajectory_paths[k])
+                progress.update(chunk_results[k][0].count)
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                futures = {executor.submit(play_chunk, self.player, chunk_game_count,
+                                           seed_seq, min_score, is_keeping_scores,
+                                           is_instrumented, trajectory_paths[k]): k
+                           for k, (chunk_game_count, seed_seq) in enumerate(chunks)}
+                for future in as_completed(futures):
+                    chunk_results[futures[future]] = future.result()
+                    progress.update(future.result()[0].count)
+            if self.trajectory_path is not None:
+                with TrajectoryWriter(self.trajectory_path) as recorder:
+                    for path in trajectory_paths:
+                        recorder.append_file(path)
+                        os.remove(path)
+        for (stats, discarded_game_count, instrumentation) in chunk_results:  # In chunk order
+            self.stats.merge(stats)
+            self.discarded_game_count += discarded_game_count
+            if is_instrumented:
+                self.instrumentation.merge(instrumentation)
 
-        scores_str = '  '.join(map(str, sorted(self.game_scores)))
-        print(f'Scores from {game_count} games: {scores_str}')
+        if is_keeping_scores:
+            scores_str = '  '.join(map(str, sorted(self.stats.scores)))
+            print(f'Scores from {game_count} games: {scores_str}')
+        print(f'Score statistics from {game_count:,} games: {self.stats.summary_str()}')
         if self.discarded_game_count > 0:
             discarded = self.discarded_game_count
             print(f'(Number of games discarded (score < {min_score}): {discarded:,})')
-        return self.game_scores
+        if is_instrumented:
+            print(self.instrumentation.summary_str())
+        return self.stats
+
+
+class Progress:
+    """Prints the number of completed games and the rate of play,
+    at most once per interval seconds.
+    """
+    def __init__(self, game_count, interval):
+        self.game_count = game_count
+        self.interval = interval
+        self.completed_game_count = 0
+        self.start_time = time.perf_counter()
+        self.report_time = self.start_time
+
+    def update(self, completed_game_count):
+        self.completed_game_count += completed_game_count
+        now = time.perf_counter()
+        if now - self.report_time >= self.interval:
+            self.report_time = now
+            rate = self.completed_game_count / (now - self.start_time)
+            print(f'Completed {self.completed_game_count:,} of {self.game_count:,} games'
+                  f' ({rate:,.1f} games/sec)', flush=True)
+
+
+class Tournament:
+    """Plays each named bot player (see player_bot.BOT_PLAYERS) over the same games: the games
+    are split into chunks, each with its own seed, spawned from a master SeedSequence, and
+    every player plays each chunk with the same dice (see AlignedDice), drawn from that seed.
+    The (player, chunk) tasks run across jobs worker processes, and the chunks do not depend
+    on jobs, so results are reproducible for a given seed.
+    Given at least 2 games, each player's scores are compared with those of the first player,
+    game by game (see replay.PairedComparison).
+    """
+    CHUNK_COUNT = 64
+    CACHED_TABLES = {  # Players whose tables take minutes to compute, if not cached on disk
+        'optimal': (Solver.is_cached, 'solver.py'),
+        'rl':      (LinearPolicy.is_trained_cached, 'rl.py'),
+    }
+    QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+    def __init__(self, player_names, jobs=1, seed=None):
+        self.player_names = player_names
+        self.jobs = jobs
+        self.seed = seed
+        self.stats = {name: ScoreStats(is_keeping_scores=True) for name in player_names}
+        self.instrumentation = {name: Instrumentation() for name in player_names}
+        self.seconds = {name: 0.0 for name in player_names}
+        self.comparisons = {}
+
+    @staticmethod
+    def get_uncached_players():
+        """Returns the names of the players whose tables are not cached on disk."""
+        return [name for (name, (is_cached, _)) in Tournament.CACHED_TABLES.items()
+                if not is_cached()]
+
+    def get_chunks(self, game_count):
+        """Returns a list of (game_count, SeedSequence) pairs, one per chunk."""
+        chunk_count = min(game_count, Tournament.CHUNK_COUNT)
+        return [(game_count // chunk_count + (1 if chunk < game_count % chunk_count else 0),
+                 chunk_seq)
+                for chunk, chunk_seq in enumerate(
+                    np.random.SeedSequence(self.seed).spawn(chunk_count))]
+
+    def play(self, game_count=100):
+        """Plays game_count games with each player. Returns self."""
+        chunks = [(chunk_game_count, *seed_seq.spawn(2))  # Spawned once, for all players
+                  for (chunk_game_count, seed_seq) in self.get_chunks(game_count)]
+        tasks = [(name, chunk_game_count, dice_seq, other_seq)
+                 for (chunk_game_count, dice_seq, other_seq) in chunks
+                 for name in self.player_names]  # Interleaved, to balance the load of workers
+        task_results = [None] * len(tasks)
+        progress = Progress(game_count * len(self.player_names),
+                            GameSequence.PROGRESS_INTERVAL)
+        if self.jobs == 1:
+            for k, task in enumerate(tasks):
+                task_results[k] = play_tournament_chunk(*task)
+                progress.update(task[1])
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                futures = {executor.submit(play_tournament_chunk, *task): k
+                           for k, task in enumerate(tasks)}
+                for future in as_completed(futures):
+                    task_results[futures[future]] = future.result()
+                    progress.update(tasks[futures[future]][1])
+        for ((name, *_), (scores, instrumentation, seconds)) in zip(tasks, task_results):
+            self.stats[name].add_many(scores)  # In chunk order, so games pair up by index
+            self.instrumentation[name].merge(instrumentation)
+            self.seconds[name] += seconds
+        (baseline_name, *other_names) = self.player_names
+        for name in (other_names if game_count >= 2 else []):  # Else no stdev of differences
+            self.comparisons[name] = PairedComparison(self.stats[baseline_name].scores,
+                                                      self.stats[name].scores)
+        return self
+
+    def get_decision_summary(self, name):
+        """Returns (decision count, mean seconds per decision) for the named player."""
+        instrumentation = self.instrumentation[name]
+        phases = ['decide1', 'decide2', 'decide3']
+        count = sum(int(instrumentation.histograms[phase].sum()) for phase in phases)
+        seconds = sum(instrumentation.total_seconds[phase] for phase in phases)
+        return (count, seconds / count if count else None)
+
+    def summary_str(self):
+        baseline_name = self.player_names[0]
+        quantile_names = [f'p{round(100 * q)}' for q in Tournament.QUANTILES]
+        lines = [f'{"Player":<12} {"Games":>8} {"Mean":>8} {"Stdev":>7}'
+                 + ''.join(f' {q:>4}' for q in quantile_names)
+                 + f' {"Games/sec":>10} {"ms/decision":>12}  Diff from {baseline_name} (95% CI)']
+        for name in self.player_names:
+            stats = self.stats[name]
+            (_, decision_seconds) = self.get_decision_summary(name)
+            quantiles = ''.join(f' {stats.get_quantile(q):>4}' for q in Tournament.QUANTILES)
+            comparison = self.comparisons.get(name)
+            comparison_str = ('' if comparison is None else
+                              f'  {comparison.mean:+.2f} +/- {comparison.half_width:.2f}')
+            lines.append(f'{name:<12} {stats.count:>8,} {stats.mean:>8.2f} {stats.stdev:>7.2f}'
+                         f'{quantiles} {stats.count / self.seconds[name]:>10,.1f}'
+                         f' {1e3 * decision_seconds:>12.3f}{comparison_str}')
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """Returns the results as a JSON-compatible dict."""
+        players = {}
+        for name in self.player_names:
+            stats = self.stats[name]
+            (decision_count, decision_seconds) = self.get_decision_summary(name)
+            comparison = self.comparisons.get(name)
+            players[name] = {
+                'game_count': stats.count,
+                'mean': stats.mean,
+                'stdev': stats.stdev,
+                'min': stats.min,
+                'max': stats.max,
+                'quantiles': {f'p{round(100 * q)}': stats.get_quantile(q)
+                              for q in Tournament.QUANTILES},
+                'games_per_sec': stats.count / self.seconds[name],
+                'decision_count': decision_count,
+                'ms_per_decision': 1e3 * decision_seconds,
+                'difference_from_baseline': None if comparison is None else comparison.to_dict()}
+        return {'seed': self.seed,
+                'jobs': self.jobs,
+                'baseline': self.player_names[0],
+                'players': players}
+
+
+def play_chunk(player, game_count, seed_seq, min_score=0, is_keeping_scores=False,
+               is_instrumented=False, trajectory_path=None):
+    """Plays game_count games, with the player's dice set to a DiceSource seeded from seed_seq.
+    Other randomness (e.g., Player_NoRerolls_Random's choice of box) uses the random module,
+    which is seeded from an independent child of seed_seq, except that the simulated rolls of
+    Player_MonteCarlo_Slow are seeded (see its sim_seed) from a third child.
+    In worker processes, player is a pickled copy of the GameSequence's player.
+    A player's decision cache, if any, is saved (see DecisionCache.save) after the chunk.
+    If trajectory_path is given, the moves of the games are appended to the trajectory file there.
+    Returns (stats, discarded_game_count, instrumentation), where stats is a ScoreStats,
+    and instrumentation is an Instrumentation if is_instrumented, and None otherwise.
+    """
+    (dice_seq, other_seq, sim_seq) = seed_seq.spawn(3)
+    player.dice = DiceSource(dice_seq)
+    if hasattr(player, 'sim_seed'):
+        player.sim_seed = sim_seq
+    player.instrumentation = Instrumentation() if is_instrumented else None
+    player.recorder = None if trajectory_path is None else TrajectoryWriter(trajectory_path)
+    Dice.seed(int.from_bytes(other_seq.generate_state(4).tobytes(), 'little'))
+    stats = ScoreStats(is_keeping_scores)
+    discarded_game_count = 0
+    while stats.count < game_count:
+        score = player.play()
+        if score >= min_score:
+            stats.add(score)
+        else:
+            discarded_game_count += 1
+    if getattr(player, 'decision_cache', None) is not None:
+        player.decision_cache.save()
+    if player.recorder is not None:
+        player.recorder.close()
+        player.recorder = None
+    instrumentation = player.instrumentation
+    player.instrumentation = None
+    return (stats, discarded_game_count, instrumentation)
+
+
+def play_tournament_chunk(name, game_count, dice_seq, other_seq):
+    """Plays game_count games with the named bot player, with dice drawn from dice_seq
+    (see AlignedDice), and other randomness seeded from other_seq (see replay.play_stream).
+    The SeedSequences are not spawned from, so the same ones can be used for each player.
+    Returns (scores, instrumentation, seconds), where seconds is the wall time of play.
+    """
+    stream = AlignedDice.draw(np.random.Generator(np.random.PCG64(dice_seq)), game_count)
+    player = BOT_PLAYERS[name]()
+    player.instrumentation = Instrumentation()
+    start = time.perf_counter()
+    scores = play_stream(player, stream, int(other_seq.generate_state(1)[0]))
+    return (scores, player.instrumentation, time.perf_counter() - start)
+
+
+def play_tournament(args):
+    parser = argparse.ArgumentParser(prog='Yahtzee tournament',
+                 description='Compare the bot players over the same games')
+    parser.add_argument('players', nargs='*')  # Names in player_bot.BOT_PLAYERS, the first being the baseline (default: all)
+    parser.add_argument('-n', '--number', type=int, default=100)  # Number of games per player
+    parser.add_argument('-j', '--jobs', type=int, default=1)      # Number of worker processes
+    parser.add_argument('--seed', type=int, default=None)         # Master random seed
+    parser.add_argument('-o', '--output', default=None)           # JSON report file
+    args = parser.parse_args(args)
+    if args.number < 2:
+        parser.error('--number must be at least 2')
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    unknown_names = [name for name in args.players if name not in BOT_PLAYERS]
+    if unknown_names:
+        parser.error(f'Unknown players: {", ".join(unknown_names)}'
+                     f' (choose from {", ".join(BOT_PLAYERS)})')
+
+    player_names = args.players
+    if not player_names:
+        player_names = list(BOT_PLAYERS)
+        for name in Tournament.get_uncached_players():
+            (_, program) = Tournament.CACHED_TABLES[name]
+            print(f'Skipping {name}: Run {program} to compute its tables', file=sys.stderr)
+            player_names.remove(name)
+    for name in Tournament.get_uncached_players():  # Or each task would compute them
+        if name in player_names:
+            (_, program) = Tournament.CACHED_TABLES[name]
+            parser.error(f'The tables of {name} are not cached:'
+                         f' Run {program} (with caching enabled) to compute them')
+    tournament = Tournament(player_names, args.jobs, args.seed).play(args.number)
+    print(tournament.summary_str())
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(tournament.to_dict(), f, indent=2)
+    return tournament
+
+
+def play_greedy(game_count=2, jobs=1, seed=None, **sequence_args):
+    games = GameSequence(Player_NoRerolls_Greedy(), jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    print(f'Mean Greedy Player score = {stats.mean:.2f}')
+    return games
+
+
+def play_human(game_count=2, jobs=1, seed=None, **sequence_args):
+    games = GameSequence(Player_Human(), jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    print(f'Mean Human Player score = {stats.mean:.2f}')
+    return games
 
 
-def play_greedy(game_count=2):
-    games = GameSequence(Player_NoRerolls_Greedy())
-    scores = games.play(game_count)
-    print(f'Mean Greedy Player score = {mean(scores)}')
+def play_monte_carlo_fast(game_count=2, jobs=1, seed=None, **sequence_args):
+    games = GameSequence(Player_MonteCarlo_Fast(), jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    print(f'Mean Monte Carlo Player (fast) score = {stats.mean:.2f}')
+    return games
 
 
-def play_human(game_count=2):
-    games = GameSequence(Player_Human())
-    scores = games.play(game_count)
-    print(f'Mean Human Player score = {mean(scores)}')
+def play_monte_carlo_slow(game_count=2, jobs=1, seed=None, is_exact=False,
+                          decision_cache=None, **sequence_args):
+    player = Player_MonteCarlo_Slow(is_exact, decision_cache=decision_cache)
+    games = GameSequence(player, jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    if decision_cache is not None and jobs == 1:
+        print(decision_cache.summary_str())
+    print(f'Mean Monte Carlo Player (slow) score = {stats.mean:.2f}')
+    return games
 
 
-def play_monte_carlo_fast(game_count=2):
-    games = GameSequence(Player_MonteCarlo_Fast())
-    scores = games.play(game_count)
-    print(f'Mean Monte Carlo Player (fast) score = {mean(scores)}')
+def play_optimal(game_count=2, jobs=1, seed=None, **sequence_args):
+    games = GameSequence(Player_Optimal(), jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    print(f'Mean Optimal Player score = {stats.mean:.2f}')
+    return games
 
 
-def play_monte_carlo_slow(game_count=2):
-    games = GameSequence(Player_MonteCarlo_Slow())
-    scores = games.play(game_count)
-    print(f'Mean Monte Carlo Player (slow) score = {mean(scores)}')
+def play_rl(game_count=2, jobs=1, seed=None, **sequence_args):
+    games = GameSequence(Player_RL(), jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    print(f'Mean Reinforcement Learning Player score = {stats.mean:.2f}')
+    return games
 
 
-def play_random(game_count=2):
-    games = GameSequence(Player_NoRerolls_Random())
-    scores = games.play(game_count)
-    print(f'Mean Random Player score = {mean(scores)}')
+def play_random(game_count=2, jobs=1, seed=None, **sequence_args):
+    games = GameSequence(Player_NoRerolls_Random(), jobs, seed, **sequence_args)
+    stats = games.play(game_count)
+    print(f'Mean Random Player score = {stats.mean:.2f}')
+    return games
 
 
 def main():
+    # Not argparse subparsers: argparse cannot require either a subcommand or one of the player
+    # flags below (a required group), and the main parser has no -h/--help to list subcommands,
+    # -h being --human. So tournament is dispatched by hand, and listed by --help.
+    if sys.argv[1:2] == ['tournament']:
+        play_tournament(sys.argv[2:])
+        return
     parser = argparse.ArgumentParser(prog = 'Yahtzee',
                  description = 'Play the game Yahtzee',
+                 epilog = 'Run "%(prog)s tournament --help" to compare the bot players'
+                          ' over the same games.',
                  add_help=False)
+    parser.add_argument('--help', action='help')  # Without -h, which is --human
     parser.add_argument('-n', '--number', type=int, default=2)  # Number of games
+    parser.add_argument('-j', '--jobs', type=int, default=1)    # Number of worker processes
+    parser.add_argument('--seed', type=int, default=None)       # Master random seed
+    parser.add_argument('-x', '--exact', action='store_true')   # Monte Carlo Player (slow): Use exact expectations
+    parser.add_argument('-k', '--keep-scores', action='store_true')  # Keep and print every score
+    parser.add_argument('-c', '--decision-cache', nargs='?', const='')  # Monte Carlo Player (slow): Memoize decisions (and persist to file)
+    parser.add_argument('-p', '--profile', nargs='?', const='')  # Print (and write as JSON) time per phase
+    parser.add_argument('-t', '--trajectory', default=None)  # Append every move to a trajectory file
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('-f', '--fast', action='store_true')      # Monte Carlo Player (fast)
     group.add_argument('-g', '--greedy', action='store_true')    # Greedy Player
     group.add_argument('-h', '--human', action='store_true')     # Interactive mode with Human Player
+    group.add_argument('-o', '--optimal', action='store_true')   # Optimal Player (see solver.py)
+    group.add_argument('-l', '--rl', action='store_true')        # Reinforcement Learning Player (see rl.py)
     group.add_argument('-r', '--random', action='store_true')    # Random Player
     group.add_argument('-s', '--slow', action='store_true')      # Monte Carlo Player (slow)
 
     args = parser.parse_args()
+    if args.number < 0:
+        parser.error('--number must be at least 0')
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.human and args.jobs > 1:
+        parser.error('--human cannot be used with --jobs')
+    if not args.slow and (args.exact or args.decision_cache is not None):
+        parser.error('--exact and --decision-cache can only be used with --slow')
 
+    decision_cache = (None if args.decision_cache is None
+                      else DecisionCache(path=args.decision_cache or None))
+    sequence_args = {'is_keeping_scores': args.keep_scores,
+                     'is_instrumented': args.profile is not None,
+                     'trajectory_path': args.trajectory}
     if args.fast:
-        play_monte_carlo_fast(args.number)
+        games = play_monte_carlo_fast(args.number, args.jobs, args.seed, **sequence_args)
     elif args.greedy:
-        play_greedy(args.number)
+        games = play_greedy(args.number, args.jobs, args.seed, **sequence_args)
     elif args.human:
-        play_human(args.number)
+        games = play_human(args.number, args.jobs, args.seed, **sequence_args)
+    elif args.optimal:
+        games = play_optimal(args.number, args.jobs, args.seed, **sequence_args)
     elif args.slow:
-        play_monte_carlo_slow(args.number)
+        games = play_monte_carlo_slow(args.number, args.jobs, args.seed, args.exact,
+                                      decision_cache, **sequence_args)
+    elif args.rl:
+        games = play_rl(args.number, args.jobs, args.seed, **sequence_args)
     elif args.random:
-        play_random(args.number)
+        games = play_random(args.number, args.jobs, args.seed, **sequence_args)
     else:
         raise RuntimeError(f'Program failed to catch missing mandatory flag '
                             'specifying which Player type to use.')
+    if args.profile:
+        with open(args.profile, 'w') as f:
+            json.dump(games.instrumentation.to_dict(), f, indent=2)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import contextlib
+import os
+import tempfile
+import unittest
+
+from player_bot import Player_NoRerolls_Greedy
+from trajectory import TrajectoryReader
+from yahtzee import GameSequence, Tournament, play_tournament
+
+
+class GameSequenceTest(unittest.TestCase):
+    def test_chunks(self):
+        chunks = GameSequence(Player_NoRerolls_Greedy(), jobs=3, seed=1).get_chunks(100)
+        assert(sum(game_count for (game_count, _) in chunks) == 100)
+        assert(len(chunks) == 3 * GameSequence.CHUNKS_PER_JOB)
+
+        chunks = GameSequence(Player_NoRerolls_Greedy(), jobs=3, seed=1).get_chunks(2)
+        assert([game_count for (game_count, _) in chunks] == [1, 1])
+        assert(GameSequence(Player_NoRerolls_Greedy(), jobs=3, seed=1).get_chunks(0) == [])
+        with self.assertRaises(ValueError):
+            GameSequence(Player_NoRerolls_Greedy(), jobs=3, seed=1).get_chunks(-1)
+
+    def test_reproducible(self):
+        def play(jobs, seed):
+            return GameSequence(Player_NoRerolls_Greedy(), jobs, seed,
+                                is_keeping_scores=True).play(40).scores
+
+        assert(play(1, 5) == play(1, 5))
+        assert(play(2, 5) == play(2, 5))
+        assert(play(1, 5) != play(1, 6))
+
+    def test_stats(self):
+        stats = GameSequence(Player_NoRerolls_Greedy(), jobs=2, seed=3,
+                             is_keeping_scores=True).play(50)
+        assert(stats.count == len(stats.scores) == 50)
+        assert(abs(stats.mean - sum(stats.scores) / 50) < 1e-9)
+        assert(stats.histogram.sum() == 50)
+
+        stats = GameSequence(Player_NoRerolls_Greedy(), seed=3).play(10)
+        assert(stats.count == 10)
+        assert(stats.scores is None)
+
+    def test_trajectory(self):
+        """The trajectory is the same for any number of jobs, given the same chunks."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            records = []
+            for (jobs, chunk_jobs) in [(1, 2), (2, 2)]:
+                path = os.path.join(tmpdir, f'games{jobs}.traj')
+                games = GameSequence(Player_NoRerolls_Greedy(), jobs, seed=4,
+                                     is_keeping_scores=True, trajectory_path=path)
+                games.get_chunks = GameSequence(Player_NoRerolls_Greedy(), chunk_jobs,
+                                                seed=4).get_chunks
+                stats = games.play(20)
+                reader = TrajectoryReader(path)
+                assert(sorted(reader.get_final_scores().values()) == sorted(stats.scores))
+                records.append(reader.get_records().tobytes())
+            assert(records[0] == records[1])
+            assert(sorted(os.listdir(tmpdir)) == ['games1.traj', 'games2.traj'])
+
+
+class TournamentTest(unittest.TestCase):
+    def test_chunks(self):
+        chunks = Tournament(['greedy'], seed=1).get_chunks(100)
+        assert(sum(game_count for (game_count, _) in chunks) == 100)
+        assert(len(chunks) == Tournament.CHUNK_COUNT)
+        assert(len(Tournament(['greedy'], seed=1).get_chunks(3)) == 3)
+
+    def test_reproducible(self):
+        """Results do not depend on the number of jobs."""
+        def play(jobs):
+            return Tournament(['greedy', 'random', 'fast'], jobs, seed=2).play(10)
+
+        tournament = play(1)
+        assert(tournament.stats['fast'].scores == play(2).stats['fast'].scores)
+        assert(all(tournament.stats[name].count == 10 for name in tournament.player_names))
+        assert(sorted(tournament.comparisons) == ['fast', 'random'])
+        comparison = tournament.comparisons['fast']
+        assert(abs(comparison.mean - (tournament.stats['fast'].mean
+                                      - tournament.stats['greedy'].mean)) < 1e-9)
+        report = tournament.to_dict()
+        assert(report['baseline'] == 'greedy')
+        assert(report['players']['fast']['decision_count'] >= 10 * 13)
+        assert(report['players']['greedy']['difference_from_baseline'] is None)
+        assert(len(tournament.summary_str().splitlines()) == 4)
+
+    def test_too_few_games(self):
+        """One game cannot be compared, and the command line asks for at least 2."""
+        tournament = Tournament(['greedy', 'random'], seed=3).play(1)
+        assert(tournament.comparisons == {})
+        assert(tournament.to_dict()['players']['random']['difference_from_baseline'] is None)
+        for number in ['0', '1']:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+                with self.assertRaises(SystemExit):
+                    play_tournament(['greedy', 'random', '-n', number])
+
+
+if __name__ == '__main__':
+    unittest.main()